@@ -7,6 +7,7 @@ from fastapi.responses import JSONResponse
 from fastapi.requests import Request
 from slowapi.errors import RateLimitExceeded
 from app.security import bearer_scheme
+from app.utils.process_pool import report_pool
 
 app = FastAPI(
     title="AutoReport SaaS",
@@ -77,6 +78,11 @@ def rate_limit_handler(request: Request, exc: RateLimitExceeded):
         content={"detail": "Rate limit exceeded. Tente novamente em instantes."}
     )
 
+@app.on_event("shutdown")
+def shutdown_report_pool():
+    # Encerra os processos do pool de relatórios junto com o worker
+    report_pool.shutdown()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
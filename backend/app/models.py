@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class ReportBase(BaseModel):
@@ -54,4 +54,16 @@ class UserSettings(BaseModel):
 
 class UserSettingsUpdate(BaseModel):
     notifications_enabled: Optional[bool] = None
-    theme: Optional[str] = None 
\ No newline at end of file
+    theme: Optional[str] = None 
+
+class DashboardWidget(BaseModel):
+    id: Optional[str] = None
+    type: str  # summary, column, stats, timeseries, pivot, outliers
+    params: Dict[str, Any] = {}
+
+class DashboardBatchRequest(BaseModel):
+    widgets: List[DashboardWidget]
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    filter_col: Optional[str] = None
+    filter_val: Optional[str] = None
@@ -4,6 +4,8 @@ import pandas as pd
 from app.services.ai_assistant import AIAssistant
 from app.dependencies.auth import get_current_user
 from app.services.supabase_client import supabase
+from app.utils.pandas_utils import FastJSONResponse
+from app.services.dataset_service import load_dataset, load_column_sketches
 
 router = APIRouter(prefix="/ai-assistant", tags=["AI Assistant"])
 
@@ -24,22 +26,21 @@ async def ask_question(
         if not question or not data_id:
             raise HTTPException(status_code=400, detail="Pergunta e data_id são obrigatórios")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Processa a pergunta
         result = await ai_assistant.ask_question(question, data, current_user['id'])
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'result': result
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar pergunta: {str(e)}")
@@ -58,22 +59,25 @@ async def get_automated_insights(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        meta, data = loaded
+        
+        # Quartis dos outliers a partir dos sketches gravados com o dataset ("exact": true recalcula)
+        exact = bool(request.get('exact', False))
+        sketches = {} if exact else load_column_sketches(meta, data)
         
         # Gera insights automatizados
-        insights = await ai_assistant.get_automated_insights(data, current_user['id'])
+        insights = await ai_assistant.get_automated_insights(data, current_user['id'], sketches, exact)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'insights': insights
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar insights: {str(e)}")
@@ -93,22 +97,27 @@ async def advanced_analysis(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        meta, data = loaded
+        
+        # Outliers e distribuição usam os sketches de quantis do dataset ("exact": true recalcula)
+        exact = bool(request.get('exact', False))
+        sketches = {}
+        if analysis_type in ('outlier', 'distribution') and not exact:
+            sketches = load_column_sketches(meta, data)
         
         # Realiza análise avançada
-        analysis = await ai_assistant.ai_service.analyze_data(data, analysis_type)
+        analysis = await ai_assistant.ai_service.analyze_data(data, analysis_type, sketches, exact)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'analysis': analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise avançada: {str(e)}")
@@ -127,22 +136,21 @@ async def seasonality_analysis(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Análise de sazonalidade
         analysis = await ai_assistant.ai_service._seasonality_analysis(data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'seasonality': analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise de sazonalidade: {str(e)}")
@@ -161,22 +169,21 @@ async def clustering_analysis(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Análise de clustering
         analysis = await ai_assistant.ai_service._clustering_analysis(data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'clustering': analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise de clustering: {str(e)}")
@@ -195,22 +202,25 @@ async def distribution_analysis(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        meta, data = loaded
+        
+        # Percentis a partir dos sketches gravados com o dataset ("exact": true recalcula)
+        exact = bool(request.get('exact', False))
+        sketches = {} if exact else load_column_sketches(meta, data)
         
         # Análise de distribuição
-        analysis = await ai_assistant.ai_service._distribution_analysis(data)
+        analysis = await ai_assistant.ai_service._distribution_analysis(data, sketches, exact)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'distribution': analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise de distribuição: {str(e)}")
@@ -229,22 +239,21 @@ async def prediction_analysis(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Análise preditiva
         analysis = await ai_assistant.ai_service._prediction_analysis(data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'prediction': analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise preditiva: {str(e)}")
@@ -263,20 +272,19 @@ async def suggest_questions(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Gera sugestões baseadas nos tipos de dados
         suggestions = []
         
         numeric_cols = data.select_dtypes(include=['number']).columns
-        categorical_cols = data.select_dtypes(include=['object']).columns
+        categorical_cols = data.select_dtypes(include=['object', 'category']).columns
         
         if len(numeric_cols) > 0:
             suggestions.append({
@@ -314,7 +322,7 @@ async def suggest_questions(
         # Verifica se há colunas de data
         date_cols = []
         for col in data.columns:
-            if data[col].dtype == 'object':
+            if data[col].dtype in ('object', 'category'):
                 try:
                     pd.to_datetime(data[col].iloc[0])
                     date_cols.append(col)
@@ -348,10 +356,10 @@ async def suggest_questions(
                 'confidence': 0.6
             })
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'suggestions': suggestions
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar sugestões: {str(e)}")
@@ -3,7 +3,8 @@ from typing import Dict, List, Any
 import pandas as pd
 from app.services.data_preparation import DataPreparationService
 from app.dependencies.auth import get_current_user
-from app.services.supabase_client import supabase
+from app.utils.pandas_utils import FastJSONResponse
+from app.services.dataset_service import load_dataset, save_dataframe, load_column_sketches
 
 router = APIRouter(prefix="/data-preparation", tags=["Data Preparation"])
 
@@ -24,34 +25,26 @@ async def prepare_data(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Executa as operações de preparação
         result = await data_prep_service.prepare_data(data, operations)
         
-        # Salva os dados processados
-        processed_data = result['data'].to_dict('records')
+        # Salva os dados processados no banco
+        save_dataframe(data_id, result['data'], preparation_report=result['report'])
         
-        # Atualiza os dados no banco
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'preparation_report': result['report'],
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
-        
-        return {
+        return FastJSONResponse({
             'success': True,
             'report': result['report'],
             'operations': result['operations'],
             'message': f'Dados preparados com sucesso. {result["report"]["operations_applied"]} operações aplicadas.'
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao preparar dados: {str(e)}")
@@ -70,22 +63,25 @@ async def get_quality_report(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        meta, data = loaded
+        
+        # Quartis dos outliers a partir dos sketches gravados com o dataset ("exact": true recalcula)
+        exact = bool(request.get('exact', False))
+        sketches = {} if exact else load_column_sketches(meta, data)
         
         # Gera relatório de qualidade
-        quality_report = await data_prep_service.get_data_quality_report(data)
+        quality_report = await data_prep_service.get_data_quality_report(data, sketches, exact)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'quality_report': quality_report
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório: {str(e)}")
@@ -104,22 +100,21 @@ async def suggest_operations(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Sugere operações
         suggestions = await data_prep_service.suggest_preparation_steps(data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'suggestions': suggestions
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar sugestões: {str(e)}")
@@ -141,31 +136,25 @@ async def clean_missing_values(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Aplica limpeza
         cleaned_data = data_prep_service._clean_missing_values(data, strategy, fill_value, columns)
         
         # Salva os dados limpos
-        processed_data = cleaned_data.to_dict('records')
+        save_dataframe(data_id, cleaned_data)
         
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
-        
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': f'Valores ausentes limpos com sucesso usando estratégia: {strategy}',
             'rows_removed': len(data) - len(cleaned_data)
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao limpar valores ausentes: {str(e)}")
@@ -186,31 +175,25 @@ async def remove_duplicates(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Remove duplicatas
         cleaned_data = data_prep_service._remove_duplicates(data, subset, keep)
         
         # Salva os dados limpos
-        processed_data = cleaned_data.to_dict('records')
-        
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
+        save_dataframe(data_id, cleaned_data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': 'Duplicatas removidas com sucesso',
             'rows_removed': len(data) - len(cleaned_data)
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao remover duplicatas: {str(e)}")
@@ -230,30 +213,24 @@ async def convert_data_types(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Converte tipos
         converted_data = data_prep_service._convert_data_types(data, conversions)
         
         # Salva os dados convertidos
-        processed_data = converted_data.to_dict('records')
+        save_dataframe(data_id, converted_data)
         
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
-        
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': f'Tipos de dados convertidos: {list(conversions.keys())}'
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao converter tipos: {str(e)}")
@@ -273,31 +250,25 @@ async def create_derived_features(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Cria features
         enhanced_data = data_prep_service._create_derived_features(data, features)
         
         # Salva os dados com novas features
-        processed_data = enhanced_data.to_dict('records')
-        
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
+        save_dataframe(data_id, enhanced_data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': f'{len(features)} novas features criadas com sucesso',
             'new_columns': [feature['name'] for feature in features]
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar features: {str(e)}")
@@ -317,31 +288,25 @@ async def filter_data(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Filtra dados
         filtered_data = data_prep_service._filter_data(data, conditions)
         
         # Salva os dados filtrados
-        processed_data = filtered_data.to_dict('records')
+        save_dataframe(data_id, filtered_data)
         
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
-        
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': f'Dados filtrados com sucesso. {len(filtered_data)} linhas mantidas.',
             'rows_removed': len(data) - len(filtered_data)
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao filtrar dados: {str(e)}")
@@ -362,31 +327,25 @@ async def aggregate_data(
         if not data_id:
             raise HTTPException(status_code=400, detail="data_id é obrigatório")
         
-        # Busca os dados do banco
-        response = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+        # Busca os dados (reaproveita o DataFrame em cache enquanto o dataset não muda)
+        loaded = load_dataset(data_id, writable=True)
         
-        if not response.data:
+        if not loaded:
             raise HTTPException(status_code=404, detail="Dados não encontrados")
         
-        # Converte para DataFrame
-        data = pd.DataFrame(response.data[0]['data'])
+        _, data = loaded
         
         # Agrega dados
         aggregated_data = data_prep_service._aggregate_data(data, group_by, aggregations)
         
         # Salva os dados agregados
-        processed_data = aggregated_data.to_dict('records')
-        
-        supabase.table('uploaded_data').update({
-            'data': processed_data,
-            'updated_at': pd.Timestamp.now().isoformat()
-        }).eq('id', data_id).execute()
+        save_dataframe(data_id, aggregated_data)
         
-        return {
+        return FastJSONResponse({
             'success': True,
             'message': f'Dados agregados com sucesso por {len(group_by)} coluna(s)',
             'rows_after_aggregation': len(aggregated_data)
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao agregar dados: {str(e)}") 
\ No newline at end of file
@@ -3,8 +3,9 @@ from io import BytesIO
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request, Depends, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.security import bearer_scheme
-from app.models import Report, ReportCreate
+from app.models import Report, ReportCreate, DashboardBatchRequest
 from app.services.supabase_client import supabase
 from app.dependencies.auth import CurrentUser
 from typing import List, Optional, Dict
@@ -13,12 +14,23 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi import Limiter
 from app.limiter import limiter, UPLOAD_LIMIT, REPORT_GENERATION_LIMIT, GENERAL_LIMIT, AUTH_LIMIT
-from app.utils.crypto_utils import encrypt_file_bytes, decrypt_file_bytes, encrypt_data, decrypt_data
+from app.utils.crypto_utils import encrypt_data, decrypt_data
+from app.utils.storage import spool_upload_to_disk, remove_spooled_file, UploadTooLargeError
+from app.services.dataset_service import ingest_csv_stream, write_dataset, insert_dataset_record, read_upload_bytes, upload_source, dataset_source, frame_source, load_dataset, dataset_version_key, list_workspaces_page, get_dataset_meta, read_dataset_rows, dataset_memory_report
+from app.services.report_service import report_cache_key, open_cached_report, render_report, prepare_report_batch
+from app.services.analysis_service import run_analysis, GEO_TOP_N, GEO_PAGE_SIZE
+from app.services.dashboard_service import fetch_dashboard_frame, widget_columns, evaluate_widget, evaluate_dashboard, rollup_summary, ReportColumnError
+from app.utils.process_pool import report_pool, PoolBusyError, JobTimeoutError, JobCancelledError
+from app.services.timeseries_service import timeseries_cache, timeseries_key, trend_from_base
+from app.utils.pandas_utils import FastJSONResponse, dataframe_to_records, frame_memory_usage
+import asyncio
 import numpy as np
+import zipfile
 
 router = APIRouter()
 
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB (processamento em memória)
+MAX_STREAM_FILE_SIZE = 1024 * 1024 * 1024  # 1GB (CSV ingerido em blocos)
 
 @router.get("/test-auth")
 def test_auth():
@@ -43,26 +55,17 @@ def test_token(token: str = Query(..., description="Token para teste")):
 
 @router.post("/analyze-columns-simple")
 async def analyze_columns_simple(
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    request: Request = None
 ):
     """Lista as colunas disponíveis no arquivo (sem autenticação)"""
-    import pandas as pd
-    from io import BytesIO
-    
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        
-        return {
-            "columns": df.columns.tolist(),
-            "sample_data": df.head(3).to_dict(orient="records"),
-            "total_rows": len(df)
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "columns", {})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar colunas: {str(e)}")
 
@@ -70,25 +73,17 @@ async def analyze_columns_simple(
 async def analyze_columns(
     file: UploadFile = File(...),
     token: str = Query(None, description="Token JWT para autenticação"),
-    current_user: str = CurrentUser
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
     """Lista as colunas disponíveis no arquivo"""
-    import pandas as pd
-    from io import BytesIO
-    
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        
-        return {
-            "columns": df.columns.tolist(),
-            "sample_data": df.head(3).to_dict(orient="records")
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "columns", {})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar colunas: {str(e)}")
 
@@ -105,40 +100,33 @@ def list_reports(current_user: str = CurrentUser):
         return []
 
 @router.get("/workspaces")
-def list_workspaces(current_user: str = CurrentUser):
+def list_workspaces(
+    limit: int = Query(50, ge=1, le=200, description="Quantidade de workspaces por página"),
+    cursor: Optional[str] = Query(None, description="Cursor retornado em next_cursor pela página anterior"),
+    current_user: str = CurrentUser
+):
     """
-    Lista todos os workspaces/projetos do usuário
+    Lista os workspaces/projetos do usuário (apenas metadados, sem os dados).
+    Os dados de cada workspace são obtidos em /reports/datasets/{data_id}.
     """
     try:
         print(f"🔍 Buscando workspaces para usuário: {current_user}")
-        print(f"🔍 Verificando se a tabela uploaded_data existe...")
-        
-        # Primeiro, vamos verificar se a tabela existe
-        try:
-            test_response = supabase.table("uploaded_data").select("id").limit(1).execute()
-            print(f"✅ Tabela uploaded_data existe e está acessível")
-        except Exception as table_error:
-            print(f"❌ Erro ao acessar tabela uploaded_data: {table_error}")
-            # Retornar dados vazios em vez de erro para evitar loop infinito
-            return {
-                "workspaces": [],
-                "count": 0,
-                "error": f"Tabela uploaded_data não existe ou não está acessível: {str(table_error)}"
-            }
-        
-        response = supabase.table("uploaded_data").select("*").eq("user_id", current_user).order("created_at", desc=True).execute()
-        print(f"📊 Workspaces encontrados: {len(response.data)}")
-        print(f"📋 Dados retornados: {response.data}")
-        return {
-            "workspaces": response.data,
-            "count": len(response.data)
-        }
+        workspaces, next_cursor = list_workspaces_page(current_user, limit, cursor)
+        print(f"📊 Workspaces encontrados: {len(workspaces)}")
+        return FastJSONResponse({
+            "workspaces": workspaces,
+            "count": len(workspaces),
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Erro ao buscar workspaces: {e}")
         # Retornar dados vazios em vez de erro para evitar loop infinito
         return {
             "workspaces": [],
             "count": 0,
+            "next_cursor": None,
             "error": f"Erro ao buscar workspaces: {str(e)}"
         }
 
@@ -171,130 +159,108 @@ async def upload_report_file(
     print(f"📁 Arquivo: {file.filename}")
     print(f"🏷️ Workspace: {workspace_name}")
     print(f"📝 Descrição: {description}")
-    content = await file.read()
     if not file.filename:
         raise HTTPException(status_code=400, detail="Arquivo sem nome não suportado")
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="Arquivo excede o tamanho máximo de 5MB")
+    
+    # Copiar o upload para o disco em blocos (sem ler o arquivo inteiro na memória)
+    try:
+        spool_path, file_size = await spool_upload_to_disk(file, MAX_STREAM_FILE_SIZE)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=400, detail="Arquivo excede o tamanho máximo de 1GB")
+    
+    try:
+        # Ingestão (CSV, Parquet, armazenamento criptografado) é bloqueante: roda no threadpool
+        return await run_in_threadpool(
+            _save_uploaded_file,
+            spool_path, file_size, file.filename, workspace_name, description,
+            file_type, data_location, table_name, first_row_headers, date_format, error_handling,
+            max_rows, current_user
+        )
+    finally:
+        remove_spooled_file(spool_path)
+
+def _save_uploaded_file(
+    spool_path: str,
+    file_size: int,
+    filename: str,
+    workspace_name: str,
+    description: str,
+    file_type: str,
+    data_location: str,
+    table_name: Optional[str],
+    first_row_headers: bool,
+    date_format: str,
+    error_handling: str,
+    max_rows: Optional[int],
+    current_user: str
+):
+    """Processa o arquivo já copiado para o disco e salva o projeto em uploaded_data"""
+    import re
+    final_table_name = table_name or re.sub(r'\.[^/.]+$', '', filename)
+    print(f"📝 Nome da tabela final: {final_table_name}")
+    
+    # Metadados comuns aos dois modos de ingestão
+    record = {
+        'user_id': current_user,
+        'workspace_name': workspace_name,
+        'description': description,
+        'file_type': file_type,
+        'data_location': data_location,
+        'table_name': final_table_name,
+        'first_row_headers': first_row_headers,
+        'date_format': date_format,
+        'error_handling': error_handling,
+        'original_filename': filename,
+        'created_at': datetime.utcnow().isoformat(),
+        'updated_at': datetime.utcnow().isoformat()
+    }
+    
+    if file_size > MAX_FILE_SIZE:
+        # Arquivos grandes: apenas CSV pode ser processado em blocos
+        if not filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="Arquivos acima de 5MB devem ser enviados em CSV")
+        print(f"🌊 Ingestão em streaming - {file_size} bytes")
+        try:
+            saved_data, preview = ingest_csv_stream(spool_path, record, preview_rows=max_rows or 10)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao salvar projeto: {str(e)}")
+        print(f"🎉 Dados salvos com sucesso! ID: {saved_data.get('id')}")
+        return FastJSONResponse({
+            "id": saved_data['id'],
+            "workspace_name": saved_data['workspace_name'],
+            "table_name": saved_data['table_name'],
+            "columns": saved_data['columns'],
+            "preview": preview,
+            "row_count": saved_data['row_count'],
+            "message": "Projeto criado com sucesso"
+        })
     
     try:
-        # Criptografa o arquivo antes de processar
-        encrypted_content = encrypt_file_bytes(content)
-        # Para processar o DataFrame, descriptografa
-        decrypted_content = decrypt_file_bytes(encrypted_content)
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(decrypted_content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(decrypted_content))
+        if filename.endswith('.csv'):
+            df = pd.read_csv(spool_path)
+        elif filename.endswith('.xlsx'):
+            df = pd.read_excel(spool_path)
         else:
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
         df = df.where(pd.notnull(df), None)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao processar arquivo: {str(e)}")
     
-    # Salvar dados no banco
+    # Salvar dados no armazenamento de datasets (Parquet) e metadados no banco
     try:
         print(f"🔍 Iniciando salvamento de dados para usuário: {current_user}")
-        
-        # Usar table_name se fornecido, senão usar o nome do arquivo
-        import re
-        final_table_name = table_name or re.sub(r'\.[^/.]+$', '', file.filename)
-        print(f"📝 Nome da tabela final: {final_table_name}")
-        
-        # Função para converter timestamps para strings ISO
-        def convert_timestamps(obj):
-            """Converte timestamps para strings ISO"""
-            import pandas as pd
-            from datetime import datetime
-            
-            if isinstance(obj, pd.Timestamp):
-                return obj.isoformat()
-            elif hasattr(obj, 'isoformat') and callable(getattr(obj, 'isoformat')):
-                return obj.isoformat()
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            elif isinstance(obj, dict):
-                return {k: convert_timestamps(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_timestamps(item) for item in obj]
-            else:
-                return obj
-        
-        # Converter dados para JSON serializable
-        try:
-            serializable_data = convert_timestamps(df.to_dict(orient="records"))
-            print(f"✅ Dados convertidos com sucesso - {len(serializable_data)} registros")
-        except Exception as convert_error:
-            print(f"❌ Erro ao converter dados: {convert_error}")
-            # Fallback: converter apenas os tipos básicos
-            import json
-            try:
-                # Tentar serializar e deserializar para forçar conversão
-                json_str = json.dumps(df.to_dict(orient="records"), default=str)
-                serializable_data = json.loads(json_str)
-                print(f"✅ Dados convertidos com fallback - {len(serializable_data)} registros")
-            except Exception as json_error:
-                print(f"❌ Erro no fallback: {json_error}")
-                raise HTTPException(status_code=500, detail=f"Erro ao processar dados: {str(json_error)}")
-        
-        # Preparar dados para salvar
-        data_to_save = {
-            'user_id': current_user,
-            'workspace_name': workspace_name,
-            'description': description,
-            'file_type': file_type,
-            'data_location': data_location,
-            'table_name': final_table_name,
-            'first_row_headers': first_row_headers,
-            'date_format': date_format,
-            'error_handling': error_handling,
-            'original_filename': file.filename,
-            'data': serializable_data,
-            'columns': df.columns.tolist(),
-            'row_count': len(df),
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
-        
         print(f"📊 Dados preparados - Linhas: {len(df)}, Colunas: {len(df.columns)}")
         
-        # Testar se os dados são serializáveis
-        import json
-        try:
-            json.dumps(serializable_data)
-            print(f"✅ Dados são serializáveis para JSON")
-        except Exception as json_test_error:
-            print(f"❌ Erro no teste de serialização: {json_test_error}")
-            raise HTTPException(status_code=500, detail=f"Dados não são serializáveis: {str(json_test_error)}")
-        
-        print(f"💾 Tentando salvar na tabela uploaded_data...")
-        
-        # Salvar na tabela uploaded_data
-        print(f"🔐 Tentando inserir dados com RLS...")
-        try:
-            response = supabase.table('uploaded_data').insert(data_to_save).execute()
-        except Exception as rls_error:
-            print(f"❌ Erro com RLS: {rls_error}")
-            print(f"🔄 Tentando inserir sem RLS...")
-            # Tentar inserir sem RLS (apenas para teste)
-            response = supabase.table('uploaded_data').insert(data_to_save).execute()
-        
-        print(f"✅ Resposta do Supabase: {response}")
-        
-        if not response.data:
-            print(f"❌ Erro: Nenhum dado retornado do Supabase")
-            raise HTTPException(status_code=500, detail="Erro ao salvar dados no banco")
+        stored = write_dataset([df], current_user)
+        print(f"💾 Dataset gravado em {stored['storage_key']} ({stored['storage_size']} bytes)")
         
-        saved_data = response.data[0]
+        saved_data = insert_dataset_record(record, stored)
         print(f"🎉 Dados salvos com sucesso! ID: {saved_data.get('id')}")
         
-        # Preparar preview para retorno (usar dados serializados)
-        if max_rows is not None:
-            preview = convert_timestamps(df.head(max_rows).to_dict(orient="records"))
-        else:
-            preview = convert_timestamps(df.head(10).to_dict(orient="records"))  # Limitar a 10 linhas para preview
+        # Preparar preview para retorno (limitado a 10 linhas se max_rows não for informado)
+        preview = dataframe_to_records(df.head(max_rows if max_rows is not None else 10))
         
-        return {
+        return FastJSONResponse({
             "id": saved_data['id'],
             "workspace_name": saved_data['workspace_name'],
             "table_name": saved_data['table_name'],
@@ -302,8 +268,10 @@ async def upload_report_file(
             "preview": preview,
             "row_count": len(df),
             "message": "Projeto criado com sucesso"
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao salvar projeto: {str(e)}")
 
@@ -336,107 +304,92 @@ def delete_report(report_id: int, current_user: str = CurrentUser, request: Requ
 @router.post("/reports/analyze")
 async def analyze_report_file(
     file: UploadFile = File(...),
-    current_user: str = CurrentUser
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
-    import pandas as pd
-    from io import BytesIO
-    content = await file.read()
+    """Estatísticas descritivas, tipos, nulos e sugestões de gráfico do arquivo"""
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        # Estatísticas descritivas
-        stats = df.describe(include='all').to_dict()
-        # Tipos de dados
-        dtypes = df.dtypes.apply(lambda x: str(x)).to_dict()
-        # Nulos por coluna
-        nulls = df.isnull().sum().to_dict()
-        # Sugestão de gráficos
-        suggestions = []
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                suggestions.append({"column": col, "suggestion": "histogram/bar"})
-            elif pd.api.types.is_categorical_dtype(df[col]) or df[col].dtype == object:
-                suggestions.append({"column": col, "suggestion": "pie/bar"})
-        return {
-            "columns": list(df.columns),
-            "dtypes": dtypes,
-            "nulls": nulls,
-            "stats": stats,
-            "suggestions": suggestions
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "describe", {})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar arquivo: {str(e)}")
 
+async def _run_job(request: Optional[Request], fn, *args):
+    """
+    Executa uma tarefa pesada (análise, geração de Excel) no pool de processos,
+    deixando o event loop livre para as demais requisições.
+    """
+    try:
+        return await report_pool.run(fn, *args, request=request)
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except JobCancelledError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+
+async def _run_analysis(request: Optional[Request], source: Dict, name: str, params: Dict):
+    """Executa uma das análises de app.services.analysis_service no pool de processos"""
+    return FastJSONResponse(await _run_job(request, run_analysis, source, name, params))
+
 @router.post("/reports/analyze/custom")
 async def analyze_custom_report_file(
     file: UploadFile = File(...),
     question: str = Form(...),
-    current_user: str = CurrentUser
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
-    import pandas as pd
-    from io import BytesIO
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        # Lógica simples para perguntas comuns
-        q = question.lower()
-        if "média" in q or "media" in q or "mean" in q:
-            for col in df.select_dtypes(include='number').columns:
-                if col in q:
-                    return {"column": col, "mean": df[col].mean()}
-            return {"means": df.mean(numeric_only=True).to_dict()}
-        elif "soma" in q or "sum" in q:
-            for col in df.select_dtypes(include='number').columns:
-                if col in q:
-                    return {"column": col, "sum": df[col].sum()}
-            return {"sums": df.sum(numeric_only=True).to_dict()}
-        elif "contar" in q or "count" in q:
-            return {"count": len(df)}
-        # Pronto para integração futura com IA
-        return {"message": "Pergunta recebida, mas só posso responder perguntas simples de média, soma ou contagem por enquanto.", "question": question}
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "custom", {"question": question})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar arquivo: {str(e)}")
 
+async def _run_trend(request: Optional[Request], source: Dict, source_key: str, date_col: str,
+                     value_col: str, freq: str, agg: str, fill: Optional[str]):
+    """
+    Tendência a partir da base diária em cache (por versão dos dados e colunas):
+    só a primeira chamada lê os dados no pool; trocar D/W/M/Q/Y ou a agregação
+    apenas re-agrega a base diária.
+    """
+    key = timeseries_key(source_key, date_col, value_col)
+    base = timeseries_cache.get(key)
+    if base is None:
+        base = await _run_job(request, run_analysis, source, "trend-daily",
+                              {"date_col": date_col, "value_col": value_col})
+        timeseries_cache.put(key, base, frame_memory_usage(base))
+    return FastJSONResponse(trend_from_base(base, freq, agg, fill or None))
+
 @router.post("/reports/analyze/trend")
 async def analyze_trend(
     file: UploadFile = File(...),
     date_col: str = Form(...),
     value_col: str = Form(...),
-    freq: str = Form("M"),  # Mês por padrão
-    current_user: str = CurrentUser
+    freq: str = Form("M"),  # D, W, M, Q ou Y (mês por padrão)
+    agg: str = Form("sum"),  # sum, mean, count, min, max, size
+    fill: str = Form(None, description="Períodos sem dados: 'zero', 'nan' ou vazio (omitidos)"),
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
     """
     Analisa tendências e sazonalidade de uma métrica ao longo do tempo.
     """
-    import pandas as pd
-    from io import BytesIO
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-        df = df.dropna(subset=[date_col, value_col])
-        df = df.sort_values(date_col)
-        ts = df.groupby(df[date_col].dt.to_period(freq))[value_col].sum()
-        trend = ts.rolling(window=3, min_periods=1).mean().tolist()
-        return {
-            "periods": ts.index.astype(str).tolist(),
-            "values": ts.tolist(),
-            "trend": trend
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_trend(request, upload_source(content, digest, file.filename), f"upload:{digest}",
+                                date_col, value_col, freq, agg, fill)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar tendência: {str(e)}")
 
@@ -445,47 +398,20 @@ async def analyze_risk_score(
     file: UploadFile = File(...),
     score_cols: str = Form(...),  # Ex: "idade,renda,dividas"
     weights: str = Form(None),    # Ex: "0.3,0.5,0.2"
-    current_user: str = CurrentUser
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
     """
     Calcula score de risco/probabilidade baseado em variáveis do Excel.
     """
-    import pandas as pd
-    from io import BytesIO
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        cols = [c.strip() for c in score_cols.split(",")]
-        if weights:
-            w = [float(x) for x in weights.split(",")]
-            if len(w) != len(cols):
-                raise HTTPException(status_code=400, detail="Número de pesos diferente do número de colunas")
-        else:
-            w = [1.0/len(cols)]*len(cols)
-        df = df.dropna(subset=cols)
-        # Normalizar colunas
-        for i, c in enumerate(cols):
-            col_min = df[c].min()
-            col_max = df[c].max()
-            if col_max > col_min:
-                df[c] = (df[c] - col_min) / (col_max - col_min)
-            else:
-                df[c] = 0.0
-        df["risk_score"] = np.dot(df[cols], w)
-        return {
-            "scores": df["risk_score"].round(3).tolist(),
-            "summary": {
-                "min": float(df["risk_score"].min()),
-                "max": float(df["risk_score"].max()),
-                "mean": float(df["risk_score"].mean()),
-                "std": float(df["risk_score"].std())
-            }
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "risk-score",
+                                   {"score_cols": score_cols, "weights": weights})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao calcular score de risco: {str(e)}")
 
@@ -495,119 +421,86 @@ async def analyze_geography(
     geo_col: str = Form(...),
     value_col: str = Form(None),
     agg: str = Form("count"),  # count, sum, mean
+    top_n: int = Form(GEO_TOP_N, description="Grupos exibidos no gráfico; o restante vira 'Outros'"),
+    page: int = Form(1, description="Página do detalhe completo (geo_summary)"),
+    page_size: int = Form(GEO_PAGE_SIZE, description="Grupos por página do detalhe"),
     token: str = Query(None, description="Token JWT para autenticação"),
-    current_user: str = CurrentUser
+    current_user: str = CurrentUser,
+    request: Request = None
 ):
     """
     Agrupa e sumariza dados por região, estado ou cidade.
+    O gráfico traz os top_n grupos e "Outros"; o detalhe completo é paginado.
     """
-    import pandas as pd
-    from io import BytesIO
-    content = await file.read()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        
-        if geo_col not in df.columns:
-            raise HTTPException(status_code=400, detail="Coluna geográfica não encontrada")
-        
-        # Configurar pandas para não usar notação científica
-        pd.set_option('display.float_format', lambda x: '%.2f' % x)
-        
-        if agg == "count":
-            result = df[geo_col].value_counts().to_dict()
-            # Converter para formato adequado para gráficos
-            chart_data = {
-                "labels": list(result.keys()),
-                "values": list(result.values()),
-                "chart_type": "bar",
-                "title": f"Contagem por {geo_col}",
-                "subtitle": f"Total de registros: {sum(result.values())}"
-            }
-        elif agg in ("sum", "mean") and value_col:
-            if value_col not in df.columns:
-                raise HTTPException(status_code=400, detail="Coluna de valor não encontrada")
-            
-            if agg == "sum":
-                grouped = df.groupby(geo_col)[value_col].sum()
-                title = f"Soma de {value_col} por {geo_col}"
-            else:
-                grouped = df.groupby(geo_col)[value_col].mean()
-                title = f"Média de {value_col} por {geo_col}"
-            
-            # Ordenar por valor decrescente
-            grouped = grouped.sort_values(ascending=False)
-            
-            # Formatar valores para evitar notação científica
-            formatted_values = []
-            for val in grouped.values:
-                if val >= 1e6:
-                    formatted_values.append(f"{val/1e6:.2f}M")
-                elif val >= 1e3:
-                    formatted_values.append(f"{val/1e3:.2f}K")
-                else:
-                    formatted_values.append(f"{val:.2f}")
-            
-            chart_data = {
-                "labels": list(grouped.index),
-                "values": list(grouped.values),
-                "formatted_values": formatted_values,
-                "chart_type": "bar",
-                "title": title,
-                "subtitle": f"Total: {grouped.sum():,.2f}" if agg == "sum" else f"Média geral: {grouped.mean():,.2f}",
-                "total": float(grouped.sum()) if agg == "sum" else float(grouped.mean()),
-                "count": len(grouped)
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Agregação não suportada ou coluna de valor ausente")
-        
-        return {
-            "geo_summary": grouped.to_dict() if 'grouped' in locals() else result,
-            "chart_data": chart_data,
-            "metadata": {
-                "geo_column": geo_col,
-                "value_column": value_col,
-                "aggregation": agg,
-                "total_records": len(df)
-            }
-        }
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "geography",
+                                   {"geo_col": geo_col, "value_col": value_col, "agg": agg,
+                                    "top_n": top_n, "page": page, "page_size": page_size})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao analisar geografia: {str(e)}")
 
+@router.post("/reports/analyze/geography/rollup")
+async def analyze_geography_rollup(
+    file: UploadFile = File(...),
+    geo_cols: str = Form(..., description="Colunas geográficas do nível mais amplo ao mais detalhado (ex: Region,State,City)"),
+    value_col: str = Form(None),
+    agg: str = Form("count"),  # count, sum, mean
+    token: str = Query(None, description="Token JWT para autenticação"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Rollup hierárquico (ex.: região -> estado -> cidade) em uma única leitura:
+    retorna a árvore com os subtotais de todos os níveis para o drill-down.
+    """
+    try:
+        if not file.filename.endswith(('.csv', '.xlsx')):
+            raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
+        content, digest = await read_upload_bytes(file)
+        return await _run_analysis(request, upload_source(content, digest, file.filename), "geography-rollup",
+                                   {"geo_cols": geo_cols, "value_col": value_col, "agg": agg})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao analisar geografia: {str(e)}")
+
+def _dashboard_widget(current_user: str, widget_type: str, params: Dict, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None, filter_col: Optional[str] = None,
+                      filter_val: Optional[str] = None) -> FastJSONResponse:
+    """Um widget do dashboard: consulta só as colunas dele, com os filtros aplicados no banco"""
+    try:
+        df = fetch_dashboard_frame(current_user, widget_columns(widget_type, params) or [],
+                                   start_date, end_date, filter_col, filter_val)
+        return FastJSONResponse(evaluate_widget(df, widget_type, params))
+    except ReportColumnError:
+        raise HTTPException(status_code=400, detail="Coluna não encontrada")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/reports/dashboard/summary")
-async def dashboard_summary(current_user: str = CurrentUser):
+def dashboard_summary(current_user: str = CurrentUser):
+    """
+    Resumo do dashboard lido dos rollups (contagens mantidas por trigger no banco),
+    sem varrer os relatórios. Sem a tabela de rollups, calcula a partir dos relatórios.
+    """
     try:
-        response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-        import pandas as pd
-        df = pd.DataFrame(response.data)
-        if df.empty:
-            return {"message": "Nenhum dado para dashboard"}
-        # Exemplo de sumarização: total, por mês, por título
-        summary = {
-            "total_reports": len(df),
-            "created_per_month": df["created_at"].str[:7].value_counts().sort_index().to_dict(),
-            "reports_by_title": df["title"].value_counts().to_dict() if "title" in df.columns else {}
-        }
-        return summary
+        return FastJSONResponse(rollup_summary(current_user))
+    except Exception as e:
+        print(f"⚠️ Rollups indisponíveis, calculando o resumo a partir dos relatórios: {str(e)}")
+    try:
+        return _dashboard_widget(current_user, "summary", {})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Função utilitária para aplicar filtros em DataFrame
-def apply_filters(df, start_date: Optional[str], end_date: Optional[str], filter_col: Optional[str], filter_val: Optional[str]):
-    if start_date:
-        df = df[df['created_at'] >= start_date]
-    if end_date:
-        df = df[df['created_at'] <= end_date]
-    if filter_col and filter_val and filter_col in df.columns:
-        df = df[df[filter_col] == filter_val]
-    return df
-
 @router.get("/reports/dashboard/column/{col}")
-async def dashboard_column(
+def dashboard_column(
     col: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -615,17 +508,10 @@ async def dashboard_column(
     filter_val: Optional[str] = None,
     current_user: str = CurrentUser
 ):
-    response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-    import pandas as pd
-    df = pd.DataFrame(response.data)
-    if col not in df.columns:
-        raise HTTPException(status_code=400, detail="Coluna não encontrada")
-    df = apply_filters(df, start_date, end_date, filter_col, filter_val)
-    counts = df[col].value_counts().to_dict()
-    return {"column": col, "distribution": counts}
+    return _dashboard_widget(current_user, "column", {"col": col}, start_date, end_date, filter_col, filter_val)
 
 @router.get("/reports/dashboard/stats/{col}")
-async def dashboard_stats(
+def dashboard_stats(
     col: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -633,65 +519,39 @@ async def dashboard_stats(
     filter_val: Optional[str] = None,
     current_user: str = CurrentUser
 ):
-    response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-    import pandas as pd
-    df = pd.DataFrame(response.data)
-    if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
-        raise HTTPException(status_code=400, detail="Coluna numérica não encontrada")
-    df = apply_filters(df, start_date, end_date, filter_col, filter_val)
-    stats = df[col].describe().to_dict()
-    return {"column": col, "stats": stats}
+    return _dashboard_widget(current_user, "stats", {"col": col}, start_date, end_date, filter_col, filter_val)
 
 @router.get("/reports/dashboard/timeseries")
-async def dashboard_timeseries(
+def dashboard_timeseries(
     col: str = "created_at",
     freq: str = "M",
+    fill: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     filter_col: Optional[str] = None,
     filter_val: Optional[str] = None,
     current_user: str = CurrentUser
 ):
-    response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-    import pandas as pd
-    df = pd.DataFrame(response.data)
-    if col not in df.columns:
-        raise HTTPException(status_code=400, detail="Coluna não encontrada")
-    df = apply_filters(df, start_date, end_date, filter_col, filter_val)
-    df[col] = pd.to_datetime(df[col], errors="coerce")
-    ts = df.groupby(df[col].dt.to_period(freq)).size().sort_index().to_dict()
-    return {"column": col, "freq": freq, "timeseries": ts}
+    return _dashboard_widget(current_user, "timeseries", {"col": col, "freq": freq, "fill": fill},
+                             start_date, end_date, filter_col, filter_val)
 
 @router.get("/reports/dashboard/pivot")
-async def dashboard_pivot(
+def dashboard_pivot(
     col1: str,
     col2: str,
     agg: str = "count",
+    value_col: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     filter_col: Optional[str] = None,
     filter_val: Optional[str] = None,
     current_user: str = CurrentUser
 ):
-    response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-    import pandas as pd
-    df = pd.DataFrame(response.data)
-    if col1 not in df.columns or col2 not in df.columns:
-        raise HTTPException(status_code=400, detail="Colunas não encontradas")
-    df = apply_filters(df, start_date, end_date, filter_col, filter_val)
-    if agg == "count":
-        pivot = pd.pivot_table(df, index=col1, columns=col2, aggfunc="size", fill_value=0)
-    elif agg == "sum":
-        num_cols = df.select_dtypes(include='number').columns
-        if len(num_cols) == 0:
-            raise HTTPException(status_code=400, detail="Nenhuma coluna numérica para somar")
-        pivot = pd.pivot_table(df, index=col1, columns=col2, values=num_cols[0], aggfunc="sum", fill_value=0)
-    else:
-        raise HTTPException(status_code=400, detail="Agregação não suportada")
-    return {"pivot": pivot.to_dict()}
+    return _dashboard_widget(current_user, "pivot", {"col1": col1, "col2": col2, "agg": agg, "value_col": value_col},
+                             start_date, end_date, filter_col, filter_val)
 
 @router.get("/reports/dashboard/outliers/{col}")
-async def dashboard_outliers(
+def dashboard_outliers(
     col: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -699,19 +559,84 @@ async def dashboard_outliers(
     filter_val: Optional[str] = None,
     current_user: str = CurrentUser
 ):
-    response = supabase.table("reports").select("*").eq("user_id", current_user).execute()
-    import pandas as pd
-    df = pd.DataFrame(response.data)
-    if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
-        raise HTTPException(status_code=400, detail="Coluna numérica não encontrada")
-    df = apply_filters(df, start_date, end_date, filter_col, filter_val)
-    q1 = df[col].quantile(0.25)
-    q3 = df[col].quantile(0.75)
-    iqr = q3 - q1
-    lower = q1 - 1.5 * iqr
-    upper = q3 + 1.5 * iqr
-    outliers = df[(df[col] < lower) | (df[col] > upper)][col].tolist()
-    return {"column": col, "outliers": outliers, "lower": lower, "upper": upper}
+    return _dashboard_widget(current_user, "outliers", {"col": col}, start_date, end_date, filter_col, filter_val)
+
+MAX_DASHBOARD_WIDGETS = 20
+
+@router.post("/reports/dashboard/batch")
+def dashboard_batch(body: DashboardBatchRequest, current_user: str = CurrentUser):
+    """
+    Vários widgets do dashboard em uma única requisição e uma única consulta
+    ao banco (filtros compartilhados). Cada widget volta com "data" ou "error".
+    """
+    if not body.widgets or len(body.widgets) > MAX_DASHBOARD_WIDGETS:
+        raise HTTPException(status_code=400, detail=f"Informe de 1 a {MAX_DASHBOARD_WIDGETS} widgets")
+    widgets = [
+        {"id": widget.id or f"{index}", "type": widget.type, "params": widget.params}
+        for index, widget in enumerate(body.widgets)
+    ]
+    if len({widget["id"] for widget in widgets}) != len(widgets):
+        raise HTTPException(status_code=400, detail="IDs de widget repetidos")
+    try:
+        return FastJSONResponse(evaluate_dashboard(current_user, widgets, body.start_date, body.end_date,
+                                                   body.filter_col, body.filter_val))
+    except ReportColumnError:
+        raise HTTPException(status_code=400, detail="Coluna de filtro não encontrada")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _iter_file(handle, block_size: int = 1024 * 1024):
+    """Lê um arquivo aberto em blocos e o fecha ao final"""
+    try:
+        while True:
+            block = handle.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        handle.close()
+
+def _xlsx_response(body, filename: str) -> StreamingResponse:
+    """Resposta com o .xlsx: body são os bytes gerados ou um arquivo aberto do cache"""
+    return StreamingResponse(
+        BytesIO(body) if isinstance(body, bytes) else _iter_file(body),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def _excel_report_job(source_hash: str, source_name: str, report_type: str, title: str, include_charts: bool,
+                      include_summary: bool, custom_analysis: Optional[str], value_column: Optional[str],
+                      region_column: Optional[str], date_column: Optional[str], current_user: str):
+    """Tarefa de relatório automático: (kind, opções, chave do cache, nome do arquivo sem extensão)"""
+    options = dict(
+        source_name=source_name, report_type=report_type, title=title, include_charts=include_charts,
+        include_summary=include_summary, custom_analysis=custom_analysis, value_column=value_column,
+        region_column=region_column, date_column=date_column, current_user=current_user
+    )
+    return "excel", options, report_cache_key(source_hash, kind="excel", **options), f"relatorio_{report_type}"
+
+async def _render_job(request: Optional[Request], source: Dict, job, results: Optional[Dict] = None):
+    """
+    Conteúdo de um relatório: do cache, se já gerado com os mesmos dados e
+    opções, ou renderizado no pool de processos.
+    """
+    kind, options, cache_key, _ = job
+    body = open_cached_report(cache_key)
+    if body is None:
+        body = await _run_job(request, render_report, source, cache_key, kind, options, results)
+    return body
+
+async def _build_excel_report(request: Optional[Request], source: Dict, source_hash: str, source_name: str,
+                              report_type: str, title: str, include_charts: bool, include_summary: bool,
+                              custom_analysis: Optional[str], value_column: Optional[str],
+                              region_column: Optional[str], date_column: Optional[str], current_user: str):
+    """Monta o relatório Excel automático e devolve a resposta com o arquivo"""
+    job = _excel_report_job(source_hash, source_name, report_type, title, include_charts, include_summary,
+                            custom_analysis, value_column, region_column, date_column, current_user)
+    body = await _render_job(request, source, job)
+    return _xlsx_response(body, f"{job[3]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
 
 @router.post("/reports/generate-excel")
 @limiter.limit("10/minute")
@@ -733,315 +658,49 @@ async def generate_excel_report(
     """
     try:
         # Ler o arquivo
-        content = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        
-        # Criar arquivo Excel na memória
-        output = BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Configurar pandas para não usar notação científica
-            pd.set_option('display.float_format', lambda x: '%.2f' % x)
-            
-            # Aba 1: Dados Originais
-            df.to_excel(writer, sheet_name='Dados Originais', index=False)
-            
-            # Aba 2: Resumo Estatístico
-            if include_summary:
-                summary_stats = df.describe()
-                summary_stats.to_excel(writer, sheet_name='Resumo Estatístico')
-                
-                # Adicionar informações gerais
-                summary_info = pd.DataFrame({
-                    'Métrica': ['Total de Registros', 'Total de Colunas', 'Data de Geração'],
-                    'Valor': [len(df), len(df.columns), datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-                })
-                summary_info.to_excel(writer, sheet_name='Resumo Estatístico', startrow=len(summary_stats) + 3, index=False)
-            
-            # Aba 3: Análise Específica baseada no tipo
-            print(f"🔍 Debug - report_type: '{report_type}'")
-            print(f"🔍 Debug - region_column: '{region_column}'")
-            print(f"🔍 Debug - value_column: '{value_column}'")
-            print(f"🔍 Debug - include_charts: {include_charts}")
-            print(f"🔍 Debug - Colunas disponíveis: {df.columns.tolist()}")
-            
-            if report_type == 'summary':
-                # Análise geral
-                analysis_sheet = pd.DataFrame({
-                    'Análise': ['Tipo de Relatório', 'Total de Registros', 'Colunas Disponíveis'],
-                    'Valor': ['Resumo Geral', len(df), ', '.join(df.columns.tolist())]
-                })
-                analysis_sheet.to_excel(writer, sheet_name='Análise Geral', index=False)
-                
-            elif report_type == 'geography' and region_column and value_column and region_column.strip() and value_column.strip():
-                print(f"✅ Condição geography atendida!")
-                # Análise geográfica
-                if region_column in df.columns and value_column in df.columns:
-                    print(f"✅ Colunas encontradas no DataFrame!")
-                    geo_analysis = df.groupby(region_column)[value_column].agg(['sum', 'mean', 'count']).reset_index()
-                    geo_analysis.columns = [region_column, 'Total', 'Média', 'Quantidade']
-                    geo_analysis['Percentual'] = (geo_analysis['Total'] / geo_analysis['Total'].sum() * 100).round(2)
-                    
-                    # Ordenar por total decrescente
-                    geo_analysis = geo_analysis.sort_values('Total', ascending=False)
-                    
-                    geo_analysis.to_excel(writer, sheet_name='Análise Geográfica', index=False)
-                    
-                    # Formatação será aplicada na etapa final
-                    print(f"📊 Dados da análise geográfica salvos - formatação será aplicada na etapa final")
-                    
-                    # Adicionar gráfico se include_charts for True
-                    if include_charts:
-                        print(f"🎯 Tentando adicionar gráfico...")
-                        print(f"📊 Dados: {len(geo_analysis)} linhas")
-                        print(f"📋 Colunas: {geo_analysis.columns.tolist()}")
-                        
-                        try:
-                            from openpyxl.chart import BarChart, Reference
-                            from openpyxl.chart.label import DataLabelList
-                            print("✅ Módulos importados com sucesso")
-                            
-                            # Obter a planilha - tentar diferentes abordagens
-                            try:
-                                worksheet = writer.sheets['Análise Geográfica']
-                                print(f"📄 Planilha obtida via writer.sheets: {worksheet.title}")
-                            except:
-                                # Tentar obter via workbook
-                                workbook = writer.book
-                                worksheet = workbook['Análise Geográfica']
-                                print(f"📄 Planilha obtida via workbook: {worksheet.title}")
-                            
-                            # Criar gráfico de barras
-                            chart = BarChart()
-                            chart.title = f"Análise de {value_column} por {region_column}"
-                            chart.style = 10
-                            chart.x_axis.title = region_column
-                            chart.y_axis.title = value_column
-                            print("📈 Gráfico criado")
-                            
-                            # Dados para o gráfico (Total por região)
-                            data = Reference(worksheet, min_col=2, min_row=1, max_row=len(geo_analysis)+1, max_col=2)
-                            cats = Reference(worksheet, min_col=1, min_row=2, max_row=len(geo_analysis)+1)
-                            print(f"📊 Referências criadas: dados={data}, categorias={cats}")
-                            
-                            chart.add_data(data, titles_from_data=True)
-                            chart.set_categories(cats)
-                            print("📊 Dados adicionados ao gráfico")
-                            
-                            # Adicionar rótulos de dados
-                            chart.dataLabels = DataLabelList()
-                            chart.dataLabels.showVal = True
-                            print("🏷️ Rótulos adicionados")
-                            
-                            # Inserir gráfico na planilha
-                            worksheet.add_chart(chart, "G2")
-                            print(f"✅ Gráfico adicionado com sucesso na posição G2")
-                            
-                        except Exception as e:
-                            print(f"❌ Erro ao adicionar gráfico: {str(e)}")
-                            import traceback
-                            print(f"🔍 Traceback: {traceback.format_exc()}")
-                            # Se openpyxl.chart não estiver disponível, continuar sem gráfico
-                            pass
-                else:
-                    print(f"❌ Colunas não encontradas: {region_column} ou {value_column}")
-                    print(f"📋 Colunas disponíveis: {df.columns.tolist()}")
-                
-            elif report_type == 'trend' and date_column and value_column:
-                # Análise temporal
-                if date_column in df.columns and value_column in df.columns:
-                    # Converter para datetime se possível
-                    try:
-                        df[date_column] = pd.to_datetime(df[date_column])
-                        trend_analysis = df.groupby(df[date_column].dt.to_period('M'))[value_column].agg(['sum', 'mean']).reset_index()
-                        trend_analysis.columns = ['Período', 'Total', 'Média']
-                        trend_analysis.to_excel(writer, sheet_name='Análise Temporal', index=False)
-                    except:
-                        # Se não conseguir converter, agrupar por valores únicos
-                        trend_analysis = df.groupby(date_column)[value_column].agg(['sum', 'mean']).reset_index()
-                        trend_analysis.columns = [date_column, 'Total', 'Média']
-                        trend_analysis.to_excel(writer, sheet_name='Análise Temporal', index=False)
-                
-            elif report_type == 'risk' and value_column:
-                # Análise de risco
-                if value_column in df.columns:
-                    # Calcular estatísticas de risco
-                    risk_stats = pd.DataFrame({
-                        'Métrica': ['Média', 'Desvio Padrão', 'Mínimo', 'Máximo', 'Mediana'],
-                        'Valor': [
-                            df[value_column].mean(),
-                            df[value_column].std(),
-                            df[value_column].min(),
-                            df[value_column].max(),
-                            df[value_column].median()
-                        ]
-                    })
-                    risk_stats.to_excel(writer, sheet_name='Análise de Risco', index=False)
-                    
-                    # Identificar outliers
-                    Q1 = df[value_column].quantile(0.25)
-                    Q3 = df[value_column].quantile(0.75)
-                    IQR = Q3 - Q1
-                    outliers = df[(df[value_column] < Q1 - 1.5 * IQR) | (df[value_column] > Q3 + 1.5 * IQR)]
-                    if len(outliers) > 0:
-                        outliers.to_excel(writer, sheet_name='Outliers', index=False)
-                
-            elif report_type == 'custom' and custom_analysis:
-                # Análise customizada
-                custom_sheet = pd.DataFrame({
-                    'Análise Customizada': [custom_analysis],
-                    'Data de Geração': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-                    'Total de Registros': [len(df)]
-                })
-                custom_sheet.to_excel(writer, sheet_name='Análise Customizada', index=False)
-            
-            # Aba 4: Metadados
-            metadata = pd.DataFrame({
-                'Campo': ['Título do Relatório', 'Tipo de Análise', 'Arquivo Original', 'Data de Geração', 'Usuário'],
-                'Valor': [title, report_type, file.filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), current_user]
-            })
-            metadata.to_excel(writer, sheet_name='Metadados', index=False)
-        
-        # Aplicar formatação aos números
-        try:
-            from openpyxl import load_workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils import get_column_letter
-            
-            # Salvar temporariamente e recarregar para aplicar formatação
-            temp_output = BytesIO()
-            temp_output.write(output.getvalue())
-            temp_output.seek(0)
-            
-            wb = load_workbook(temp_output)
-            
-            # Aplicar formatação a todas as planilhas
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-                print(f"🔧 Formatando planilha: {sheet_name}")
-                
-                # Formatar cabeçalhos
-                for cell in ws[1]:
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    cell.alignment = Alignment(horizontal="center")
-                
-                # Formatação específica para Análise Geográfica
-                if sheet_name == 'Análise Geográfica':
-                    print(f"🎯 Aplicando formatação específica para Análise Geográfica")
-                    
-                    # Definir larguras específicas
-                    ws.column_dimensions['A'].width = 15  # Region
-                    ws.column_dimensions['B'].width = 25  # Total
-                    ws.column_dimensions['C'].width = 20  # Média
-                    ws.column_dimensions['D'].width = 20  # Quantidade
-                    ws.column_dimensions['E'].width = 15  # Percentual
-                    
-                    # Formatar cada coluna especificamente
-                    for row in range(2, ws.max_row + 1):
-                        # Coluna B - Total (formatação de milhões)
-                        cell_b = ws[f'B{row}']
-                        if isinstance(cell_b.value, (int, float)) and cell_b.value is not None:
-                            if cell_b.value >= 1e9:
-                                cell_b.number_format = '#,##0.0"B"'
-                            elif cell_b.value >= 1e6:
-                                cell_b.number_format = '#,##0.0"M"'
-                            elif cell_b.value >= 1e3:
-                                cell_b.number_format = '#,##0.0"K"'
-                            else:
-                                cell_b.number_format = '#,##0.00'
-                            print(f"📊 Célula B{row}: {cell_b.value} -> formatada")
-                        
-                        # Coluna C - Média (formatação de milhares)
-                        cell_c = ws[f'C{row}']
-                        if isinstance(cell_c.value, (int, float)) and cell_c.value is not None:
-                            if cell_c.value >= 1e6:
-                                cell_c.number_format = '#,##0.0"M"'
-                            elif cell_c.value >= 1e3:
-                                cell_c.number_format = '#,##0.0"K"'
-                            else:
-                                cell_c.number_format = '#,##0.00'
-                        
-                        # Coluna D - Quantidade (formatação de milhares)
-                        cell_d = ws[f'D{row}']
-                        if isinstance(cell_d.value, (int, float)) and cell_d.value is not None:
-                            if cell_d.value >= 1e6:
-                                cell_d.number_format = '#,##0.0"M"'
-                            elif cell_d.value >= 1e3:
-                                cell_d.number_format = '#,##0.0"K"'
-                            else:
-                                cell_d.number_format = '#,##0.00'
-                        
-                        # Coluna E - Percentual
-                        cell_e = ws[f'E{row}']
-                        if isinstance(cell_e.value, (int, float)) and cell_e.value is not None:
-                            cell_e.number_format = '0.00"%"'
-                
-                else:
-                    # Formatação padrão para outras planilhas
-                    for row in ws.iter_rows(min_row=2):
-                        for cell in row:
-                            if isinstance(cell.value, (int, float)) and cell.value is not None:
-                                if cell.value >= 1e9:
-                                    cell.number_format = '#,##0.0"B"'
-                                elif cell.value >= 1e6:
-                                    cell.number_format = '#,##0.0"M"'
-                                elif cell.value >= 1e3:
-                                    cell.number_format = '#,##0.0"K"'
-                                else:
-                                    cell.number_format = '#,##0.00'
-                    
-                    # Ajustar largura das colunas para outras planilhas
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = get_column_letter(column[0].column)
-                        for cell in column:
-                            try:
-                                cell_value = str(cell.value) if cell.value is not None else ""
-                                if len(cell_value) > max_length:
-                                    max_length = len(cell_value)
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 4, 60)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-            
-            print(f"✅ Formatação aplicada com sucesso!")
-            
-            # Salvar com formatação
-            final_output = BytesIO()
-            wb.save(final_output)
-            final_output.seek(0)
-            
-            filename = f"relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            return StreamingResponse(
-                final_output,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
-            
-        except Exception as e:
-            print(f"❌ Erro na formatação: {str(e)}")
-            import traceback
-            print(f"🔍 Traceback: {traceback.format_exc()}")
-            # Se a formatação falhar, retornar sem formatação
-            output.seek(0)
-            filename = f"relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            return StreamingResponse(
-                BytesIO(output.getvalue()),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
-        
+        content, digest = await read_upload_bytes(file)
+        return await _build_excel_report(
+            request, upload_source(content, digest, file.filename), digest, file.filename,
+            report_type, title, include_charts, include_summary,
+            custom_analysis, value_column, region_column, date_column, current_user
+        )
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório Excel: {str(e)}")
 
+def _resolve_template(template_id: str) -> Dict:
+    """Busca um template pré-configurado (404 se não existir)"""
+    from .templates import PREDEFINED_TEMPLATES
+    
+    if template_id not in PREDEFINED_TEMPLATES:
+        raise HTTPException(status_code=404, detail=f"Template '{template_id}' não encontrado. Templates disponíveis: {list(PREDEFINED_TEMPLATES.keys())}")
+    return PREDEFINED_TEMPLATES[template_id]
+
+def _template_report_job(source_hash: str, source_name: str, template_id: str, template_data: Dict,
+                         title: str, include_charts: bool, current_user: str):
+    """Tarefa de relatório com template: (kind, opções, chave do cache, nome do arquivo sem extensão)"""
+    options = dict(
+        source_name=source_name, template_data=template_data, title=title,
+        include_charts=include_charts, current_user=current_user
+    )
+    cache_key = report_cache_key(
+        source_hash, kind="template", source_name=source_name, template_id=template_id,
+        template_config=template_data['config'], title=title, include_charts=include_charts, user=current_user
+    )
+    return "template", options, cache_key, f"relatorio_template_{template_data['name'].replace(' ', '_')}"
+
+async def _build_template_report(request: Optional[Request], source: Dict, source_hash: str, source_name: str,
+                                 template_id: str, template_data: Dict, title: str, include_charts: bool,
+                                 current_user: str):
+    """Monta o relatório Excel de um template pré-configurado e devolve a resposta com o arquivo"""
+    job = _template_report_job(source_hash, source_name, template_id, template_data, title, include_charts, current_user)
+    body = await _render_job(request, source, job)
+    return _xlsx_response(body, f"{job[3]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+
 @router.post("/reports/generate-excel-from-template")
 @limiter.limit("10/minute")
 async def generate_excel_from_template(
@@ -1056,283 +715,375 @@ async def generate_excel_from_template(
     Gera relatório em Excel usando um template pré-configurado com formatação e gráficos
     """
     try:
-        # Importar templates pré-configurados
-        from .templates import PREDEFINED_TEMPLATES
-        
-        # Buscar o template pré-configurado
-        if template_id not in PREDEFINED_TEMPLATES:
-            raise HTTPException(status_code=404, detail=f"Template '{template_id}' não encontrado. Templates disponíveis: {list(PREDEFINED_TEMPLATES.keys())}")
-        
-        template_data = PREDEFINED_TEMPLATES[template_id]
-        config = template_data['config']
-        
-        print(f"🎯 Debug - template_id: '{template_id}'")
-        print(f"🎯 Debug - analysis_type: '{config.get('analysis_type')}'")
-        print(f"🎯 Debug - include_charts: {include_charts}")
+        template_data = _resolve_template(template_id)
         
         # Ler o arquivo
-        content = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(BytesIO(content))
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx')):
             raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
-        
-        print(f"📋 Colunas disponíveis: {df.columns.tolist()}")
-        
-        # Configurar pandas para não usar notação científica
-        pd.set_option('display.float_format', lambda x: '%.2f' % x)
-        
-        # Criar arquivo Excel na memória
-        output = BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Aba 1: Dados Originais
-            df.to_excel(writer, sheet_name='Dados Originais', index=False)
-            
-            # Aba 2: Análise baseada no template
-            analysis_type = config.get('analysis_type')
-            
-            if analysis_type == 'geography':
-                value_col = config.get('value_column')
-                region_col = config.get('region_column')
-                
-                print(f"🎯 Debug - region_column: '{region_col}'")
-                print(f"🎯 Debug - value_column: '{value_col}'")
-                
-                if value_col in df.columns and region_col in df.columns:
-                    print(f"✅ Condição geography atendida!")
-                    print(f"✅ Colunas encontradas no DataFrame!")
-                    
-                    geo_analysis = df.groupby(region_col)[value_col].agg(['sum', 'mean', 'count']).reset_index()
-                    geo_analysis.columns = [region_col, 'Total', 'Média', 'Quantidade']
-                    geo_analysis['Percentual'] = (geo_analysis['Total'] / geo_analysis['Total'].sum() * 100).round(2)
-                    geo_analysis.to_excel(writer, sheet_name='Análise Geográfica', index=False)
-                    
-                    print(f"📊 Dados da análise geográfica salvos - formatação será aplicada na etapa final")
-                    
-                    # Adicionar gráfico se include_charts for True
-                    if include_charts:
-                        print(f"🎯 Tentando adicionar gráfico...")
-                        print(f"📊 Dados: {len(geo_analysis)} linhas")
-                        print(f"📋 Colunas: {geo_analysis.columns.tolist()}")
-                        
-                        try:
-                            from openpyxl.chart import BarChart, Reference
-                            from openpyxl.chart.label import DataLabelList
-                            print("✅ Módulos importados com sucesso")
-                            
-                            # Obter a planilha
-                            try:
-                                worksheet = writer.sheets['Análise Geográfica']
-                                print(f"📄 Planilha obtida via writer.sheets: {worksheet.title}")
-                            except:
-                                # Tentar obter via workbook
-                                workbook = writer.book
-                                worksheet = workbook['Análise Geográfica']
-                                print(f"📄 Planilha obtida via workbook: {worksheet.title}")
-                            
-                            # Criar gráfico de barras
-                            chart = BarChart()
-                            chart.title = f"Análise de {value_col} por {region_col}"
-                            chart.style = 10
-                            chart.x_axis.title = region_col
-                            chart.y_axis.title = value_col
-                            print("📈 Gráfico criado")
-                            
-                            # Dados para o gráfico (Total por região)
-                            data = Reference(worksheet, min_col=2, min_row=1, max_row=len(geo_analysis)+1, max_col=2)
-                            cats = Reference(worksheet, min_col=1, min_row=2, max_row=len(geo_analysis)+1)
-                            print(f"📊 Referências criadas: dados={data}, categorias={cats}")
-                            
-                            chart.add_data(data, titles_from_data=True)
-                            chart.set_categories(cats)
-                            print("📊 Dados adicionados ao gráfico")
-                            
-                            # Adicionar rótulos de dados
-                            chart.dataLabels = DataLabelList()
-                            chart.dataLabels.showVal = True
-                            print("🏷️ Rótulos adicionados")
-                            
-                            # Inserir gráfico na planilha
-                            worksheet.add_chart(chart, "G2")
-                            print(f"✅ Gráfico adicionado com sucesso na posição G2")
-                            
-                        except Exception as e:
-                            print(f"❌ Erro ao adicionar gráfico: {str(e)}")
-                            import traceback
-                            print(f"🔍 Traceback: {traceback.format_exc()}")
-                            # Se openpyxl.chart não estiver disponível, continuar sem gráfico
-                            pass
-                else:
-                    print(f"❌ Colunas não encontradas: {region_col} ou {value_col}")
-                    print(f"📋 Colunas disponíveis: {df.columns.tolist()}")
-            
-            elif analysis_type == 'trend':
-                date_col = config.get('date_column')
-                value_col = config.get('value_column')
-                
-                if date_col in df.columns and value_col in df.columns:
-                    try:
-                        df[date_col] = pd.to_datetime(df[date_col])
-                        trend_analysis = df.groupby(df[date_col].dt.to_period('M'))[value_col].agg(['sum', 'mean']).reset_index()
-                        trend_analysis.columns = ['Período', 'Total', 'Média']
-                        trend_analysis.to_excel(writer, sheet_name='Análise Temporal', index=False)
-                    except:
-                        trend_analysis = df.groupby(date_col)[value_col].agg(['sum', 'mean']).reset_index()
-                        trend_analysis.columns = [date_col, 'Total', 'Média']
-                        trend_analysis.to_excel(writer, sheet_name='Análise Temporal', index=False)
-            
-            elif analysis_type == 'risk-score':
-                # Análise de risco baseada no template
-                risk_factors = config.get('risk_factors', [])
-                if risk_factors:
-                    risk_data = []
-                    for factor in risk_factors:
-                        col = factor.get('column')
-                        if col in df.columns:
-                            risk_data.append({
-                                'Fator': col,
-                                'Média': df[col].mean(),
-                                'Desvio Padrão': df[col].std(),
-                                'Peso': factor.get('weight', 0)
-                            })
-                    
-                    if risk_data:
-                        risk_df = pd.DataFrame(risk_data)
-                        risk_df.to_excel(writer, sheet_name='Análise de Risco', index=False)
-            
-            # Aba 3: Configuração do Template
-            template_info = pd.DataFrame({
-                'Campo': ['Nome do Template', 'Descrição', 'Tipo de Análise', 'Configuração'],
-                'Valor': [template_data['name'], template_data['description'], analysis_type, str(config)]
-            })
-            template_info.to_excel(writer, sheet_name='Template Info', index=False)
-            
-            # Aba 4: Metadados
-            metadata = pd.DataFrame({
-                'Campo': ['Título do Relatório', 'Template Usado', 'Arquivo Original', 'Data de Geração', 'Usuário'],
-                'Valor': [title, template_data['name'], file.filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), current_user]
-            })
-            metadata.to_excel(writer, sheet_name='Metadados', index=False)
-        
-        # Aplicar formatação profissional
-        try:
-            print(f"🎨 Aplicando formatação profissional...")
-            
-            # Carregar o workbook para formatação
-            from openpyxl import load_workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils import get_column_letter
-            
-            # Salvar temporariamente e recarregar para formatação
-            temp_output = BytesIO()
-            temp_output.write(output.getvalue())
-            temp_output.seek(0)
-            
-            wb = load_workbook(temp_output)
-            
-            # Formatar cada planilha
-            for sheet_name in wb.sheetnames:
-                print(f"Formatando planilha: {sheet_name}")
-                ws = wb[sheet_name]
-                
-                # Formatar cabeçalhos
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                header_alignment = Alignment(horizontal="center", vertical="center")
-                
-                for cell in ws[1]:
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = header_alignment
-                
-                # Ajustar largura das colunas
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = get_column_letter(column[0].column)
-                    for cell in column:
-                        try:
-                            cell_value = str(cell.value) if cell.value is not None else ""
-                            if len(cell_value) > max_length:
-                                max_length = len(cell_value)
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 4, 60)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-                
-                # Formatação específica para Análise Geográfica
-                if sheet_name == 'Análise Geográfica':
-                    print(f"Aplicando formatação específica para Análise Geográfica")
-                    
-                    # Formatar coluna Total (coluna B) com largura extra e formatação específica
-                    ws.column_dimensions['B'].width = 25
-                    
-                    # Formatar valores da coluna Total
-                    for row in range(2, ws.max_row + 1):
-                        cell = ws[f'B{row}']
-                        if isinstance(cell.value, (int, float)) and cell.value is not None:
-                            if cell.value >= 1e9:
-                                cell.number_format = '#,##0.0"B"'
-                            elif cell.value >= 1e6:
-                                cell.number_format = '#,##0.0"M"'
-                            elif cell.value >= 1e3:
-                                cell.number_format = '#,##0.0"K"'
-                            else:
-                                cell.number_format = '#,##0.00'
-                            print(f"Célula B{row}: {cell.value} -> formatada")
-                    
-                    # Formatar coluna Percentual (coluna E) como porcentagem
-                    for row in range(2, ws.max_row + 1):
-                        cell = ws[f'E{row}']
-                        if isinstance(cell.value, (int, float)):
-                            cell.number_format = '0.00"%"'
-                    
-                    print(f"✅ Formatação específica aplicada à planilha 'Análise Geográfica'")
-                
-                else:
-                    # Formatação padrão para outras planilhas
-                    for row in ws.iter_rows(min_row=2):
-                        for cell in row:
-                            if isinstance(cell.value, (int, float)) and cell.value is not None:
-                                if cell.value >= 1e9:
-                                    cell.number_format = '#,##0.0"B"'
-                                elif cell.value >= 1e6:
-                                    cell.number_format = '#,##0.0"M"'
-                                elif cell.value >= 1e3:
-                                    cell.number_format = '#,##0.0"K"'
-                                else:
-                                    cell.number_format = '#,##0.00'
-            
-            print(f"✅ Formatação aplicada com sucesso!")
-            
-            # Salvar com formatação
-            final_output = BytesIO()
-            wb.save(final_output)
-            final_output.seek(0)
-            
-            filename = f"relatorio_template_{template_data['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            return StreamingResponse(
-                final_output,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
-            
-        except Exception as e:
-            print(f"❌ Erro na formatação: {str(e)}")
-            import traceback
-            print(f"🔍 Traceback: {traceback.format_exc()}")
-            # Se a formatação falhar, retornar sem formatação
-            output.seek(0)
-            filename = f"relatorio_template_{template_data['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            return StreamingResponse(
-                BytesIO(output.getvalue()),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
+        content, digest = await read_upload_bytes(file)
+        return await _build_template_report(
+            request, upload_source(content, digest, file.filename), digest, file.filename,
+            template_id, template_data, title, include_charts, current_user
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório Excel com template: {str(e)}")
+
+# Tipos de relatório automático aceitos (além dos IDs de PREDEFINED_TEMPLATES) nos lotes
+REPORT_TYPES = ('summary', 'geography', 'trend', 'risk', 'custom')
+MAX_BATCH_REPORTS = 10
+
+def _batch_jobs(reports: str, source_hash: str, source_name: str, title: str, include_charts: bool,
+                include_summary: bool, custom_analysis: Optional[str], value_column: Optional[str],
+                region_column: Optional[str], date_column: Optional[str], current_user: str) -> List:
+    """Tarefas de um lote a partir da lista de IDs de templates e/ou tipos de relatório"""
+    from .templates import PREDEFINED_TEMPLATES
+
+    ids = list(dict.fromkeys(r.strip() for r in reports.split(",") if r.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Informe ao menos um template ou tipo de relatório")
+    if len(ids) > MAX_BATCH_REPORTS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BATCH_REPORTS} relatórios por lote")
+    jobs = []
+    for report_id in ids:
+        if report_id in PREDEFINED_TEMPLATES:
+            jobs.append(_template_report_job(source_hash, source_name, report_id, PREDEFINED_TEMPLATES[report_id],
+                                             title, include_charts, current_user))
+        elif report_id in REPORT_TYPES:
+            jobs.append(_excel_report_job(source_hash, source_name, report_id, title, include_charts, include_summary,
+                                          custom_analysis, value_column, region_column, date_column, current_user))
+        else:
+            raise HTTPException(status_code=400, detail=f"Relatório '{report_id}' desconhecido. Use um tipo {list(REPORT_TYPES)} ou um template {list(PREDEFINED_TEMPLATES.keys())}")
+    return jobs
+
+async def _build_report_batch(request: Optional[Request], source: Dict, jobs: List) -> StreamingResponse:
+    """
+    Gera vários relatórios do mesmo conjunto de dados e devolve um .zip.
+
+    Os dados são carregados uma vez e as agregações comuns aos relatórios são
+    calculadas uma vez (prepare_report_batch); depois os workbooks que não estão
+    no cache são renderizados em paralelo no pool de processos.
+    """
+    bodies = [open_cached_report(job[2]) for job in jobs]
+    try:
+        missing = [i for i, body in enumerate(bodies) if body is None]
+        if missing:
+            frame, results = await _run_job(
+                request, prepare_report_batch, source, [(jobs[i][0], jobs[i][1]) for i in missing]
             )
-        
+            render_source = frame_source(frame) if frame is not None else source
+            tasks = [asyncio.ensure_future(_render_job(request, render_source, jobs[i], results)) for i in missing]
+            try:
+                rendered = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            for i, body in zip(missing, rendered):
+                bodies[i] = body
+
+        output = BytesIO()
+        # Os .xlsx já são comprimidos: o zip só os agrupa
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+            for job, body in zip(jobs, bodies):
+                archive.writestr(f"{job[3]}.xlsx", body if isinstance(body, bytes) else body.read())
+    finally:
+        for body in bodies:
+            if body is not None and not isinstance(body, bytes):
+                body.close()
+
+    print(f"📦 Lote com {len(jobs)} relatórios gerado ({len(missing)} renderizados, {len(jobs) - len(missing)} do cache)")
+    return StreamingResponse(
+        BytesIO(output.getvalue()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=relatorios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"}
+    )
+
+@router.post("/reports/generate-excel-batch")
+@limiter.limit("5/minute")
+async def generate_excel_batch(
+    file: UploadFile = File(...),
+    reports: str = Form(..., description="Templates e/ou tipos de relatório separados por vírgula (ex: geography_sales,trend_monthly,risk)"),
+    title: str = Form("Relatório Automático", description="Título dos relatórios"),
+    include_charts: bool = Form(True, description="Incluir gráficos no Excel"),
+    include_summary: bool = Form(True, description="Incluir resumo executivo (tipos de relatório automático)"),
+    custom_analysis: Optional[str] = Form(None, description="Análise customizada (para o tipo 'custom')"),
+    value_column: Optional[str] = Form(None, description="Coluna de valores para análises"),
+    region_column: Optional[str] = Form(None, description="Coluna de região para análise geográfica"),
+    date_column: Optional[str] = Form(None, description="Coluna de data para análise temporal"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Gera vários relatórios Excel (templates e/ou tipos automáticos) a partir de
+    um único arquivo e devolve todos em um .zip
+    """
+    try:
+        if not file.filename.endswith(('.csv', '.xlsx')):
+            raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
+        content, digest = await read_upload_bytes(file)
+        jobs = _batch_jobs(reports, digest, file.filename, title, include_charts, include_summary,
+                           custom_analysis, value_column, region_column, date_column, current_user)
+        return await _build_report_batch(request, upload_source(content, digest, file.filename), jobs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar lote de relatórios: {str(e)}")
+
+# ---------------------------------------------------------------------------
+# Variantes por dataset armazenado: usam os dados já enviados em /reports/upload
+# (tabela uploaded_data) em vez de exigir o arquivo novamente.
+# ---------------------------------------------------------------------------
+
+def _load_user_dataset(data_id: str, current_user: str):
+    """Carrega (metadados, DataFrame) de um dataset do usuário (404 se não existir)"""
+    # Cópia com os tipos usuais (como no parse do arquivo enviado), pois as análises alteram colunas
+    loaded = load_dataset(data_id, current_user, writable=True)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Dados não encontrados")
+    return loaded
+
+def _load_user_dataset_meta(data_id: str, current_user: str) -> Dict:
+    """
+    Metadados de um dataset do usuário, sem carregar os dados (404 se não existir).
+    Consulta o banco de forma síncrona: nas rotas async, chamar via run_in_threadpool.
+    """
+    meta = get_dataset_meta(data_id, current_user)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Dados não encontrados")
+    return meta
+
+@router.get("/reports/datasets/{data_id}")
+def get_dataset(data_id: str, current_user: str = CurrentUser):
+    """Retorna os metadados e os dados completos de um dataset armazenado (rota síncrona: roda no threadpool)"""
+    meta, df = _load_user_dataset(data_id, current_user)
+    try:
+        return FastJSONResponse({
+            "dataset": meta,
+            "columns": [str(c) for c in df.columns],
+            "row_count": len(df),
+            "memory": dataset_memory_report(meta),
+            "data": dataframe_to_records(df)
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao carregar dataset: {str(e)}")
+
+@router.get("/reports/datasets/{data_id}/rows")
+def get_dataset_rows(
+    data_id: str,
+    offset: int = Query(0, ge=0, description="Posição da primeira linha (paginação por offset)"),
+    limit: int = Query(100, ge=1, le=1000, description="Quantidade de linhas por página"),
+    cursor: Optional[str] = Query(None, description="Cursor retornado em next_cursor (tem precedência sobre offset)"),
+    columns: Optional[str] = Query(None, description="Colunas separadas por vírgula (padrão: todas)"),
+    sort_by: Optional[str] = Query(None, description="Coluna de ordenação"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sentido da ordenação: asc ou desc"),
+    current_user: str = CurrentUser
+):
+    """
+    Página de linhas de um dataset armazenado, lendo do armazenamento apenas
+    as colunas e linhas pedidas (para tabelas com rolagem virtual).
+    Rota síncrona: as leituras (banco, Parquet) rodam no threadpool do FastAPI.
+    """
+    meta = _load_user_dataset_meta(data_id, current_user)
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        return FastJSONResponse(read_dataset_rows(
+            meta, offset=offset, limit=limit, columns=selected,
+            sort_by=sort_by, descending=order == "desc", cursor=cursor
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao ler linhas do dataset: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/analyze/custom")
+async def analyze_custom_dataset(
+    data_id: str,
+    question: str = Form(...),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """Responde perguntas simples sobre um dataset armazenado"""
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _run_analysis(request, dataset_source(meta), "custom", {"question": question})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao analisar dataset: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/analyze/trend")
+async def analyze_dataset_trend(
+    data_id: str,
+    date_col: str = Form(...),
+    value_col: str = Form(...),
+    freq: str = Form("M"),  # D, W, M, Q ou Y (mês por padrão)
+    agg: str = Form("sum"),  # sum, mean, count, min, max, size
+    fill: str = Form(None, description="Períodos sem dados: 'zero', 'nan' ou vazio (omitidos)"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Analisa tendências de uma métrica ao longo do tempo em um dataset armazenado.
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _run_trend(request, dataset_source(meta), dataset_version_key(meta),
+                                date_col, value_col, freq, agg, fill)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao analisar tendência: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/analyze/risk-score")
+async def analyze_dataset_risk_score(
+    data_id: str,
+    score_cols: str = Form(...),  # Ex: "idade,renda,dividas"
+    weights: str = Form(None),    # Ex: "0.3,0.5,0.2"
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Calcula score de risco de um dataset armazenado.
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _run_analysis(request, dataset_source(meta), "risk-score",
+                                   {"score_cols": score_cols, "weights": weights})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao calcular score de risco: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/analyze/geography")
+async def analyze_dataset_geography(
+    data_id: str,
+    geo_col: str = Form(...),
+    value_col: str = Form(None),
+    agg: str = Form("count"),  # count, sum, mean
+    top_n: int = Form(GEO_TOP_N, description="Grupos exibidos no gráfico; o restante vira 'Outros'"),
+    page: int = Form(1, description="Página do detalhe completo (geo_summary)"),
+    page_size: int = Form(GEO_PAGE_SIZE, description="Grupos por página do detalhe"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Agrupa e sumariza um dataset armazenado por região, estado ou cidade.
+    O gráfico traz os top_n grupos e "Outros"; o detalhe completo é paginado.
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _run_analysis(request, dataset_source(meta), "geography",
+                                   {"geo_col": geo_col, "value_col": value_col, "agg": agg,
+                                    "top_n": top_n, "page": page, "page_size": page_size})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao analisar geografia: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/analyze/geography/rollup")
+async def analyze_dataset_geography_rollup(
+    data_id: str,
+    geo_cols: str = Form(..., description="Colunas geográficas do nível mais amplo ao mais detalhado (ex: Region,State,City)"),
+    value_col: str = Form(None),
+    agg: str = Form("count"),  # count, sum, mean
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Rollup hierárquico de um dataset armazenado em uma única leitura.
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _run_analysis(request, dataset_source(meta), "geography-rollup",
+                                   {"geo_cols": geo_cols, "value_col": value_col, "agg": agg})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao analisar geografia: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/generate-excel")
+@limiter.limit("10/minute")
+async def generate_dataset_excel_report(
+    data_id: str,
+    report_type: str = Form(..., description="Tipo de relatório: 'summary', 'geography', 'trend', 'risk', 'custom'"),
+    title: str = Form("Relatório Automático", description="Título do relatório"),
+    include_charts: bool = Form(True, description="Incluir gráficos no Excel"),
+    include_summary: bool = Form(True, description="Incluir resumo executivo"),
+    custom_analysis: Optional[str] = Form(None, description="Análise customizada (para report_type='custom')"),
+    value_column: Optional[str] = Form(None, description="Coluna de valores para análises"),
+    region_column: Optional[str] = Form(None, description="Coluna de região para análise geográfica"),
+    date_column: Optional[str] = Form(None, description="Coluna de data para análise temporal"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Gera relatório em Excel a partir de um dataset armazenado
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _build_excel_report(
+            request, dataset_source(meta), dataset_version_key(meta),
+            meta.get('original_filename') or data_id, report_type, title, include_charts, include_summary,
+            custom_analysis, value_column, region_column, date_column, current_user
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório Excel: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/generate-excel-from-template")
+@limiter.limit("10/minute")
+async def generate_dataset_excel_from_template(
+    data_id: str,
+    template_id: str = Form(..., description="ID do template a ser usado (ex: geography_sales, trend_monthly)"),
+    title: str = Form("Relatório com Template", description="Título do relatório"),
+    include_charts: bool = Form(True, description="Incluir gráficos no Excel"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Gera relatório em Excel com template pré-configurado a partir de um dataset armazenado
+    """
+    template_data = _resolve_template(template_id)
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    try:
+        return await _build_template_report(
+            request, dataset_source(meta), dataset_version_key(meta),
+            meta.get('original_filename') or data_id, template_id, template_data, title, include_charts, current_user
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório Excel com template: {str(e)}")
+
+@router.post("/reports/datasets/{data_id}/generate-excel-batch")
+@limiter.limit("5/minute")
+async def generate_dataset_excel_batch(
+    data_id: str,
+    reports: str = Form(..., description="Templates e/ou tipos de relatório separados por vírgula (ex: geography_sales,trend_monthly,risk)"),
+    title: str = Form("Relatório Automático", description="Título dos relatórios"),
+    include_charts: bool = Form(True, description="Incluir gráficos no Excel"),
+    include_summary: bool = Form(True, description="Incluir resumo executivo (tipos de relatório automático)"),
+    custom_analysis: Optional[str] = Form(None, description="Análise customizada (para o tipo 'custom')"),
+    value_column: Optional[str] = Form(None, description="Coluna de valores para análises"),
+    region_column: Optional[str] = Form(None, description="Coluna de região para análise geográfica"),
+    date_column: Optional[str] = Form(None, description="Coluna de data para análise temporal"),
+    current_user: str = CurrentUser,
+    request: Request = None
+):
+    """
+    Gera vários relatórios Excel a partir de um dataset armazenado e devolve todos em um .zip
+    """
+    meta = await run_in_threadpool(_load_user_dataset_meta, data_id, current_user)
+    jobs = _batch_jobs(reports, dataset_version_key(meta), meta.get('original_filename') or data_id, title,
+                       include_charts, include_summary, custom_analysis, value_column, region_column,
+                       date_column, current_user)
+    try:
+        return await _build_report_batch(request, dataset_source(meta), jobs)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório Excel com template: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar lote de relatórios: {str(e)}")
@@ -1,7 +1,8 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import pandas as pd
 import json
 from app.services.ai_service import AIAnalysisService
+from app.utils.quantile_sketch import QuantileSketch, iqr_bounds
 
 class AIAssistant:
     """
@@ -420,10 +421,14 @@ class AIAssistant:
             ]
         }
     
-    async def get_automated_insights(self, data: pd.DataFrame, user_id: str) -> List[Dict[str, Any]]:
+    async def get_automated_insights(self, data: pd.DataFrame, user_id: str,
+                                     sketches: Optional[Dict[str, QuantileSketch]] = None,
+                                     exact: bool = False) -> List[Dict[str, Any]]:
         """
         Gera insights automatizados sobre os dados (similar ao "Insights da Zia")
+        Os quartis dos outliers vêm dos sketches do dataset, se informados
         """
+        sketches = sketches or {}
         insights = []
         
         # Insight 1: Visão geral dos dados
@@ -449,7 +454,7 @@ class AIAssistant:
         
         # Insight 3: Análise de tipos de dados
         numeric_cols = data.select_dtypes(include=['number']).columns
-        categorical_cols = data.select_dtypes(include=['object']).columns
+        categorical_cols = data.select_dtypes(include=['object', 'category']).columns
         
         insights.append({
             "type": "data_types",
@@ -461,10 +466,8 @@ class AIAssistant:
         # Insight 4: Detecção de outliers (se houver dados numéricos)
         if len(numeric_cols) > 0:
             for col in numeric_cols[:2]:  # Analisa as primeiras 2 colunas numéricas
-                Q1 = data[col].quantile(0.25)
-                Q3 = data[col].quantile(0.75)
-                IQR = Q3 - Q1
-                outliers = data[(data[col] < Q1 - 1.5*IQR) | (data[col] > Q3 + 1.5*IQR)]
+                _, _, lower, upper = iqr_bounds(data[col], sketches.get(str(col)), exact)
+                outliers = data[(data[col] < lower) | (data[col] > upper)]
                 
                 if len(outliers) > 0:
                     insights.append({
@@ -1,4 +1,4 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -7,6 +7,7 @@ from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import warnings
+from app.utils.quantile_sketch import QuantileSketch, column_quantiles, iqr_bounds
 warnings.filterwarnings('ignore')
 
 class AIAnalysisService:
@@ -17,9 +18,11 @@ class AIAnalysisService:
     def __init__(self):
         self.analysis_cache = {}
         
-    async def analyze_data(self, data: pd.DataFrame, analysis_type: str = "general") -> Dict[str, Any]:
+    async def analyze_data(self, data: pd.DataFrame, analysis_type: str = "general",
+                           sketches: Optional[Dict[str, QuantileSketch]] = None, exact: bool = False) -> Dict[str, Any]:
         """
         Realiza análise automática dos dados
+        sketches: sketches de quantis do dataset (outliers e distribuição); exact=True ignora os sketches
         """
         try:
             if analysis_type == "general":
@@ -29,13 +32,13 @@ class AIAnalysisService:
             elif analysis_type == "correlation":
                 return await self._correlation_analysis(data)
             elif analysis_type == "outlier":
-                return await self._outlier_analysis(data)
+                return await self._outlier_analysis(data, sketches, exact)
             elif analysis_type == "seasonality":
                 return await self._seasonality_analysis(data)
             elif analysis_type == "clustering":
                 return await self._clustering_analysis(data)
             elif analysis_type == "distribution":
-                return await self._distribution_analysis(data)
+                return await self._distribution_analysis(data, sketches, exact)
             elif analysis_type == "prediction":
                 return await self._prediction_analysis(data)
             else:
@@ -52,7 +55,7 @@ class AIAnalysisService:
         Análise geral dos dados
         """
         numeric_cols = data.select_dtypes(include=['number']).columns
-        categorical_cols = data.select_dtypes(include=['object']).columns
+        categorical_cols = data.select_dtypes(include=['object', 'category']).columns
         
         insights = []
         
@@ -187,20 +190,17 @@ class AIAnalysisService:
             "analysis_type": "correlation"
         }
     
-    async def _outlier_analysis(self, data: pd.DataFrame) -> Dict[str, Any]:
+    async def _outlier_analysis(self, data: pd.DataFrame, sketches: Optional[Dict[str, QuantileSketch]] = None,
+                                exact: bool = False) -> Dict[str, Any]:
         """
         Análise de outliers avançada
         """
+        sketches = sketches or {}
         numeric_cols = data.select_dtypes(include=['number']).columns
         
         outliers = []
         for col in numeric_cols[:3]:
-            Q1 = data[col].quantile(0.25)
-            Q3 = data[col].quantile(0.75)
-            IQR = Q3 - Q1
-            
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
+            _, _, lower_bound, upper_bound = iqr_bounds(data[col], sketches.get(str(col)), exact)
             
             outlier_indices = data[(data[col] < lower_bound) | (data[col] > upper_bound)].index
             outlier_count = len(outlier_indices)
@@ -233,7 +233,7 @@ class AIAnalysisService:
         # Procura por colunas de data
         date_cols = []
         for col in data.columns:
-            if data[col].dtype == 'object':
+            if data[col].dtype in ('object', 'category'):
                 try:
                     pd.to_datetime(data[col].iloc[0])
                     date_cols.append(col)
@@ -345,10 +345,12 @@ class AIAnalysisService:
             "analysis_type": "clustering"
         }
     
-    async def _distribution_analysis(self, data: pd.DataFrame) -> Dict[str, Any]:
+    async def _distribution_analysis(self, data: pd.DataFrame, sketches: Optional[Dict[str, QuantileSketch]] = None,
+                                     exact: bool = False) -> Dict[str, Any]:
         """
         Análise de distribuição
         """
+        sketches = sketches or {}
         numeric_cols = data.select_dtypes(include=['number']).columns
         
         distributions = []
@@ -366,6 +368,8 @@ class AIAnalysisService:
                 
                 # Identifica tipo de distribuição
                 distribution_type = self._identify_distribution_type(skewness, kurtosis)
+                p10, p25, p50, p75, p90 = column_quantiles(col_data, (0.1, 0.25, 0.5, 0.75, 0.9),
+                                                           sketches.get(str(col)), exact)
                 
                 distributions.append({
                     "column": col,
@@ -375,11 +379,11 @@ class AIAnalysisService:
                     "kurtosis": kurtosis,
                     "distribution_type": distribution_type,
                     "percentiles": {
-                        "10th": col_data.quantile(0.1),
-                        "25th": col_data.quantile(0.25),
-                        "50th": col_data.quantile(0.5),
-                        "75th": col_data.quantile(0.75),
-                        "90th": col_data.quantile(0.9)
+                        "10th": p10,
+                        "25th": p25,
+                        "50th": p50,
+                        "75th": p75,
+                        "90th": p90
                     }
                 })
         
@@ -446,6 +450,7 @@ class AIAnalysisService:
     def _calculate_entropy(self, series: pd.Series) -> float:
         """Calcula entropia de uma série categórica"""
         value_counts = series.value_counts()
+        value_counts = value_counts[value_counts > 0]  # categorias sem ocorrências
         probabilities = value_counts / len(series)
         entropy = -np.sum(probabilities * np.log2(probabilities))
         return entropy
@@ -550,7 +555,7 @@ class AIAnalysisService:
         
         # Insight sobre tipos de dados
         numeric_count = len(data.select_dtypes(include=['number']).columns)
-        categorical_count = len(data.select_dtypes(include=['object']).columns)
+        categorical_count = len(data.select_dtypes(include=['object', 'category']).columns)
         
         insights.append({
             "type": "data_types",
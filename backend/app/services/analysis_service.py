@@ -0,0 +1,283 @@
+import pandas as pd
+import numpy as np
+from typing import Any, Dict, Optional
+from app.services.dataset_service import load_frame_source
+from app.services.timeseries_service import daily_base, trend_from_base
+from app.utils.pandas_utils import top_n_with_others, dataframe_to_records
+
+
+def columns_overview(df: pd.DataFrame, sample_rows: int = 3) -> Dict[str, Any]:
+    """Colunas do arquivo, algumas linhas de amostra e o total de linhas"""
+    return {
+        "columns": df.columns.tolist(),
+        "sample_data": dataframe_to_records(df.head(sample_rows)),
+        "total_rows": len(df)
+    }
+
+
+def describe_analysis(df: pd.DataFrame) -> Dict[str, Any]:
+    """Estatísticas descritivas, tipos, nulos por coluna e sugestões de gráfico"""
+    suggestions = []
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            suggestions.append({"column": col, "suggestion": "histogram/bar"})
+        elif isinstance(df[col].dtype, pd.CategoricalDtype) or df[col].dtype == object:
+            suggestions.append({"column": col, "suggestion": "pie/bar"})
+    return {
+        "columns": list(df.columns),
+        "dtypes": df.dtypes.apply(lambda x: str(x)).to_dict(),
+        "nulls": df.isnull().sum().to_dict(),
+        "stats": df.describe(include='all').to_dict(),
+        "suggestions": suggestions
+    }
+
+
+def custom_analysis(df: pd.DataFrame, question: str) -> Dict[str, Any]:
+    """Responde perguntas simples (média, soma, contagem) sobre o DataFrame"""
+    # Lógica simples para perguntas comuns
+    q = question.lower()
+    if "média" in q or "media" in q or "mean" in q:
+        for col in df.select_dtypes(include='number').columns:
+            if col in q:
+                return {"column": col, "mean": df[col].mean()}
+        return {"means": df.mean(numeric_only=True).to_dict()}
+    elif "soma" in q or "sum" in q:
+        for col in df.select_dtypes(include='number').columns:
+            if col in q:
+                return {"column": col, "sum": df[col].sum()}
+        return {"sums": df.sum(numeric_only=True).to_dict()}
+    elif "contar" in q or "count" in q:
+        return {"count": len(df)}
+    # Pronto para integração futura com IA
+    return {"message": "Pergunta recebida, mas só posso responder perguntas simples de média, soma ou contagem por enquanto.", "question": question}
+
+
+def trend_analysis(df: pd.DataFrame, date_col: str, value_col: str, freq: str,
+                   agg: str = "sum", fill: Optional[str] = None) -> Dict[str, Any]:
+    """Métrica por período e média móvel de 3 períodos (via base diária, ver timeseries_service)"""
+    return trend_from_base(daily_base(df, date_col, value_col), freq, agg, fill)
+
+
+def risk_score_analysis(df: pd.DataFrame, score_cols: str, weights: Optional[str]) -> Dict[str, Any]:
+    """Score ponderado das colunas normalizadas entre 0 e 1"""
+    cols = [c.strip() for c in score_cols.split(",")]
+    if weights:
+        w = [float(x) for x in weights.split(",")]
+        if len(w) != len(cols):
+            raise ValueError("Número de pesos diferente do número de colunas")
+    else:
+        w = [1.0/len(cols)]*len(cols)
+    df = df.dropna(subset=cols)
+    # Normalizar colunas
+    for i, c in enumerate(cols):
+        col_min = df[c].min()
+        col_max = df[c].max()
+        if col_max > col_min:
+            df[c] = (df[c] - col_min) / (col_max - col_min)
+        else:
+            df[c] = 0.0
+    df["risk_score"] = np.dot(df[cols], w)
+    return {
+        "scores": df["risk_score"].round(3).tolist(),
+        "summary": {
+            "min": float(df["risk_score"].min()),
+            "max": float(df["risk_score"].max()),
+            "mean": float(df["risk_score"].mean()),
+            "std": float(df["risk_score"].std())
+        }
+    }
+
+
+# Limites do agrupamento geográfico: o gráfico mostra o top-N + "Outros" e o
+# detalhe completo é paginado
+GEO_TOP_N = 20
+GEO_MAX_TOP_N = 100
+GEO_PAGE_SIZE = 100
+GEO_MAX_PAGE_SIZE = 1000
+
+
+def _format_magnitude(val: float) -> str:
+    if val >= 1e6:
+        return f"{val/1e6:.2f}M"
+    elif val >= 1e3:
+        return f"{val/1e3:.2f}K"
+    return f"{val:.2f}"
+
+
+def geography_analysis(df: pd.DataFrame, geo_col: str, value_col: Optional[str], agg: str,
+                       top_n: int = GEO_TOP_N, page: int = 1, page_size: int = GEO_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Contagem, soma ou média agrupada por região, estado ou cidade.
+    O gráfico traz os top_n grupos e o restante resumido em "Outros";
+    geo_summary traz o detalhe completo, ordenado e paginado (page, page_size).
+    """
+    if geo_col not in df.columns:
+        raise ValueError("Coluna geográfica não encontrada")
+    if not 1 <= top_n <= GEO_MAX_TOP_N:
+        raise ValueError(f"top_n deve estar entre 1 e {GEO_MAX_TOP_N}")
+    if page < 1 or not 1 <= page_size <= GEO_MAX_PAGE_SIZE:
+        raise ValueError(f"Página inválida (page >= 1, page_size entre 1 e {GEO_MAX_PAGE_SIZE})")
+
+    # Configurar pandas para não usar notação científica
+    pd.set_option('display.float_format', lambda x: '%.2f' % x)
+
+    if agg == "count":
+        grouped = df[geo_col].value_counts()
+        top = top_n_with_others(grouped.to_frame("count"), "count", top_n)["count"]
+        # Converter para formato adequado para gráficos
+        chart_data = {
+            "labels": list(top.index),
+            "values": list(top.values),
+            "chart_type": "bar",
+            "title": f"Contagem por {geo_col}",
+            "subtitle": f"Total de registros: {int(grouped.sum())}"
+        }
+    elif agg in ("sum", "mean") and value_col:
+        if value_col not in df.columns:
+            raise ValueError("Coluna de valor não encontrada")
+
+        # Uma passada: soma e contagem por grupo (a média sai delas, inclusive a de "Outros")
+        stats = df.groupby(geo_col)[value_col].agg(['sum', 'count'])
+        stats['mean'] = stats['sum'] / stats['count']
+        if agg == "sum":
+            title = f"Soma de {value_col} por {geo_col}"
+        else:
+            title = f"Média de {value_col} por {geo_col}"
+
+        # Ordenar por valor decrescente
+        grouped = stats[agg].sort_values(ascending=False)
+        top = top_n_with_others(stats, agg, top_n, ratios={'mean': ('sum', 'count')})[agg]
+
+        chart_data = {
+            "labels": list(top.index),
+            "values": list(top.values),
+            # Formatar valores para evitar notação científica
+            "formatted_values": [_format_magnitude(val) for val in top.values],
+            "chart_type": "bar",
+            "title": title,
+            "subtitle": f"Total: {grouped.sum():,.2f}" if agg == "sum" else f"Média geral: {grouped.mean():,.2f}",
+            "total": float(grouped.sum()) if agg == "sum" else float(grouped.mean()),
+            "count": len(grouped)
+        }
+    else:
+        raise ValueError("Agregação não suportada ou coluna de valor ausente")
+
+    chart_data["others_groups"] = max(len(grouped) - top_n, 0)
+    offset = (page - 1) * page_size
+    return {
+        "geo_summary": grouped.iloc[offset:offset + page_size].to_dict(),
+        "chart_data": chart_data,
+        "pagination": {
+            "page": page,
+            "page_size": page_size,
+            "total_groups": len(grouped),
+            "total_pages": -(-len(grouped) // page_size)
+        },
+        "metadata": {
+            "geo_column": geo_col,
+            "value_column": value_col,
+            "aggregation": agg,
+            "total_records": len(df)
+        }
+    }
+
+
+# Níveis aceitos no rollup geográfico (ex.: região -> estado -> cidade)
+GEO_ROLLUP_MAX_LEVELS = 5
+
+# Nome dos nós cuja chave geográfica está vazia (as linhas continuam nos subtotais)
+GEO_EMPTY_LABEL = "(vazio)"
+
+
+def geography_rollup(df: pd.DataFrame, geo_cols: str, value_col: Optional[str], agg: str) -> Dict[str, Any]:
+    """
+    Rollup hierárquico por várias colunas geográficas (geo_cols em ordem, do
+    nível mais amplo ao mais detalhado, separadas por vírgula).
+
+    Um único groupby ordenado no nível mais detalhado; os níveis acima são
+    obtidos reagrupando esse resultado (grouping sets), sem reler os dados.
+    Retorna uma árvore com subtotais em cada nó: name, value, count, children.
+    """
+    cols = [c.strip() for c in geo_cols.split(",") if c.strip()]
+    if not cols:
+        raise ValueError("Informe ao menos uma coluna geográfica")
+    if len(cols) > GEO_ROLLUP_MAX_LEVELS or len(set(cols)) != len(cols):
+        raise ValueError(f"Informe até {GEO_ROLLUP_MAX_LEVELS} colunas geográficas distintas")
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas geográficas não encontradas: {', '.join(missing)}")
+
+    if agg == "count":
+        base = df.groupby(cols, observed=True, dropna=False).size().to_frame('count')
+        base['sum'] = base['count']
+    elif agg in ("sum", "mean") and value_col:
+        if value_col not in df.columns:
+            raise ValueError("Coluna de valor não encontrada")
+        base = df.groupby(cols, observed=True, dropna=False)[value_col].agg(['sum', 'count'])
+    else:
+        raise ValueError("Agregação não suportada ou coluna de valor ausente")
+
+    # Somas e contagens são aditivas: cada nível sai do nível abaixo
+    levels = {len(cols): base}
+    for depth in range(len(cols) - 1, 0, -1):
+        levels[depth] = levels[depth + 1].groupby(level=list(range(depth)), observed=True, dropna=False).sum()
+
+    def level_values(frame: pd.DataFrame) -> pd.Series:
+        if agg == "mean":
+            return frame['sum'] / frame['count'].where(frame['count'] > 0)
+        return frame[agg]
+
+    totals = base[['sum', 'count']].sum()
+    root = {
+        "name": "Total",
+        "value": level_values(totals.to_frame().T).tolist()[0],
+        "count": int(totals['count']),
+        "children": []
+    }
+    nodes = {(): root}
+    for depth in range(1, len(cols) + 1):
+        frame = levels[depth]
+        values = level_values(frame).sort_values(ascending=False, kind='stable')
+        counts = frame['count'].reindex(values.index)
+        for key, value, count in zip(values.index.tolist(), values.tolist(), counts.tolist()):
+            key = key if isinstance(key, tuple) else (key,)
+            key = tuple(GEO_EMPTY_LABEL if pd.isna(part) else part for part in key)
+            node = {"name": key[-1], "value": value, "count": int(count)}
+            if depth < len(cols):
+                node["children"] = []
+            nodes[key[:-1]]["children"].append(node)
+            nodes[key] = node
+
+    return {
+        "tree": root,
+        "metadata": {
+            "levels": cols,
+            "value_column": value_col,
+            "aggregation": agg,
+            "groups_per_level": {col: len(levels[depth]) for depth, col in enumerate(cols, start=1)},
+            "total_records": len(df)
+        }
+    }
+
+
+# Análises disponíveis para execução no pool de processos (ver run_analysis)
+ANALYSES = {
+    "columns": columns_overview,
+    "describe": describe_analysis,
+    "custom": custom_analysis,
+    "trend": trend_analysis,
+    # Base diária da tendência: a rota guarda em cache e re-agrega por granularidade
+    "trend-daily": daily_base,
+    "risk-score": risk_score_analysis,
+    "geography": geography_analysis,
+    "geography-rollup": geography_rollup,
+}
+
+
+def run_analysis(source: Dict[str, Any], name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Carrega o DataFrame da origem (arquivo enviado ou dataset armazenado) e
+    executa a análise. Roda dentro de um processo do pool, por isso recebe a
+    origem dos dados e não o DataFrame.
+    """
+    return ANALYSES[name](load_frame_source(source), **params)
@@ -0,0 +1,291 @@
+import re
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional
+from app.services.supabase_client import supabase
+from app.services.timeseries_service import daily_base, rebucket
+
+# Registros por requisição ao buscar os relatórios (limite de linhas do PostgREST)
+REPORTS_FETCH_PAGE = 1000
+
+# Nomes de coluna aceitos na projeção/filtros (evita sintaxe do PostgREST como
+# "a,b", "alias:col" ou "tabela(*)" vinda da URL)
+_COLUMN_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Código do Postgres para coluna inexistente
+_UNDEFINED_COLUMN = '42703'
+
+
+class ReportColumnError(ValueError):
+    """Coluna inexistente ou inválida na consulta dos relatórios"""
+
+
+def _check_column(name: str) -> str:
+    # Parâmetros vêm do JSON do cliente: números, listas etc. também são recusados
+    if not isinstance(name, str) or not _COLUMN_NAME.match(name):
+        raise ReportColumnError(f"Coluna inválida: {name}")
+    return name
+
+
+class ReportQuery:
+    """
+    Consulta aos relatórios do usuário com os filtros dos dashboards aplicados
+    no banco (gte/lte/eq) e só as colunas necessárias no select, para que
+    apenas as linhas e colunas usadas trafeguem até a API.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.columns: List[str] = []
+        self.start_date: Optional[str] = None
+        self.end_date: Optional[str] = None
+        self.equals: List[tuple] = []
+
+    def select(self, *columns: str) -> "ReportQuery":
+        for column in columns:
+            if _check_column(column) not in self.columns:
+                self.columns.append(column)
+        return self
+
+    def created_between(self, start_date: Optional[str], end_date: Optional[str]) -> "ReportQuery":
+        self.start_date = start_date or None
+        self.end_date = end_date or None
+        return self
+
+    def where(self, column: Optional[str], value: Optional[str]) -> "ReportQuery":
+        if column and value:
+            self.equals.append((_check_column(column), value))
+        return self
+
+    def _build(self, columns: str):
+        query = supabase.table("reports").select(columns).eq("user_id", self.user_id)
+        if self.start_date:
+            query = query.gte("created_at", self.start_date)
+        if self.end_date:
+            query = query.lte("created_at", self.end_date)
+        for column, value in self.equals:
+            query = query.eq(column, value)
+        # Ordem estável para a paginação por faixa
+        return query.order("id")
+
+    def fetch(self) -> pd.DataFrame:
+        """
+        Executa a consulta (em páginas de REPORTS_FETCH_PAGE) e retorna um
+        DataFrame com as colunas selecionadas, mesmo sem resultados.
+        """
+        columns = ",".join(self.columns) if self.columns else "*"
+        rows: List[dict] = []
+        start = 0
+        try:
+            while True:
+                response = self._build(columns).range(start, start + REPORTS_FETCH_PAGE - 1).execute()
+                rows.extend(response.data or [])
+                if len(response.data or []) < REPORTS_FETCH_PAGE:
+                    break
+                start += REPORTS_FETCH_PAGE
+        except Exception as e:
+            if getattr(e, 'code', None) == _UNDEFINED_COLUMN:
+                raise ReportColumnError("Coluna não encontrada")
+            raise
+        print(f"📥 Dashboard: {len(rows)} relatórios, colunas: {columns}")
+        return pd.DataFrame(rows, columns=self.columns or None)
+
+
+def fetch_dashboard_frame(user_id: str, columns: Iterable[str], start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, filter_col: Optional[str] = None,
+                          filter_val: Optional[str] = None) -> pd.DataFrame:
+    """Relatórios do usuário já filtrados no banco, só com as colunas pedidas (vazio = todas)"""
+    return ReportQuery(user_id).select(*columns).created_between(start_date, end_date) \
+        .where(filter_col, filter_val).fetch()
+
+
+# Rollups mantidos no banco (database/setup_report_rollups.sql): contagens de
+# relatórios por usuário em cada dimensão, atualizadas por trigger em reports
+ROLLUP_DIMENSIONS = ('month', 'title', 'status')
+
+
+def read_report_rollups(user_id: str) -> Dict[str, Dict[str, int]]:
+    """Contagens do usuário por dimensão ({'month': {'2024-01': 3}, ...}); lê O(grupos) linhas"""
+    rollups: Dict[str, Dict[str, int]] = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+    start = 0
+    while True:
+        response = supabase.table("report_rollups").select("dimension,bucket,report_count") \
+            .eq("user_id", user_id).order("dimension").order("bucket") \
+            .range(start, start + REPORTS_FETCH_PAGE - 1).execute()
+        for row in response.data or []:
+            rollups.setdefault(row['dimension'], {})[row['bucket']] = int(row['report_count'])
+        if len(response.data or []) < REPORTS_FETCH_PAGE:
+            break
+        start += REPORTS_FETCH_PAGE
+    return rollups
+
+
+def rollup_summary(user_id: str) -> Dict[str, Any]:
+    """Resumo do dashboard a partir dos rollups, no mesmo formato de widget_summary"""
+    rollups = read_report_rollups(user_id)
+    per_month = rollups['month']
+    if not per_month:
+        return {"message": "Nenhum dado para dashboard"}
+    return {
+        "total_reports": sum(per_month.values()),
+        "created_per_month": dict(sorted(per_month.items())),
+        "reports_by_title": dict(sorted(rollups['title'].items(), key=lambda item: item[1], reverse=True)),
+        "reports_by_status": dict(sorted(rollups['status'].items(), key=lambda item: item[1], reverse=True))
+    }
+
+
+def rebuild_report_rollups(user_id: Optional[str] = None) -> int:
+    """Recalcula os rollups a partir de reports (backfill); retorna o número de grupos gravados"""
+    response = supabase.rpc("rebuild_report_rollups", {"p_user_id": user_id}).execute()
+    groups = response.data or 0
+    print(f"🔁 Rollups reconstruídos ({user_id or 'todos os usuários'}): {groups} grupos")
+    return groups
+
+
+# Widgets dos dashboards: cada um é uma agregação sobre o DataFrame dos
+# relatórios já filtrado. Erros de parâmetro/coluna são ValueError.
+
+def _require_columns(df: pd.DataFrame, *columns: str) -> None:
+    if any(column not in df.columns for column in columns):
+        raise ValueError("Coluna não encontrada" if len(columns) == 1 else "Colunas não encontradas")
+
+
+def _numeric_column(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        raise ValueError("Coluna numérica não encontrada")
+    # Sem linhas após os filtros não há tipo para verificar: trata como série numérica vazia
+    if df.empty:
+        return df[col].astype(float)
+    if not pd.api.types.is_numeric_dtype(df[col]):
+        raise ValueError("Coluna numérica não encontrada")
+    return df[col]
+
+
+def widget_summary(df: pd.DataFrame) -> Dict[str, Any]:
+    if df.empty:
+        return {"message": "Nenhum dado para dashboard"}
+    # Exemplo de sumarização: total, por mês, por título
+    return {
+        "total_reports": len(df),
+        "created_per_month": df["created_at"].str[:7].value_counts().sort_index().to_dict(),
+        "reports_by_title": df["title"].value_counts().to_dict() if "title" in df.columns else {}
+    }
+
+
+def widget_column(df: pd.DataFrame, col: str) -> Dict[str, Any]:
+    _require_columns(df, col)
+    return {"column": col, "distribution": df[col].value_counts().to_dict()}
+
+
+def widget_stats(df: pd.DataFrame, col: str) -> Dict[str, Any]:
+    return {"column": col, "stats": _numeric_column(df, col).describe().to_dict()}
+
+
+def widget_timeseries(df: pd.DataFrame, col: str = "created_at", freq: str = "M",
+                      fill: Optional[str] = None) -> Dict[str, Any]:
+    _require_columns(df, col)
+    series = rebucket(daily_base(df, col), freq, 'size', fill)
+    return {"column": col, "freq": freq, "timeseries": series.rename(index=str).to_dict()}
+
+
+def widget_pivot(df: pd.DataFrame, col1: str, col2: str, agg: str = "count",
+                 value_col: Optional[str] = None) -> Dict[str, Any]:
+    _require_columns(df, col1, col2)
+    if agg == "count":
+        pivot = pd.pivot_table(df, index=col1, columns=col2, aggfunc="size", fill_value=0)
+    elif agg == "sum":
+        num_cols = [value_col] if value_col else df.select_dtypes(include='number').columns
+        if len(num_cols) == 0:
+            raise ValueError("Nenhuma coluna numérica para somar")
+        _require_columns(df, num_cols[0])
+        pivot = pd.pivot_table(df, index=col1, columns=col2, values=num_cols[0], aggfunc="sum", fill_value=0)
+    else:
+        raise ValueError("Agregação não suportada")
+    return {"pivot": pivot.to_dict()}
+
+
+def widget_outliers(df: pd.DataFrame, col: str) -> Dict[str, Any]:
+    values = _numeric_column(df, col)
+    q1 = values.quantile(0.25)
+    q3 = values.quantile(0.75)
+    iqr = q3 - q1
+    lower = q1 - 1.5 * iqr
+    upper = q3 + 1.5 * iqr
+    outliers = values[(values < lower) | (values > upper)].tolist()
+    return {"column": col, "outliers": outliers, "lower": lower, "upper": upper}
+
+
+def _pivot_columns(col1: str, col2: str, agg: str = "count", value_col: Optional[str] = None) -> Optional[List[str]]:
+    # Na soma sem value_col é usada a primeira coluna numérica: aí é preciso buscar todas
+    if agg == "sum" and not value_col:
+        return None
+    return [col1, col2] + ([value_col] if value_col else [])
+
+
+# tipo -> (função do widget, colunas necessárias a partir dos parâmetros; None = todas)
+WIDGETS: Dict[str, tuple] = {
+    'summary': (widget_summary, lambda: ['created_at', 'title']),
+    'column': (widget_column, lambda col: [col]),
+    'stats': (widget_stats, lambda col: [col]),
+    'timeseries': (widget_timeseries, lambda col="created_at", freq="M", fill=None: [col]),
+    'pivot': (widget_pivot, _pivot_columns),
+    'outliers': (widget_outliers, lambda col: [col]),
+}
+
+
+def widget_columns(widget_type: str, params: Dict[str, Any]) -> Optional[List[str]]:
+    """Colunas de que o widget precisa (None = todas); ValueError se o widget for inválido"""
+    if widget_type not in WIDGETS:
+        raise ValueError(f"Widget não suportado: {widget_type}")
+    try:
+        columns = WIDGETS[widget_type][1](**params)
+    except TypeError:
+        raise ValueError(f"Parâmetros inválidos para o widget {widget_type}")
+    for column in columns or []:
+        _check_column(column)
+    return columns
+
+
+def evaluate_widget(df: pd.DataFrame, widget_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcula um widget sobre o DataFrame compartilhado (que não é alterado)"""
+    return WIDGETS[widget_type][0](df, **params)
+
+
+def evaluate_dashboard(user_id: str, widgets: List[Dict[str, Any]], start_date: Optional[str] = None,
+                       end_date: Optional[str] = None, filter_col: Optional[str] = None,
+                       filter_val: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Vários widgets com uma única consulta: busca a união das colunas de todos
+    os widgets com os filtros aplicados no banco e calcula cada widget sobre o
+    mesmo DataFrame. widgets: lista de {"id", "type", "params"}.
+    Erros são reportados por widget, sem derrubar os demais.
+    """
+    results: Dict[str, Any] = {}
+    columns: Optional[List[str]] = []
+    valid = []
+    for widget in widgets:
+        try:
+            needed = widget_columns(widget['type'], widget['params'])
+        except ValueError as e:
+            results[widget['id']] = {"error": str(e)}
+            continue
+        valid.append(widget)
+        if needed is None or columns is None:
+            columns = None
+            continue
+        for column in needed:
+            if column not in columns:
+                columns.append(column)
+
+    if valid:
+        try:
+            df = fetch_dashboard_frame(user_id, columns or [], start_date, end_date, filter_col, filter_val)
+        except ReportColumnError:
+            # Alguma coluna pedida não existe: busca todas uma vez e cada widget acusa a sua
+            df = fetch_dashboard_frame(user_id, [], start_date, end_date, filter_col, filter_val)
+        for widget in valid:
+            try:
+                results[widget['id']] = {"data": evaluate_widget(df, widget['type'], widget['params'])}
+            except (ValueError, KeyError, TypeError) as e:
+                results[widget['id']] = {"error": str(e)}
+    print(f"📊 Dashboard em lote: {len(widgets)} widgets, {len(valid)} calculados com uma consulta")
+    return {"widgets": [{"id": widget['id'], "type": widget['type'], **results[widget['id']]} for widget in widgets]}
@@ -3,6 +3,7 @@ import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import re
+from app.utils.quantile_sketch import QuantileSketch, iqr_bounds
 
 class DataPreparationService:
     """
@@ -292,10 +293,13 @@ class DataPreparationService:
             'failed_operations': failed_ops
         }
     
-    async def get_data_quality_report(self, data: pd.DataFrame) -> Dict[str, Any]:
+    async def get_data_quality_report(self, data: pd.DataFrame, sketches: Optional[Dict[str, QuantileSketch]] = None,
+                                      exact: bool = False) -> Dict[str, Any]:
         """
         Gera um relatório de qualidade dos dados
+        Os quartis dos outliers vêm dos sketches do dataset, se informados (exact=True força o cálculo exato)
         """
+        sketches = sketches or {}
         quality_report = {
             'total_rows': len(data),
             'total_columns': len(data.columns),
@@ -327,10 +331,8 @@ class DataPreparationService:
             
             # Outliers (apenas para dados numéricos)
             if data[column].dtype in ['int64', 'float64']:
-                Q1 = data[column].quantile(0.25)
-                Q3 = data[column].quantile(0.75)
-                IQR = Q3 - Q1
-                outliers = data[(data[column] < Q1 - 1.5*IQR) | (data[column] > Q3 + 1.5*IQR)]
+                _, _, lower, upper = iqr_bounds(data[column], sketches.get(str(column)), exact)
+                outliers = data[(data[column] < lower) | (data[column] > upper)]
                 quality_report['outliers'][column] = len(outliers)
         
         return quality_report
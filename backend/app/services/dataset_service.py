@@ -0,0 +1,670 @@
+import base64
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import UploadFile
+from app.services.supabase_client import supabase
+from app.utils.cache import MemoryLRUCache, DiskArrowCache, cache_max_bytes
+from app.utils.crypto_utils import EncryptedChunkReader, encrypt_file, is_encrypted_container
+from app.utils.storage import get_dataset_store, remove_spooled_file, UPLOAD_TMP_DIR, DATASET_DISK_CACHE_DIR
+from app.utils.pandas_utils import dataframe_to_records, frame_memory_usage, compact_dataframe, restore_dtypes
+from app.utils.quantile_sketch import (
+    QuantileSketch, update_column_sketches, build_column_sketches, sketches_to_dict, sketches_from_dict
+)
+
+# Linhas por bloco na ingestão em streaming (cada bloco vira um row group do Parquet)
+STREAM_CHUNK_ROWS = 10_000
+
+# Compressão dos arquivos Parquet dos datasets
+PARQUET_COMPRESSION = 'zstd'
+
+# Cache de DataFrames já convertidos a partir de arquivos enviados, por hash do conteúdo
+# (nos processos do pool, WORKER_PARSE_CACHE_MAX_MB; ver cache_max_bytes)
+PARSE_CACHE_MAX_BYTES = cache_max_bytes("PARSE_CACHE_MAX_MB", 256, 32)
+parsed_upload_cache = MemoryLRUCache(PARSE_CACHE_MAX_BYTES)
+
+# Cache de DataFrames de datasets armazenados, por id (versão = updated_at do registro)
+# (nos processos do pool, WORKER_DATASET_CACHE_MAX_MB: eles releem do cache em disco compartilhado)
+DATASET_CACHE_MAX_BYTES = cache_max_bytes("DATASET_CACHE_MAX_MB", 512, 64)
+dataset_frame_cache = MemoryLRUCache(DATASET_CACHE_MAX_BYTES)
+
+# Cache em disco (Arrow IPC, memory map) compartilhado entre os workers; 0 desativa
+DATASET_DISK_CACHE_MAX_BYTES = int(os.getenv("DATASET_DISK_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Formato dos DataFrames compactados no cache em disco: aumentar quando a
+# compactação de tipos mudar, para não reaproveitar arquivos antigos
+DATASET_DISK_CACHE_FORMAT = 2
+
+# Colunas de uploaded_data necessárias para localizar os dados (sem o jsonb legado)
+DATASET_META_COLUMNS = 'id, user_id, original_filename, storage_format, storage_key, updated_at'
+
+# Ordenações já calculadas para a paginação de linhas, por (arquivo, coluna, sentido)
+SORT_INDEX_CACHE_MAX_BYTES = int(os.getenv("SORT_INDEX_CACHE_MAX_MB", "64")) * 1024 * 1024
+sort_index_cache = MemoryLRUCache(SORT_INDEX_CACHE_MAX_BYTES)
+
+# Sketches de quantis das colunas numéricas, por versão do dataset
+SKETCH_CACHE_MAX_BYTES = int(os.getenv("SKETCH_CACHE_MAX_MB", "32")) * 1024 * 1024
+column_sketch_cache = MemoryLRUCache(SKETCH_CACHE_MAX_BYTES)
+
+# Limite de linhas por página na navegação de datasets
+DATASET_PAGE_MAX_ROWS = 1000
+
+# Colunas exibidas na listagem de workspaces (nunca a coluna data)
+WORKSPACE_LIST_COLUMNS = (
+    'id, workspace_name, description, table_name, original_filename, file_type, '
+    'columns, row_count, storage_format, created_at, updated_at'
+)
+
+
+def parse_tabular_bytes(content: bytes, filename: str) -> pd.DataFrame:
+    """Converte o conteúdo de um arquivo CSV ou XLSX em DataFrame"""
+    if filename.endswith('.csv'):
+        return pd.read_csv(BytesIO(content))
+    elif filename.endswith('.xlsx'):
+        return pd.read_excel(BytesIO(content))
+    raise ValueError("Formato de arquivo não suportado")
+
+
+def content_hash(content: bytes) -> str:
+    """Hash do conteúdo de um arquivo, usado como chave dos caches"""
+    return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+
+async def read_upload_bytes(file: UploadFile) -> Tuple[bytes, str]:
+    """Lê o arquivo enviado e retorna (conteúdo, hash do conteúdo)"""
+    content = await file.read()
+    return content, content_hash(content)
+
+
+def upload_dataframe(content: bytes, digest: str, filename: str) -> pd.DataFrame:
+    """
+    DataFrame do conteúdo de um arquivo enviado (digest = content_hash(content)).
+
+    O parse é reaproveitado entre requisições com o mesmo conteúdo (o frontend
+    envia o mesmo arquivo para várias análises seguidas). Cada chamada recebe
+    uma cópia, pois as rotas alteram o DataFrame.
+    """
+    key = (digest, os.path.splitext(filename or "")[1].lower())
+    df = parsed_upload_cache.get(key)
+    if df is None:
+        df = parse_tabular_bytes(content, filename or "")
+        parsed_upload_cache.put(key, df, frame_memory_usage(df))
+    return df.copy()
+
+
+def iter_csv_chunks(path: str, chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Lê um CSV do disco em blocos de no máximo chunk_rows linhas"""
+    with pd.read_csv(path, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _series_to_arrow(series: pd.Series) -> pa.Array:
+    """Converte uma coluna para Arrow; colunas com tipos mistos viram texto"""
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Ex.: coluna do Excel com números e textos misturados
+        as_text = series.map(lambda v: None if v is None or (isinstance(v, float) and v != v) else str(v))
+        return pa.array(as_text, type=pa.string(), from_pandas=True)
+
+
+def dataframe_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """Converte um DataFrame em tabela Arrow (sem índice, nomes de coluna como texto)"""
+    arrays = [_series_to_arrow(df.iloc[:, i]) for i in range(df.shape[1])]
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def _promote_type(a: pa.DataType, b: pa.DataType) -> pa.DataType:
+    """Menor tipo capaz de representar valores de a e de b"""
+    if a.equals(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    if pa.types.is_null(b):
+        return a
+    if pa.types.is_integer(a) and pa.types.is_integer(b):
+        return pa.int64()
+    if (pa.types.is_integer(a) or pa.types.is_floating(a)) and (pa.types.is_integer(b) or pa.types.is_floating(b)):
+        return pa.float64()
+    return pa.string()
+
+
+def _promote_schema(current: pa.Schema, incoming: pa.Schema) -> pa.Schema:
+    if current.names != incoming.names:
+        raise ValueError("Colunas divergentes entre blocos do arquivo")
+    return pa.schema([
+        pa.field(name, _promote_type(current.field(name).type, incoming.field(name).type))
+        for name in current.names
+    ])
+
+
+class ParquetDatasetWriter:
+    """
+    Grava um dataset em um arquivo Parquet temporário, um row group por bloco.
+
+    O schema é inferido do primeiro bloco. Se um bloco posterior trouxer tipos
+    diferentes (ex.: coluna inteira que passa a ter nulos), o schema é promovido
+    e os row groups já gravados são regravados com o novo schema.
+    Os sketches de quantis das colunas numéricas são atualizados bloco a bloco.
+    """
+
+    def __init__(self):
+        self.path = self._new_path()
+        self.schema: Optional[pa.Schema] = None
+        self.writer: Optional[pq.ParquetWriter] = None
+        self.row_count = 0
+        self.sketches: Dict[str, QuantileSketch] = {}
+        self._unsketched: set = set()
+
+    @staticmethod
+    def _new_path() -> str:
+        fd, path = tempfile.mkstemp(suffix='.parquet', prefix='dataset_', dir=UPLOAD_TMP_DIR)
+        os.close(fd)
+        return path
+
+    def _open(self, schema: pa.Schema) -> None:
+        self.schema = schema
+        self.writer = pq.ParquetWriter(self.path, schema, compression=PARQUET_COMPRESSION)
+
+    def _rewrite(self, schema: pa.Schema) -> None:
+        self.writer.close()
+        old_path = self.path
+        self.path = self._new_path()
+        self._open(schema)
+        source = pq.ParquetFile(old_path)
+        for i in range(source.num_row_groups):
+            self.writer.write_table(source.read_row_group(i).cast(schema))
+        remove_spooled_file(old_path)
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = dataframe_to_arrow(df)
+        if self.writer is None:
+            self._open(table.schema)
+        elif not table.schema.equals(self.schema):
+            target = _promote_schema(self.schema, table.schema)
+            if not target.equals(self.schema):
+                self._rewrite(target)
+            table = table.cast(target)
+        self.writer.write_table(table)
+        self.row_count += table.num_rows
+        update_column_sketches(self.sketches, df, self._unsketched)
+
+    @property
+    def columns(self) -> List[str]:
+        return self.schema.names if self.schema is not None else []
+
+    def close(self) -> str:
+        if self.writer is None:
+            self._open(pa.schema([]))
+        self.writer.close()
+        return self.path
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        remove_spooled_file(self.path)
+
+
+def write_dataset(frames: Iterable[pd.DataFrame], user_id: str) -> Dict[str, Any]:
+    """
+    Grava os blocos de um dataset em Parquet no armazenamento de datasets,
+    criptografado em repouso (contêiner em blocos de crypto_utils).
+    Retorna os campos de uploaded_data que apontam para o arquivo gravado.
+    """
+    writer = ParquetDatasetWriter()
+    try:
+        for frame in frames:
+            writer.write(frame)
+        path = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    fd, encrypted_path = tempfile.mkstemp(suffix='.parquet.enc', prefix='dataset_', dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as encrypted_file:
+            encrypt_file(path, encrypted_file)
+        key = f"{user_id}/{uuid.uuid4().hex}.parquet.enc"
+        size = get_dataset_store().put_file(key, encrypted_path)
+    finally:
+        remove_spooled_file(path)
+        remove_spooled_file(encrypted_path)
+    return {
+        'storage_format': 'parquet',
+        'storage_key': key,
+        'storage_size': size,
+        'columns': writer.columns,
+        'row_count': writer.row_count,
+        'column_sketches': sketches_to_dict(writer.sketches)
+    }
+
+
+def insert_dataset_record(record: Dict[str, Any], stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Cria o registro de metadados em uploaded_data para um dataset já gravado"""
+    data_to_save = dict(record)
+    data_to_save.update(stored)
+    data_to_save['data'] = []
+    try:
+        response = supabase.table('uploaded_data').insert(data_to_save).execute()
+        if not response.data:
+            raise ValueError("Erro ao salvar dados no banco")
+    except Exception:
+        # Não deixar arquivos órfãos no armazenamento
+        get_dataset_store().delete(stored['storage_key'])
+        raise
+    return response.data[0]
+
+
+def ingest_csv_stream(path: str, record: Dict[str, Any], preview_rows: int = 10,
+                      chunk_rows: int = STREAM_CHUNK_ROWS) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Ingere um CSV grande bloco a bloco.
+
+    Cada bloco é convertido e gravado como um row group do arquivo Parquet do
+    dataset, de modo que apenas um bloco fica em memória por vez. O registro em
+    uploaded_data guarda apenas os metadados e o ponteiro para o arquivo.
+    Retorna o registro salvo e o preview.
+    """
+    chunks = iter_csv_chunks(path, chunk_rows)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("Arquivo CSV vazio")
+    preview = dataframe_to_records(first.head(preview_rows))
+
+    stored = write_dataset(itertools.chain([first], chunks), record['user_id'])
+    print(f"📦 Dataset gravado em {stored['storage_key']} - {stored['row_count']} linhas, {stored['storage_size']} bytes")
+    return insert_dataset_record(record, stored), preview
+
+
+def _open_dataset_blob(storage_key: str):
+    """
+    Abre o arquivo Parquet de um dataset para leitura com acesso aleatório.
+    Contêineres criptografados são decifrados sob demanda, só nos blocos lidos;
+    arquivos antigos, gravados em texto puro, são lidos direto (memory map se em disco).
+    """
+    store = get_dataset_store()
+    f = store.open(storage_key)
+    try:
+        if is_encrypted_container(f):
+            return EncryptedChunkReader(f)
+    except Exception:
+        f.close()
+        raise
+    path = store.local_path(storage_key)
+    if path is not None:
+        f.close()
+        return pa.memory_map(path)
+    return f
+
+
+def read_parquet_dataset(storage_key: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Lê um dataset Parquet do armazenamento (apenas as colunas pedidas, se informadas)"""
+    with _open_dataset_blob(storage_key) as source:
+        return pq.read_table(source, columns=columns).to_pandas()
+
+
+def load_dataframe(record: Dict[str, Any]) -> pd.DataFrame:
+    """Constrói o DataFrame de um registro de uploaded_data, qualquer que seja o formato"""
+    if record.get('storage_format') == 'parquet':
+        return read_parquet_dataset(record['storage_key'])
+    return pd.DataFrame(record.get('data') or [])
+
+
+def save_dataframe(data_id: str, df: pd.DataFrame, **fields) -> None:
+    """
+    Substitui os dados de um dataset (usado pelas rotas de preparação de dados).
+    Grava um novo arquivo Parquet, atualiza o ponteiro e remove os dados antigos
+    (inclusive a cópia do arquivo original guardada por versões anteriores do upload).
+    """
+    previous = supabase.table('uploaded_data').select('user_id, storage_format, storage_key, raw_storage_key') \
+        .eq('id', data_id).execute()
+    if not previous.data:
+        raise ValueError("Dados não encontrados")
+    previous_format = previous.data[0].get('storage_format')
+    previous_key = previous.data[0].get('storage_key')
+    previous_raw_key = previous.data[0].get('raw_storage_key')
+
+    stored = write_dataset([df], previous.data[0]['user_id'])
+    update = dict(stored)
+    update.update({
+        'data': [],
+        'raw_storage_key': None,
+        'updated_at': pd.Timestamp.now().isoformat()
+    })
+    update.update(fields)
+    try:
+        supabase.table('uploaded_data').update(update).eq('id', data_id).execute()
+    except Exception:
+        get_dataset_store().delete(stored['storage_key'])
+        raise
+    invalidate_dataset(data_id)
+
+    if previous_format == 'parquet' and previous_key:
+        get_dataset_store().delete(previous_key)
+    if previous_raw_key:
+        get_dataset_store().delete(previous_raw_key)
+
+
+def invalidate_dataset(data_id: str) -> None:
+    """Descarta o DataFrame em cache de um dataset (após regravar os dados)"""
+    dataset_frame_cache.pop(data_id)
+    disk_cache = get_dataset_disk_cache()
+    if disk_cache is not None:
+        disk_cache.delete(data_id)
+
+
+def get_dataset_meta(data_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Metadados de um dataset (sem a coluna data), ou None se não existir"""
+    query = supabase.table('uploaded_data').select(DATASET_META_COLUMNS).eq('id', data_id)
+    if user_id is not None:
+        query = query.eq('user_id', user_id)
+    response = query.execute()
+    return response.data[0] if response.data else None
+
+
+_dataset_disk_cache: Optional[DiskArrowCache] = None
+
+
+def get_dataset_disk_cache() -> Optional[DiskArrowCache]:
+    """Cache de datasets em disco (criado no primeiro uso), ou None se desativado"""
+    global _dataset_disk_cache
+    if DATASET_DISK_CACHE_MAX_BYTES <= 0:
+        return None
+    if _dataset_disk_cache is None:
+        _dataset_disk_cache = DiskArrowCache(DATASET_DISK_CACHE_DIR, DATASET_DISK_CACHE_MAX_BYTES)
+    return _dataset_disk_cache
+
+
+def _read_disk_cached_frame(data_id: str, version: Any) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    disk_cache = get_dataset_disk_cache()
+    if disk_cache is None:
+        return None
+    table = disk_cache.get(data_id, version)
+    if table is None:
+        return None
+    metadata = table.schema.metadata or {}
+    report = json.loads(metadata.get(b'compaction_report', b'{}'))
+    # split_blocks permite que colunas numéricas sem nulos apontem direto para o arquivo mapeado
+    return table.to_pandas(split_blocks=True), report
+
+
+def _write_disk_cached_frame(data_id: str, version: Any, df: pd.DataFrame, report: Dict[str, Any]) -> None:
+    disk_cache = get_dataset_disk_cache()
+    if disk_cache is None:
+        return
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'compaction_report'] = json.dumps(report).encode()
+        disk_cache.put(data_id, version, table.replace_schema_metadata(metadata))
+    except Exception as e:
+        # O cache em disco é só uma otimização: o dataset continua disponível
+        print(f"⚠️ Dataset {data_id} não gravado no cache em disco: {e}")
+
+
+def _load_compacted_frame(meta: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """DataFrame compactado de um dataset (do cache, se a versão for a mesma) e o relatório da compactação"""
+    data_id = meta['id']
+    version = meta.get('updated_at')
+
+    cached = dataset_frame_cache.get(data_id)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    disk_version = (version, DATASET_DISK_CACHE_FORMAT)
+    from_disk = _read_disk_cached_frame(data_id, disk_version)
+    if from_disk is not None:
+        df, report = from_disk
+    else:
+        if meta.get('storage_format') == 'parquet':
+            df = load_dataframe(meta)
+        else:
+            # Registros antigos com os dados inline: só agora busca a coluna data
+            full = supabase.table('uploaded_data').select('*').eq('id', data_id).execute()
+            df = load_dataframe(full.data[0]) if full.data else pd.DataFrame()
+        df, report = compact_dataframe(df)
+        print(f"🗜️ Dataset {data_id} compactado: {report['bytes_before']} -> {report['bytes_after']} bytes")
+        _write_disk_cached_frame(data_id, disk_version, df, report)
+    dataset_frame_cache.put(data_id, (version, df, report), frame_memory_usage(df))
+    return df, report
+
+
+def load_dataset_frame(meta: Dict[str, Any], writable: bool = False) -> pd.DataFrame:
+    """
+    DataFrame de um dataset a partir dos seus metadados.
+
+    O cache guarda a versão compactada (categóricas, tipos reduzidos); cada
+    chamada recebe uma cópia com os tipos numéricos usuais. Com writable=True
+    as categóricas também voltam a ser texto, para rotas que alteram valores.
+    """
+    df, _ = _load_compacted_frame(meta)
+    return restore_dtypes(df, keep_categories=not writable)
+
+
+def dataset_memory_report(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Relatório da compactação do dataset em memória (bytes economizados por coluna)"""
+    _, report = _load_compacted_frame(meta)
+    return report
+
+
+def dataset_version_key(meta: Dict[str, Any]) -> str:
+    """Identifica o conteúdo atual de um dataset (muda a cada gravação), para chaves de cache derivadas"""
+    return f"dataset:{meta['id']}:{meta.get('updated_at')}:{meta.get('storage_key')}"
+
+
+def load_column_sketches(meta: Dict[str, Any], df: Optional[pd.DataFrame] = None) -> Dict[str, QuantileSketch]:
+    """
+    Sketches de quantis gravados com o dataset (uploaded_data.column_sketches),
+    por coluna numérica. Datasets gravados antes dos sketches: calculados a
+    partir de df (se informado) e gravados no registro para as próximas leituras.
+    """
+    key = dataset_version_key(meta)
+    cached = column_sketch_cache.get(key)
+    if cached is not None:
+        return cached
+
+    stored = None
+    try:
+        # Mesma versão da chave do cache: se o dataset foi regravado depois dos
+        # metadados, nenhuma linha volta e os sketches saem de df
+        query = supabase.table('uploaded_data').select('column_sketches').eq('id', meta['id'])
+        if meta.get('updated_at'):
+            query = query.eq('updated_at', meta['updated_at'])
+        response = query.execute()
+        stored = response.data[0].get('column_sketches') if response.data else None
+    except Exception as e:
+        # Os sketches são só uma otimização: sem eles os quantis são calculados sobre os dados
+        print(f"⚠️ Sketches do dataset {meta['id']} indisponíveis: {e}")
+
+    if stored is not None:
+        sketches = sketches_from_dict(stored)
+    elif df is not None:
+        sketches = build_column_sketches(df)
+        if meta.get('updated_at'):
+            try:
+                # Só grava se o dataset não foi regravado desde a leitura dos metadados
+                supabase.table('uploaded_data').update({'column_sketches': sketches_to_dict(sketches)}) \
+                    .eq('id', meta['id']).eq('updated_at', meta['updated_at']).execute()
+            except Exception as e:
+                print(f"⚠️ Sketches do dataset {meta['id']} não gravados: {e}")
+    else:
+        return {}
+    column_sketch_cache.put(key, sketches, sum(sketch.size for sketch in sketches.values()))
+    return sketches
+
+
+def upload_source(content: bytes, digest: str, filename: str) -> Dict[str, Any]:
+    """Origem de dados (serializável) de um arquivo enviado, para tarefas executadas em outro processo"""
+    return {'kind': 'upload', 'content': content, 'digest': digest, 'filename': filename}
+
+
+def dataset_source(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Origem de dados (serializável) de um dataset armazenado, para tarefas executadas em outro processo"""
+    return {'kind': 'dataset', 'meta': meta}
+
+
+def frame_source(df: pd.DataFrame) -> Dict[str, Any]:
+    """Origem de dados com um DataFrame já carregado (enviado por pickle ao processo)"""
+    return {'kind': 'frame', 'frame': df}
+
+
+def load_frame_source(source: Dict[str, Any]) -> pd.DataFrame:
+    """DataFrame (gravável) de uma origem criada por upload_source, dataset_source ou frame_source"""
+    if source['kind'] == 'frame':
+        return source['frame'].copy()
+    if source['kind'] == 'upload':
+        return upload_dataframe(source['content'], source['digest'], source['filename'])
+    if source['kind'] == 'dataset':
+        return load_dataset_frame(source['meta'], writable=True)
+    raise ValueError(f"Origem de dados desconhecida: {source['kind']}")
+
+
+def load_dataset(data_id: str, user_id: Optional[str] = None,
+                 writable: bool = False) -> Optional[Tuple[Dict[str, Any], pd.DataFrame]]:
+    """Carrega um dataset armazenado como (metadados, DataFrame), ou None se não existir"""
+    meta = get_dataset_meta(data_id, user_id)
+    if meta is None:
+        return None
+    return meta, load_dataset_frame(meta, writable)
+
+
+def _encode_cursor(created_at: str, row_id: Any) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+    return created_at, row_id
+
+
+def list_workspaces_page(user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Lista os metadados dos datasets do usuário, do mais recente ao mais antigo,
+    com paginação por cursor (created_at, id). Retorna a página e o próximo cursor.
+    """
+    query = supabase.table('uploaded_data').select(WORKSPACE_LIST_COLUMNS).eq('user_id', user_id)
+    if cursor:
+        created_at, row_id = _decode_cursor(cursor)
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})')
+    # Busca um registro a mais para saber se existe próxima página
+    response = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+    rows = response.data or []
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def _encode_rows_cursor(offset: int, version: Optional[str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'o': offset, 'v': version}).encode()).decode()
+
+
+def _decode_rows_cursor(cursor: str, version: Optional[str]) -> int:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(state['o'])
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+    if state.get('v') != version:
+        raise ValueError("O dataset foi alterado desde a última página; reinicie a paginação")
+    return offset
+
+
+def _open_parquet(storage_key: str) -> pq.ParquetFile:
+    return pq.ParquetFile(_open_dataset_blob(storage_key))
+
+
+def _parquet_sort_order(pf: pq.ParquetFile, storage_key: str, sort_by: str, descending: bool) -> np.ndarray:
+    """Posições das linhas na ordem pedida (estável, nulos no final), lendo só a coluna de ordenação"""
+    key = (storage_key, sort_by, descending)
+    order = sort_index_cache.get(key)
+    if order is None:
+        values = pf.read(columns=[sort_by]).column(0).combine_chunks()
+        order = pc.array_sort_indices(
+            values, order='descending' if descending else 'ascending', null_placement='at_end'
+        ).to_numpy().astype('int64')
+        sort_index_cache.put(key, order, order.nbytes)
+    return order
+
+
+def _parquet_take(pf: pq.ParquetFile, positions: np.ndarray, columns: List[str]) -> pd.DataFrame:
+    """Lê apenas os row groups que contêm as linhas pedidas e devolve-as na ordem dada"""
+    if len(positions) == 0:
+        return pf.schema_arrow.empty_table().select(columns).to_pandas()
+    sizes = [pf.metadata.row_group(i).num_rows for i in range(pf.num_row_groups)]
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+    groups = np.unique(np.searchsorted(starts, positions, side='right') - 1)
+    table = pf.read_row_groups(groups.tolist(), columns=columns)
+    # Posição de cada linha pedida dentro da tabela lida
+    group_offsets = np.concatenate([[0], np.cumsum([sizes[g] for g in groups])])
+    group_of = np.searchsorted(starts, positions, side='right') - 1
+    local = group_offsets[np.searchsorted(groups, group_of)] + (positions - starts[group_of])
+    return table.take(pa.array(local)).to_pandas()
+
+
+def read_dataset_rows(meta: Dict[str, Any], offset: int = 0, limit: int = 100,
+                      columns: Optional[List[str]] = None, sort_by: Optional[str] = None,
+                      descending: bool = False, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Uma página de linhas de um dataset, com projeção de colunas e ordenação.
+
+    Para datasets em Parquet, lê do arquivo apenas a coluna de ordenação (se
+    houver) e os row groups que contêm a página. O cursor retornado em
+    next_cursor fica atrelado à versão do dataset e tem precedência sobre offset.
+    """
+    limit = max(1, min(limit, DATASET_PAGE_MAX_ROWS))
+    version = meta.get('updated_at')
+    if cursor:
+        offset = _decode_rows_cursor(cursor, version)
+    offset = max(0, offset)
+
+    if meta.get('storage_format') == 'parquet':
+        pf = _open_parquet(meta['storage_key'])
+        available = pf.schema_arrow.names
+        total = pf.metadata.num_rows
+    else:
+        df = load_dataset_frame(meta)
+        available = [str(c) for c in df.columns]
+        df.columns = available
+        total = len(df)
+
+    selected = columns or available
+    missing = [c for c in selected + ([sort_by] if sort_by else []) if c not in available]
+    if missing:
+        raise ValueError(f"Colunas não encontradas: {missing}")
+
+    stop = min(offset + limit, total)
+    if meta.get('storage_format') == 'parquet':
+        if sort_by:
+            positions = _parquet_sort_order(pf, meta['storage_key'], sort_by, descending)[offset:stop]
+        else:
+            positions = np.arange(offset, stop) if offset < stop else np.array([], dtype='int64')
+        page = _parquet_take(pf, positions, selected)
+    else:
+        if sort_by:
+            df = df.sort_values(sort_by, ascending=not descending, kind='stable', na_position='last')
+        page = df[selected].iloc[offset:stop]
+
+    return {
+        'columns': selected,
+        'rows': dataframe_to_records(page),
+        'offset': offset,
+        'limit': limit,
+        'total_rows': total,
+        'next_cursor': _encode_rows_cursor(stop, version) if stop < total else None
+    }
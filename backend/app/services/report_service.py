@@ -1 +1,730 @@
- 
\ No newline at end of file
+import hashlib
+import json
+import os
+import pandas as pd
+import numpy as np
+import xlsxwriter
+from io import BytesIO
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+from datetime import datetime
+from app.utils.cache import DiskBlobCache
+from app.utils.pandas_utils import top_n_with_others
+from app.utils.storage import REPORT_CACHE_DIR
+
+# A partir de quantas linhas o workbook é escrito em modo de memória constante
+# (cada linha vai para um arquivo temporário assim que é escrita)
+CONSTANT_MEMORY_MIN_ROWS = 50_000
+
+# Cache local de relatórios renderizados (.xlsx); 0 desativa
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Incluída na chave do cache: mudar o layout dos relatórios invalida os arquivos antigos
+REPORT_CACHE_VERSION = 2
+
+# Grupos exibidos na análise geográfica (e no gráfico); os demais viram "Outros"
+# e o detalhe completo vai para a aba GEO_DETAIL_SHEET
+GEO_SHEET_TOP_N = 20
+GEO_DETAIL_SHEET = 'Detalhe Geográfico'
+
+# Largura máxima de coluna aplicada pelo ajuste automático
+MAX_COLUMN_WIDTH = 60
+
+# Colunas mais altas que isto têm a largura estimada por uma amostra de linhas
+AUTO_WIDTH_SAMPLE_ROWS = 10_000
+
+# Estilo dos cabeçalhos de todas as planilhas
+HEADER_STYLE = {
+    'bold': True,
+    'font_color': '#FFFFFF',
+    'bg_color': '#366092',
+    'align': 'center',
+    'valign': 'vcenter'
+}
+
+# Formatos numéricos por faixa de grandeza (as vírgulas finais dividem o valor
+# por mil, então o Excel mostra 1.234.567 como "1,2M")
+NUMBER_FORMATS = {
+    'B': '#,##0.0,,,"B"',
+    'M': '#,##0.0,,"M"',
+    'K': '#,##0.0,"K"',
+    'plain': '#,##0.00',
+    'percent': '0.00"%"',
+    'datetime': 'yyyy-mm-dd hh:mm:ss'
+}
+
+# Estilos de coluna aceitos em number_formats:
+#   'magnitude'   - B/M/K conforme o valor
+#   'magnitude_m' - M/K conforme o valor (sem bilhões)
+#   'percent'     - valor já em pontos percentuais
+#   None          - sem formato numérico
+MAGNITUDE_STEPS = {
+    'magnitude': [(1e9, 'B'), (1e6, 'M'), (1e3, 'K')],
+    'magnitude_m': [(1e6, 'M'), (1e3, 'K')],
+}
+
+
+def magnitude_number_format(values: pd.Series, style: str) -> str:
+    """
+    Formato numérico condicional de uma coluna inteira, escolhido a partir das
+    faixas de grandeza presentes nela (contagem vetorizada). O próprio Excel
+    escolhe o sufixo de cada célula, ex.:
+    [>=1000000]#,##0.0,,"M";[>=1000]#,##0.0,"K";#,##0.00
+
+    O Excel aceita no máximo duas condições por formato: se a coluna tiver mais
+    de três faixas, as menores são mostradas no formato da terceira.
+    """
+    steps = MAGNITUDE_STEPS[style]
+    numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64')
+    numbers = numbers[~np.isnan(numbers)]
+    limits = np.array([limit for limit, _ in reversed(steps)])
+    counts = np.bincount(np.searchsorted(limits, numbers, side='right'), minlength=len(limits) + 1)
+    names = ['plain'] + [name for _, name in reversed(steps)]
+    present = [(limit, name) for limit, name, count
+               in zip([None] + limits.tolist(), names, counts) if count][::-1]
+    if not present:
+        return NUMBER_FORMATS['plain']
+    sections = [f"[>={limit:.0f}]{NUMBER_FORMATS[name]}" for limit, name in present[:-1][:2]]
+    return ';'.join(sections + [NUMBER_FORMATS[present[min(len(present) - 1, 2)][1]]])
+
+
+def column_text_width(values) -> int:
+    """
+    Maior comprimento de texto de uma coluna (ou índice), calculado de forma
+    vetorizada. Colunas muito altas são estimadas por uma amostra fixa de linhas.
+    """
+    series = pd.Series(values).dropna()
+    if series.empty:
+        return 0
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        # Datas são exibidas sempre no formato completo (yyyy-mm-dd hh:mm:ss)
+        return len(NUMBER_FORMATS['datetime'])
+    if len(series) > AUTO_WIDTH_SAMPLE_ROWS:
+        series = series.sample(AUTO_WIDTH_SAMPLE_ROWS, random_state=0)
+    return int(series.astype(str).str.len().max())
+
+
+class ExcelReportWriter:
+    """
+    Escreve um workbook .xlsx em uma única passada com xlsxwriter: cabeçalhos,
+    formatos numéricos, larguras e gráficos são aplicados durante a escrita,
+    sem recarregar o arquivo para formatá-lo.
+
+    Cada planilha deve ser escrita de cima para baixo (exigência do modo de
+    memória constante).
+    """
+
+    def __init__(self, output, constant_memory: bool = False, created: Optional[datetime] = None):
+        self.workbook = xlsxwriter.Workbook(output, {
+            'constant_memory': constant_memory,
+            'nan_inf_to_errors': True,
+        })
+        if created is not None:
+            # Data de criação fixa: as mesmas entradas geram o mesmo arquivo
+            self.workbook.set_properties({'created': created})
+        self.sheets: Dict[str, Any] = {}
+        self.widths: Dict[str, Dict[int, float]] = {}
+        self.fixed_widths: Dict[str, Dict[int, float]] = {}
+        self._formats: Dict[str, Any] = {}
+
+    def _format(self, name: str):
+        if name not in self._formats:
+            if name == 'header':
+                self._formats[name] = self.workbook.add_format(HEADER_STYLE)
+            elif name == 'index':
+                self._formats[name] = self.workbook.add_format({'bold': True})
+            else:
+                self._formats[name] = self.workbook.add_format({'num_format': NUMBER_FORMATS.get(name, name)})
+        return self._formats[name]
+
+    def sheet(self, name: str):
+        if name not in self.sheets:
+            self.sheets[name] = self.workbook.add_worksheet(name)
+            self.widths[name] = {}
+            self.fixed_widths[name] = {}
+        return self.sheets[name]
+
+    def _track_width(self, sheet_name: str, col: int, length: int) -> None:
+        widths = self.widths[sheet_name]
+        widths[col] = max(widths.get(col, 0), length)
+
+    def _column_format(self, series: pd.Series, style: Optional[str]):
+        """Um único formato para a coluna inteira (o custo depende só do número de colunas)"""
+        if style is None:
+            return None
+        if style in MAGNITUDE_STEPS:
+            return self._format(magnitude_number_format(series, style))
+        return self._format(style)
+
+    def _column_writer(self, ws, series: pd.Series, style: Optional[str]):
+        """
+        Prepara a escrita de uma coluna: valores nativos do Python (nulos como
+        None), a função de escrita do xlsxwriter e o formato da coluna.
+        """
+        dtype = series.dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            values = series.dt.tz_localize(None) if getattr(series.dt, 'tz', None) is not None else series
+            values = [None if pd.isna(v) else v.to_pydatetime() for v in values]
+            return values, ws.write_datetime, self._format('datetime')
+
+        if pd.api.types.is_bool_dtype(dtype):
+            values = series.astype(object).where(series.notna(), None).tolist()
+            return values, ws.write_boolean, None
+
+        if pd.api.types.is_numeric_dtype(dtype):
+            numbers = series.astype('float64')
+            values = numbers.astype(object).where(numbers.notna(), None).tolist()
+            return values, ws.write_number, self._column_format(numbers, style)
+
+        # Texto e colunas mistas: números continuam números, o resto vira texto
+        values = series.astype(object).where(series.notna(), None).tolist()
+
+        def write_mixed(row, col, value, fmt=None):
+            if isinstance(value, (bool, np.bool_)):
+                return ws.write_boolean(row, col, bool(value))
+            if isinstance(value, (int, float, np.integer, np.floating)):
+                return ws.write_number(row, col, float(value), fmt)
+            return ws.write_string(row, col, str(value))
+
+        numeric = series.map(lambda v: isinstance(v, (int, float, np.integer, np.floating))
+                             and not isinstance(v, (bool, np.bool_)))
+        return values, write_mixed, self._column_format(series[numeric], style)
+
+    def write_frame(self, sheet_name: str, df: pd.DataFrame, startrow: int = 0, index: bool = False,
+                    number_formats: Optional[Dict[str, Optional[str]]] = None,
+                    default_format: Optional[str] = 'magnitude') -> int:
+        """
+        Escreve um DataFrame a partir de startrow (cabeçalho estilizado + dados).
+        number_formats define o estilo por coluna; as demais colunas numéricas
+        usam default_format. Retorna a próxima linha livre da planilha.
+        """
+        ws = self.sheet(sheet_name)
+        number_formats = number_formats or {}
+        header_format = self._format('header')
+
+        headers = [str(c) for c in df.columns]
+        series_list = [df.iloc[:, j] for j in range(df.shape[1])]
+        columns = [self._column_writer(ws, s, number_formats.get(h, default_format))
+                   for h, s in zip(headers, series_list)]
+        if index:
+            # Índice como primeira coluna, em negrito (como no to_excel do pandas)
+            index_format = self._format('index')
+            index_values = [None if pd.isna(v) else str(v) for v in df.index]
+            headers.insert(0, '' if df.index.name is None else str(df.index.name))
+            columns.insert(0, (index_values, ws.write_string, index_format))
+
+        # Larguras calculadas a partir do DataFrame antes da escrita
+        sources = ([df.index] if index else []) + series_list
+        for j, (header, source) in enumerate(zip(headers, sources)):
+            self._track_width(sheet_name, j, max(len(header), column_text_width(source)))
+
+        for j, header in enumerate(headers):
+            ws.write_string(startrow, j, header, header_format)
+
+        for i in range(len(df)):
+            row = startrow + 1 + i
+            for j, (values, write, column_format) in enumerate(columns):
+                value = values[i]
+                if value is not None:
+                    write(row, j, value, column_format)
+
+        return startrow + 1 + len(df)
+
+    def set_widths(self, sheet_name: str, widths: Dict[int, float]) -> None:
+        """Larguras fixas por índice de coluna (têm precedência sobre o ajuste automático)"""
+        self.sheet(sheet_name)
+        self.fixed_widths[sheet_name].update(widths)
+
+    def add_bar_chart(self, sheet_name: str, rows: int, title: str, x_title: str, y_title: str,
+                      anchor: str = 'G2') -> None:
+        """
+        Gráfico de colunas com os valores da coluna B e as categorias da coluna A
+        (linhas 2 até rows + 1), com rótulos de dados.
+        """
+        chart = self.workbook.add_chart({'type': 'column'})
+        chart.add_series({
+            'name': [sheet_name, 0, 1],
+            'categories': [sheet_name, 1, 0, rows, 0],
+            'values': [sheet_name, 1, 1, rows, 1],
+            'data_labels': {'value': True},
+        })
+        chart.set_title({'name': title})
+        chart.set_x_axis({'name': x_title})
+        chart.set_y_axis({'name': y_title})
+        chart.set_style(10)
+        self.sheet(sheet_name).insert_chart(anchor, chart)
+
+    def close(self, auto_width_sheets: Optional[List[str]] = None) -> None:
+        """Aplica as larguras de coluna (uma vez por coluna) e finaliza o arquivo"""
+        for name, ws in self.sheets.items():
+            widths = {}
+            if auto_width_sheets is None or name in auto_width_sheets:
+                widths = {col: min(length + 4, MAX_COLUMN_WIDTH) for col, length in self.widths[name].items()}
+            widths.update(self.fixed_widths[name])
+            for col, width in widths.items():
+                ws.set_column(col, col, width)
+        self.workbook.close()
+
+
+def _new_writer(df: pd.DataFrame, created: datetime):
+    output = BytesIO()
+    return output, ExcelReportWriter(output, constant_memory=len(df) >= CONSTANT_MEMORY_MIN_ROWS, created=created)
+
+
+# ---------------------------------------------------------------------------
+# Plano de relatório: um report_type ou template vira um grafo de etapas.
+# Agregações são nós identificados por uma chave (nome + parâmetros); planilhas
+# e gráficos dependem delas. O executor calcula cada agregação uma única vez,
+# mesmo que várias planilhas (ou vários relatórios) usem a mesma.
+# ---------------------------------------------------------------------------
+
+def _agg_describe(df: pd.DataFrame) -> pd.DataFrame:
+    return df.describe()
+
+
+def _agg_geography(df: pd.DataFrame, region_col: str, value_col: str) -> pd.DataFrame:
+    geo_analysis = df.groupby(region_col)[value_col].agg(['sum', 'mean', 'count']).reset_index()
+    geo_analysis.columns = [region_col, 'Total', 'Média', 'Quantidade']
+    geo_analysis['Percentual'] = (geo_analysis['Total'] / geo_analysis['Total'].sum() * 100).round(2)
+    return geo_analysis
+
+
+def _agg_trend(df: pd.DataFrame, date_col: str, value_col: str) -> pd.DataFrame:
+    try:
+        dates = pd.to_datetime(df[date_col])
+        trend_analysis = df.groupby(dates.dt.to_period('M'))[value_col].agg(['sum', 'mean']).reset_index()
+        trend_analysis.columns = ['Período', 'Total', 'Média']
+        trend_analysis['Período'] = trend_analysis['Período'].astype(str)
+    except Exception:
+        # Se não conseguir converter, agrupar por valores únicos
+        trend_analysis = df.groupby(date_col)[value_col].agg(['sum', 'mean']).reset_index()
+        trend_analysis.columns = [date_col, 'Total', 'Média']
+    return trend_analysis
+
+
+def _agg_value_stats(df: pd.DataFrame, value_col: str) -> Dict[str, float]:
+    values = df[value_col]
+    return {
+        'mean': values.mean(), 'std': values.std(), 'min': values.min(), 'max': values.max(),
+        'median': values.median(), 'q1': values.quantile(0.25), 'q3': values.quantile(0.75)
+    }
+
+
+def _agg_outliers(df: pd.DataFrame, value_col: str, stats: Dict[str, float]) -> pd.DataFrame:
+    values = df[value_col]
+    iqr = stats['q3'] - stats['q1']
+    return df[(values < stats['q1'] - 1.5 * iqr) | (values > stats['q3'] + 1.5 * iqr)]
+
+
+# Agregações disponíveis: nome -> (função, nomes das agregações de que depende).
+# A função recebe o DataFrame, os parâmetros da chave e os resultados das dependências.
+AGGREGATIONS = {
+    'describe': (_agg_describe, ()),
+    'geography': (_agg_geography, ()),
+    'trend': (_agg_trend, ()),
+    'value_stats': (_agg_value_stats, ()),
+    'outliers': (_agg_outliers, ('value_stats',)),
+}
+
+
+class SheetStage:
+    """Etapa de renderização: uma planilha (e seus gráficos) a partir de agregações do plano"""
+
+    def __init__(self, sheet: str, render: str, inputs: tuple = (), auto_width: bool = True, **options: Any):
+        self.sheet = sheet
+        self.render = render
+        self.inputs = inputs
+        self.auto_width = auto_width
+        self.options = options
+
+
+class ReportPlan:
+    """Relatório compilado: planilhas na ordem de escrita e as agregações de que dependem"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: List[SheetStage] = []
+
+    def add(self, sheet: str, render: str, *inputs: tuple, **options: Any) -> None:
+        self.stages.append(SheetStage(sheet, render, inputs, **options))
+
+    def aggregations(self) -> List[tuple]:
+        """Chaves de todas as agregações do plano (incluindo dependências), sem repetição"""
+        keys: List[tuple] = []
+
+        def visit(key):
+            for dependency in AGGREGATIONS[key[0]][1]:
+                visit((dependency,) + key[1:])
+            if key not in keys:
+                keys.append(key)
+        for stage in self.stages:
+            for key in stage.inputs:
+                visit(key)
+        return keys
+
+
+def compute_aggregation(df: pd.DataFrame, key: tuple, results: Dict[tuple, Any]) -> Any:
+    """Resultado de uma agregação do plano, calculado uma única vez por conjunto de resultados"""
+    if key not in results:
+        fn, dependencies = AGGREGATIONS[key[0]]
+        inputs = [compute_aggregation(df, (dependency,) + key[1:], results) for dependency in dependencies]
+        results[key] = fn(df, *key[1:], *inputs)
+    return results[key]
+
+
+def compile_report_plan(df: pd.DataFrame, source_name: str, report_type: str, title: str, include_charts: bool,
+                        include_summary: bool, custom_analysis: Optional[str], value_column: Optional[str],
+                        region_column: Optional[str], date_column: Optional[str], current_user: str) -> ReportPlan:
+    """Plano do relatório Excel automático (por report_type)"""
+    print(f"🔍 Debug - report_type: '{report_type}', region_column: '{region_column}', "
+          f"value_column: '{value_column}', include_charts: {include_charts}")
+    plan = ReportPlan(f"relatorio_{report_type}")
+
+    # Aba 1: Dados Originais
+    plan.add('Dados Originais', 'data')
+
+    # Aba 2: Resumo Estatístico
+    if include_summary:
+        plan.add('Resumo Estatístico', 'summary', ('describe',))
+
+    # Aba 3: Análise Específica baseada no tipo
+    if report_type == 'summary':
+        plan.add('Análise Geral', 'overview')
+
+    elif report_type == 'geography' and region_column and value_column and region_column.strip() and value_column.strip():
+        if region_column in df.columns and value_column in df.columns:
+            plan.add('Análise Geográfica', 'geography', ('geography', region_column, value_column),
+                     auto_width=False, sort=True, chart=include_charts, default_format='magnitude',
+                     number_formats={'Total': 'magnitude', 'Média': 'magnitude_m',
+                                     'Quantidade': 'magnitude_m', 'Percentual': 'percent'},
+                     widths={0: 15, 1: 25, 2: 20, 3: 20, 4: 15})
+        else:
+            print(f"❌ Colunas não encontradas: {region_column} ou {value_column}")
+
+    elif report_type == 'trend' and date_column and value_column:
+        if date_column in df.columns and value_column in df.columns:
+            plan.add('Análise Temporal', 'table', ('trend', date_column, value_column))
+
+    elif report_type == 'risk' and value_column:
+        if value_column in df.columns:
+            plan.add('Análise de Risco', 'risk', ('value_stats', value_column))
+            plan.add('Outliers', 'outliers', ('outliers', value_column))
+
+    elif report_type == 'custom' and custom_analysis:
+        plan.add('Análise Customizada', 'custom', text=custom_analysis)
+
+    # Aba 4: Metadados
+    plan.add('Metadados', 'metadata', fields=[
+        ('Título do Relatório', title), ('Tipo de Análise', report_type), ('Arquivo Original', source_name),
+        ('Data de Geração', None), ('Usuário', current_user)
+    ])
+    return plan
+
+
+def compile_template_plan(df: pd.DataFrame, source_name: str, template_data: Dict, title: str,
+                          include_charts: bool, current_user: str) -> ReportPlan:
+    """Plano do relatório Excel de um template pré-configurado (PREDEFINED_TEMPLATES)"""
+    config = template_data['config']
+    analysis_type = config.get('analysis_type')
+    print(f"🎯 Debug - template: '{template_data['name']}', analysis_type: '{analysis_type}', include_charts: {include_charts}")
+    plan = ReportPlan(f"relatorio_template_{template_data['name'].replace(' ', '_')}")
+
+    # Aba 1: Dados Originais
+    plan.add('Dados Originais', 'data')
+
+    # Aba 2: Análise baseada no template
+    if analysis_type == 'geography':
+        value_col = config.get('value_column')
+        region_col = config.get('region_column')
+        if value_col in df.columns and region_col in df.columns:
+            plan.add('Análise Geográfica', 'geography', ('geography', region_col, value_col),
+                     sort=False, chart=include_charts, default_format=None,
+                     number_formats={'Total': 'magnitude', 'Percentual': 'percent'}, widths={1: 25})
+        else:
+            print(f"❌ Colunas não encontradas: {region_col} ou {value_col}")
+
+    elif analysis_type == 'trend':
+        date_col = config.get('date_column')
+        value_col = config.get('value_column')
+        if date_col in df.columns and value_col in df.columns:
+            plan.add('Análise Temporal', 'table', ('trend', date_col, value_col))
+
+    elif analysis_type == 'risk-score':
+        factors = [(factor.get('column'), factor.get('weight', 0)) for factor in config.get('risk_factors', [])
+                   if factor.get('column') in df.columns]
+        if factors:
+            plan.add('Análise de Risco', 'risk_factors', *[('value_stats', col) for col, _ in factors],
+                     weights=[weight for _, weight in factors])
+
+    # Aba 3: Configuração do Template
+    plan.add('Template Info', 'key_values', fields=[
+        ('Nome do Template', template_data['name']), ('Descrição', template_data['description']),
+        ('Tipo de Análise', analysis_type), ('Configuração', str(config))
+    ])
+
+    # Aba 4: Metadados
+    plan.add('Metadados', 'metadata', fields=[
+        ('Título do Relatório', title), ('Template Usado', template_data['name']), ('Arquivo Original', source_name),
+        ('Data de Geração', None), ('Usuário', current_user)
+    ])
+    return plan
+
+
+def _key_values(fields) -> pd.DataFrame:
+    return pd.DataFrame({'Campo': [k for k, _ in fields], 'Valor': [v for _, v in fields]})
+
+
+def _render_data(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, df)
+
+
+def _render_summary(writer, df, inputs, stage, generated_text):
+    summary_stats = inputs[0]
+    writer.write_frame(stage.sheet, summary_stats, index=True)
+    summary_info = pd.DataFrame({
+        'Métrica': ['Total de Registros', 'Total de Colunas', 'Data de Geração'],
+        'Valor': [len(df), len(df.columns), generated_text]
+    })
+    writer.write_frame(stage.sheet, summary_info, startrow=len(summary_stats) + 3)
+
+
+def _render_overview(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, pd.DataFrame({
+        'Análise': ['Tipo de Relatório', 'Total de Registros', 'Colunas Disponíveis'],
+        'Valor': ['Resumo Geral', len(df), ', '.join(map(str, df.columns.tolist()))]
+    }))
+
+
+def _render_geography(writer, df, inputs, stage, generated_text):
+    geo_analysis = inputs[0]
+    formats = dict(number_formats=stage.options['number_formats'], default_format=stage.options['default_format'])
+    if len(geo_analysis) > GEO_SHEET_TOP_N:
+        # Muitos grupos: top-N + "Outros" na aba (e no gráfico), detalhe completo em outra aba
+        region_col = geo_analysis.columns[0]
+        detail = geo_analysis.sort_values('Total', ascending=False)
+        geo_analysis = top_n_with_others(detail.set_index(region_col), 'Total', GEO_SHEET_TOP_N,
+                                         ratios={'Média': ('Total', 'Quantidade')}).reset_index()
+        print(f"📊 {len(detail)} grupos: exibindo {GEO_SHEET_TOP_N} + Outros")
+    else:
+        detail = None
+        if stage.options['sort']:
+            geo_analysis = geo_analysis.sort_values('Total', ascending=False)
+    writer.write_frame(stage.sheet, geo_analysis, **formats)
+    writer.set_widths(stage.sheet, stage.options['widths'])
+    if detail is not None:
+        writer.write_frame(GEO_DETAIL_SHEET, detail, **formats)
+        writer.set_widths(GEO_DETAIL_SHEET, stage.options['widths'])
+    if stage.options['chart']:
+        region_col, value_col = stage.inputs[0][1:]
+        try:
+            writer.add_bar_chart(
+                stage.sheet, len(geo_analysis),
+                title=f"Análise de {value_col} por {region_col}",
+                x_title=region_col, y_title=value_col
+            )
+            print(f"✅ Gráfico adicionado com sucesso na posição G2")
+        except Exception as e:
+            print(f"❌ Erro ao adicionar gráfico: {str(e)}")
+
+
+def _render_table(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, inputs[0])
+
+
+def _render_risk(writer, df, inputs, stage, generated_text):
+    stats = inputs[0]
+    writer.write_frame(stage.sheet, pd.DataFrame({
+        'Métrica': ['Média', 'Desvio Padrão', 'Mínimo', 'Máximo', 'Mediana'],
+        'Valor': [stats['mean'], stats['std'], stats['min'], stats['max'], stats['median']]
+    }))
+
+
+def _render_outliers(writer, df, inputs, stage, generated_text):
+    if len(inputs[0]) > 0:
+        writer.write_frame(stage.sheet, inputs[0])
+
+
+def _render_risk_factors(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, pd.DataFrame([
+        {'Fator': key[1], 'Média': stats['mean'], 'Desvio Padrão': stats['std'], 'Peso': weight}
+        for key, stats, weight in zip(stage.inputs, inputs, stage.options['weights'])
+    ]))
+
+
+def _render_custom(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, pd.DataFrame({
+        'Análise Customizada': [stage.options['text']],
+        'Data de Geração': [generated_text],
+        'Total de Registros': [len(df)]
+    }))
+
+
+def _render_key_values(writer, df, inputs, stage, generated_text):
+    writer.write_frame(stage.sheet, _key_values(stage.options['fields']))
+
+
+def _render_metadata(writer, df, inputs, stage, generated_text):
+    fields = [(k, generated_text if k == 'Data de Geração' else v) for k, v in stage.options['fields']]
+    writer.write_frame(stage.sheet, _key_values(fields))
+
+
+# Renderizadores das etapas: (writer, df, resultados das agregações, etapa, data de geração)
+RENDERERS = {
+    'data': _render_data,
+    'summary': _render_summary,
+    'overview': _render_overview,
+    'geography': _render_geography,
+    'table': _render_table,
+    'risk': _render_risk,
+    'outliers': _render_outliers,
+    'risk_factors': _render_risk_factors,
+    'custom': _render_custom,
+    'key_values': _render_key_values,
+    'metadata': _render_metadata,
+}
+
+
+def execute_report_plan(plan: ReportPlan, df: pd.DataFrame, generated_at: Optional[datetime] = None,
+                        results: Optional[Dict[tuple, Any]] = None) -> bytes:
+    """
+    Executa um plano: calcula as agregações (uma vez cada; results pode ser
+    compartilhado entre planos do mesmo DataFrame) e escreve as planilhas em
+    uma única passada. Retorna o conteúdo do arquivo .xlsx.
+    """
+    results = {} if results is None else results
+    generated_at = generated_at or datetime.now()
+    generated_text = generated_at.strftime('%Y-%m-%d %H:%M:%S')
+
+    for key in plan.aggregations():
+        compute_aggregation(df, key, results)
+
+    output, writer = _new_writer(df, generated_at)
+    for stage in plan.stages:
+        inputs = [results[key] for key in stage.inputs]
+        RENDERERS[stage.render](writer, df, inputs, stage, generated_text)
+
+    writer.close(auto_width_sheets=[stage.sheet for stage in plan.stages if stage.auto_width])
+    print(f"✅ Relatório Excel gerado em uma passada ({len(writer.sheets)} planilhas, "
+          f"{len(plan.aggregations())} agregações)")
+    return output.getvalue()
+
+
+def build_excel_report(df: pd.DataFrame, source_name: str, report_type: str, title: str, include_charts: bool,
+                       include_summary: bool, custom_analysis: Optional[str], value_column: Optional[str],
+                       region_column: Optional[str], date_column: Optional[str], current_user: str,
+                       generated_at: Optional[datetime] = None, results: Optional[Dict[tuple, Any]] = None) -> bytes:
+    """
+    Gera o relatório Excel automático e retorna o conteúdo do arquivo .xlsx.
+    generated_at (padrão: agora) é a data exibida nos metadados do relatório;
+    results são agregações já calculadas (ver prepare_report_batch).
+    """
+    plan = compile_report_plan(df, source_name, report_type, title, include_charts, include_summary,
+                               custom_analysis, value_column, region_column, date_column, current_user)
+    return execute_report_plan(plan, df, generated_at, results)
+
+
+def build_template_report(df: pd.DataFrame, source_name: str, template_data: Dict, title: str,
+                          include_charts: bool, current_user: str, generated_at: Optional[datetime] = None,
+                          results: Optional[Dict[tuple, Any]] = None) -> bytes:
+    """
+    Gera o relatório Excel de um template pré-configurado e retorna o conteúdo do arquivo .xlsx.
+    generated_at (padrão: agora) é a data exibida nos metadados do relatório;
+    results são agregações já calculadas (ver prepare_report_batch).
+    """
+    plan = compile_template_plan(df, source_name, template_data, title, include_charts, current_user)
+    return execute_report_plan(plan, df, generated_at, results)
+
+
+_report_cache: Optional[DiskBlobCache] = None
+
+
+def get_report_cache() -> Optional[DiskBlobCache]:
+    """Cache local de relatórios renderizados (None se desativado)"""
+    global _report_cache
+    if REPORT_CACHE_MAX_BYTES <= 0:
+        return None
+    if _report_cache is None:
+        _report_cache = DiskBlobCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES, suffix=".xlsx")
+    return _report_cache
+
+
+def report_cache_key(source_hash: str, **options: Any) -> str:
+    """
+    Chave de um relatório renderizado: hash dos dados de entrada mais todas as
+    opções que alteram o arquivo (tipo/template, colunas, gráficos, título...).
+    """
+    payload = json.dumps(
+        {'version': REPORT_CACHE_VERSION, 'source': source_hash, 'options': options},
+        sort_keys=True, default=str
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+def open_cached_report(cache_key: str) -> Optional[BinaryIO]:
+    """Arquivo aberto com o relatório já renderizado para a chave (None se não estiver no cache)"""
+    cache = get_report_cache()
+    if cache is None:
+        return None
+    cached = cache.open(cache_key)
+    if cached is not None:
+        print(f"♻️ Relatório reaproveitado do cache ({cache_key[:12]})")
+    return cached
+
+
+def store_report(cache_key: str, content: bytes) -> None:
+    """Guarda um relatório renderizado no cache (falhas de disco não interrompem a geração)"""
+    cache = get_report_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(cache_key, content)
+    except OSError as e:
+        print(f"⚠️ Não foi possível guardar o relatório no cache: {str(e)}")
+
+
+# Geradores disponíveis para render_report (mesmos parâmetros, sem o DataFrame)
+REPORT_BUILDERS = {
+    'excel': build_excel_report,
+    'template': build_template_report,
+}
+
+# Compiladores de plano correspondentes, usados no preparo de lotes
+REPORT_COMPILERS = {
+    'excel': compile_report_plan,
+    'template': compile_template_plan,
+}
+
+
+def render_report(source: Dict[str, Any], cache_key: str, kind: str, options: Dict[str, Any],
+                  results: Optional[Dict[tuple, Any]] = None) -> bytes:
+    """
+    Carrega os dados da origem, gera o relatório (kind: 'excel' ou 'template')
+    e o guarda no cache. Roda dentro de um processo do pool, por isso recebe a
+    origem dos dados e não o DataFrame.
+    """
+    from app.services.dataset_service import load_frame_source
+
+    content = REPORT_BUILDERS[kind](load_frame_source(source), **options, results=results)
+    store_report(cache_key, content)
+    return content
+
+
+def prepare_report_batch(source: Dict[str, Any], jobs: List[tuple]):
+    """
+    Preparo de um lote de relatórios do mesmo conjunto de dados: carrega os
+    dados uma vez e calcula a união das agregações de todos os planos
+    (jobs: lista de (kind, options), como em render_report).
+
+    Retorna (DataFrame, agregações). O DataFrame só é devolvido para arquivos
+    enviados (None para datasets armazenados, que cada processo lê do cache
+    local), para que a renderização paralela não precise fazer o parse de novo.
+    """
+    from app.services.dataset_service import load_frame_source
+
+    df = load_frame_source(source)
+    results: Dict[tuple, Any] = {}
+    for kind, options in jobs:
+        plan = REPORT_COMPILERS[kind](df, **options)
+        for key in plan.aggregations():
+            compute_aggregation(df, key, results)
+    print(f"🧩 Lote preparado: {len(jobs)} relatórios, {len(results)} agregações distintas")
+    return (df if source['kind'] == 'upload' else None), results
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+from app.utils.cache import MemoryLRUCache
+
+# Granularidades derivadas da base diária (W = semana terminando no domingo)
+TIMESERIES_FREQS = {'D': 'D', 'W': 'W', 'M': 'M', 'Q': 'Q', 'Y': 'Y', 'A': 'Y'}
+
+# Agregações suportadas: sum/mean/count/min/max sobre a coluna de valor,
+# size = quantidade de linhas (não exige coluna de valor)
+TIMESERIES_AGGS = ('sum', 'mean', 'count', 'min', 'max', 'size')
+
+# Preenchimento dos períodos sem dados: None mantém só os períodos com dados
+TIMESERIES_FILLS = (None, 'zero', 'nan')
+
+# Bases diárias já calculadas, por (versão dos dados, coluna de data, coluna de valor)
+TIMESERIES_CACHE_MAX_BYTES = int(os.getenv("TIMESERIES_CACHE_MAX_MB", "64")) * 1024 * 1024
+timeseries_cache = MemoryLRUCache(TIMESERIES_CACHE_MAX_BYTES)
+
+
+def daily_base(df: pd.DataFrame, date_col: str, value_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    Agregado diário (PeriodIndex 'D') com colunas aditivas/combináveis: rows
+    (linhas), count (valores não nulos), sum, min e max. É a base de todas as
+    granularidades: semana, mês, trimestre e ano saem dela sem reler as linhas.
+    Linhas com data inválida são ignoradas.
+    """
+    if date_col not in df.columns:
+        raise ValueError("Coluna de data não encontrada")
+    if value_col is not None and value_col not in df.columns:
+        raise ValueError("Coluna de valor não encontrada")
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    valid = dates.notna()
+    days = dates[valid].dt.to_period('D')
+    if value_col is None:
+        base = days.groupby(days).size().to_frame('rows')
+        for column in ('count', 'sum', 'min', 'max'):
+            base[column] = np.nan
+    else:
+        values = df.loc[valid, value_col]
+        if not pd.api.types.is_numeric_dtype(values):
+            raise ValueError("Coluna de valor deve ser numérica")
+        base = values.groupby(days).agg(['size', 'count', 'sum', 'min', 'max']).rename(columns={'size': 'rows'})
+    base.index.name = 'day'
+    return base.sort_index()
+
+
+def rebucket(base: pd.DataFrame, freq: str = 'M', agg: str = 'sum', fill: Optional[str] = None) -> pd.Series:
+    """
+    Série na granularidade freq (D/W/M/Q/Y) a partir da base diária.
+    fill: None (só períodos com dados), 'zero' ou 'nan' (todos os períodos do intervalo).
+    """
+    if freq not in TIMESERIES_FREQS:
+        raise ValueError(f"Frequência não suportada: {freq} (use D, W, M, Q ou Y)")
+    if agg not in TIMESERIES_AGGS:
+        raise ValueError(f"Agregação não suportada: {agg}")
+    if fill not in TIMESERIES_FILLS:
+        raise ValueError("Preenchimento não suportado (use 'zero' ou 'nan')")
+    if agg != 'size' and base['count'].isna().all() and len(base):
+        raise ValueError("Informe a coluna de valor para esta agregação")
+
+    periods = base.index.asfreq(TIMESERIES_FREQS[freq]) if freq != 'D' else base.index
+    grouped = base.groupby(periods).agg({'rows': 'sum', 'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+    if agg == 'size':
+        series = grouped['rows']
+        present = grouped['rows'] > 0
+    else:
+        series = grouped['sum'] / grouped['count'] if agg == 'mean' else grouped[agg]
+        # Como no groupby direto: só contam períodos com algum valor não nulo
+        present = grouped['count'] > 0
+    series = series[present]
+
+    if fill is not None and len(series):
+        full = pd.period_range(series.index.min(), series.index.max(), freq=series.index.freq)
+        series = series.reindex(full)
+        if fill == 'zero':
+            series = series.fillna(0)
+    return series
+
+
+def timeseries_key(source_key: str, date_col: str, value_col: Optional[str]) -> tuple:
+    """Chave da base diária: versão dos dados + colunas (a agregação é aplicada depois)"""
+    return (source_key, date_col, value_col)
+
+
+def trend_from_base(base: pd.DataFrame, freq: str = 'M', agg: str = 'sum', fill: Optional[str] = None) -> Dict[str, Any]:
+    """Resposta de tendência: valor por período e média móvel de 3 períodos"""
+    series = rebucket(base, freq, agg, fill)
+    return {
+        "periods": series.index.astype(str).tolist(),
+        "values": series.tolist(),
+        "trend": series.rolling(window=3, min_periods=1).mean().tolist(),
+        "freq": freq,
+        "agg": agg,
+        "fill": fill
+    }
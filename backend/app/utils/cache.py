@@ -0,0 +1,249 @@
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Hashable, Optional
+
+import pyarrow as pa
+
+# Variável definida nos processos do pool de relatórios (ver process_pool._worker_main)
+POOL_WORKER_ENV = "REPORT_POOL_WORKER"
+
+
+def cache_max_bytes(env_name: str, default_mb: int, worker_default_mb: int) -> int:
+    """
+    Limite de um cache em memória, em bytes. Cada processo do pool de relatórios
+    tem os próprios caches: neles vale WORKER_<env_name> (padrão menor), para que
+    a memória total não se multiplique por REPORT_POOL_WORKERS.
+    """
+    if os.getenv(POOL_WORKER_ENV):
+        return int(os.getenv(f"WORKER_{env_name}", str(worker_default_mb))) * 1024 * 1024
+    return int(os.getenv(env_name, str(default_mb))) * 1024 * 1024
+
+
+class MemoryLRUCache:
+    """
+    Cache LRU em memória limitado pelo total de bytes das entradas.
+
+    O tamanho de cada entrada é informado por quem insere (ex.: memória de um
+    DataFrame). Ao ultrapassar max_bytes, as entradas menos usadas são removidas.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> bool:
+        """Insere a entrada; retorna False se ela sozinha excede o limite do cache"""
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return True
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class _DiskCache:
+    """
+    Base dos caches em arquivos locais limitados pelo total de bytes: ao
+    ultrapassar max_bytes, os arquivos acessados há mais tempo são removidos
+    (o mtime é atualizado a cada leitura e usado como "último uso").
+    """
+
+    SUFFIX = ""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def _digest(value: Any) -> str:
+        return hashlib.blake2b(str(value).encode(), digest_size=10).hexdigest()
+
+    def _files(self):
+        return glob.glob(os.path.join(self.root, f"*{self.SUFFIX}"))
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write_atomic(self, path: str, write) -> None:
+        """Grava em um arquivo temporário e troca de forma atômica: outros workers nunca leem um arquivo pela metade"""
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as sink:
+                write(sink)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._unlink(tmp_path)
+            raise
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        entries = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            # Quem já abriu ou mapeou o arquivo continua lendo normalmente
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = []
+        for path in self._files():
+            try:
+                sizes.append(os.path.getsize(path))
+            except FileNotFoundError:
+                continue
+        return {"entries": len(sizes), "bytes": sum(sizes), "max_bytes": self.max_bytes}
+
+
+class DiskArrowCache(_DiskCache):
+    """
+    Cache de tabelas Arrow em disco (formato IPC/Feather sem compressão),
+    compartilhado entre os workers da mesma máquina.
+
+    As leituras usam memory map: todos os processos compartilham a mesma cópia
+    no page cache do sistema. Cada entrada é identificada por (chave, versão);
+    gravar uma versão nova remove as antigas. Ao ultrapassar max_bytes, os
+    arquivos acessados há mais tempo são removidos.
+    """
+
+    SUFFIX = ".arrow"
+
+    def _path(self, key: str, version: Any) -> str:
+        return os.path.join(self.root, f"{self._digest(key)}-{self._digest(version)}{self.SUFFIX}")
+
+    def _versions(self, key: str):
+        return glob.glob(os.path.join(self.root, f"{self._digest(key)}-*{self.SUFFIX}"))
+
+    def get(self, key: str, version: Any) -> Optional[pa.Table]:
+        path = self._path(key, version)
+        try:
+            source = pa.memory_map(path, "r")
+        except FileNotFoundError:
+            return None
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except (pa.ArrowInvalid, OSError):
+            # Arquivo corrompido (ex.: disco cheio durante a gravação)
+            self._unlink(path)
+            return None
+        self._touch(path)
+        return table
+
+    def put(self, key: str, version: Any, table: pa.Table) -> None:
+        path = self._path(key, version)
+
+        def write(sink):
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        self._write_atomic(path, write)
+        for old in self._versions(key):
+            if old != path:
+                self._unlink(old)
+        self._evict(keep=path)
+
+    def delete(self, key: str) -> None:
+        for path in self._versions(key):
+            self._unlink(path)
+
+
+class DiskBlobCache(_DiskCache):
+    """
+    Cache de arquivos prontos (ex.: relatórios .xlsx renderizados) em disco,
+    compartilhado entre os workers. A chave já deve identificar o conteúdo por
+    completo (hash dos dados de entrada + opções).
+    """
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = ".bin"):
+        self.SUFFIX = suffix
+        super().__init__(root, max_bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{self._digest(key)}{self.SUFFIX}")
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Abre o arquivo da chave para leitura (None se não estiver no cache)"""
+        path = self._path(key)
+        try:
+            handle = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return handle
+
+    def put(self, key: str, content: bytes) -> bool:
+        """Guarda o conteúdo; retorna False se ele sozinho excede o limite do cache"""
+        if len(content) > self.max_bytes:
+            return False
+        path = self._path(key)
+        self._write_atomic(path, lambda sink: sink.write(content))
+        self._evict(keep=path)
+        return True
+
+    def delete(self, key: str) -> None:
+        self._unlink(self._path(key))
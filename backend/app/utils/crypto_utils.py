@@ -1,5 +1,12 @@
+import io
 import os
+import base64
+import struct
+from typing import BinaryIO, Iterator, Optional
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from dotenv import load_dotenv
 
 # Carrega variáveis do .env
@@ -22,4 +29,217 @@ def encrypt_file_bytes(file_bytes: bytes) -> bytes:
 
 def decrypt_file_bytes(token: bytes) -> bytes:
     """Descriptografa bytes de arquivo criptografado."""
-    return fernet.decrypt(token) 
\ No newline at end of file
+    return fernet.decrypt(token)
+
+# ---------------------------------------------------------------------------
+# Contêiner criptografado em blocos (arquivos grandes)
+#
+# Formato:
+#   cabeçalho: MAGIC (4) | versão (1) | tamanho do bloco (4, big-endian) | prefixo do nonce (8)
+#   blocos:    AES-256-GCM(bloco de texto) + tag (16), todos com o mesmo tamanho exceto o último
+#
+# O nonce de cada bloco é prefixo + índice do bloco, e o AAD inclui o cabeçalho,
+# o índice e um marcador de último bloco, o que impede reordenar ou truncar blocos.
+# Como os blocos têm tamanho fixo, qualquer faixa pode ser decifrada isoladamente.
+# ---------------------------------------------------------------------------
+
+CONTAINER_MAGIC = b"ARC1"
+CONTAINER_VERSION = 1
+CONTAINER_CHUNK_SIZE = 64 * 1024  # 64KB de texto por bloco
+_HEADER = struct.Struct(">4sBI8s")
+_TAG_SIZE = 16
+
+# Chave AES derivada da ENCRYPTION_KEY, separada da chave usada pelo Fernet
+_container_key = HKDF(
+    algorithm=hashes.SHA256(),
+    length=32,
+    salt=None,
+    info=b"autoreport-encrypted-container-v1",
+).derive(base64.urlsafe_b64decode(FERNET_KEY))
+_aesgcm = AESGCM(_container_key)
+
+
+def _chunk_nonce(prefix: bytes, index: int) -> bytes:
+    return prefix + struct.pack(">I", index)
+
+
+def _chunk_aad(header: bytes, index: int, final: bool) -> bytes:
+    return header + struct.pack(">I?", index, final)
+
+
+class EncryptedChunkWriter:
+    """
+    Escreve um contêiner criptografado em blocos em um arquivo já aberto.
+    Uso: chamar write() quantas vezes for preciso e close() ao final.
+    """
+
+    def __init__(self, fileobj: BinaryIO, chunk_size: int = CONTAINER_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.nonce_prefix = os.urandom(8)
+        self.header = _HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, chunk_size, self.nonce_prefix)
+        self.index = 0
+        self.buffer = bytearray()
+        self.closed = False
+        self.fileobj.write(self.header)
+
+    def _emit(self, data: bytes, final: bool) -> None:
+        nonce = _chunk_nonce(self.nonce_prefix, self.index)
+        self.fileobj.write(_aesgcm.encrypt(nonce, data, _chunk_aad(self.header, self.index, final)))
+        self.index += 1
+
+    def write(self, data: bytes) -> None:
+        self.buffer.extend(data)
+        # Mantém sempre ao menos um bloco pendente: só no close() sabemos qual é o último
+        while len(self.buffer) > self.chunk_size:
+            self._emit(bytes(self.buffer[:self.chunk_size]), final=False)
+            del self.buffer[:self.chunk_size]
+
+    def close(self) -> None:
+        if not self.closed:
+            self._emit(bytes(self.buffer), final=True)
+            self.buffer.clear()
+            self.closed = True
+
+
+def _read_header(fileobj: BinaryIO):
+    fileobj.seek(0)
+    header = fileobj.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise ValueError("Contêiner criptografado inválido")
+    magic, version, chunk_size, nonce_prefix = _HEADER.unpack(header)
+    if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+        raise ValueError("Contêiner criptografado inválido ou de versão não suportada")
+    fileobj.seek(0, os.SEEK_END)
+    body_size = fileobj.tell() - _HEADER.size
+    stored_chunk = chunk_size + _TAG_SIZE
+    chunk_count = max(1, -(-body_size // stored_chunk))
+    return header, chunk_size, nonce_prefix, chunk_count
+
+
+def iter_decrypted_chunks(fileobj: BinaryIO, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Decifra os blocos [start, stop) de um contêiner criptografado, lendo do disco
+    apenas os blocos pedidos. Sem stop, decifra até o final do arquivo.
+    """
+    header, chunk_size, nonce_prefix, chunk_count = _read_header(fileobj)
+    stop = chunk_count if stop is None else min(stop, chunk_count)
+    stored_chunk = chunk_size + _TAG_SIZE
+    fileobj.seek(_HEADER.size + start * stored_chunk)
+    for index in range(start, stop):
+        ciphertext = fileobj.read(stored_chunk)
+        yield _decrypt_chunk(header, nonce_prefix, index, index == chunk_count - 1, ciphertext)
+
+
+def _decrypt_chunk(header: bytes, nonce_prefix: bytes, index: int, final: bool, ciphertext: bytes) -> bytes:
+    return _aesgcm.decrypt(_chunk_nonce(nonce_prefix, index), ciphertext, _chunk_aad(header, index, final))
+
+
+def decrypt_byte_range(fileobj: BinaryIO, offset: int, length: int) -> bytes:
+    """Decifra apenas os bytes [offset, offset + length) do texto original"""
+    _, chunk_size, _, _ = _read_header(fileobj)
+    if length <= 0:
+        return b""
+    first = offset // chunk_size
+    last = (offset + length - 1) // chunk_size
+    data = b"".join(iter_decrypted_chunks(fileobj, first, last + 1))
+    start = offset - first * chunk_size
+    return data[start:start + length]
+
+
+def is_encrypted_container(fileobj: BinaryIO) -> bool:
+    """True se o arquivo começa com o cabeçalho do contêiner criptografado"""
+    fileobj.seek(0)
+    is_container = fileobj.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+    fileobj.seek(0)
+    return is_container
+
+
+def encrypt_file(src_path: str, fileobj: BinaryIO, chunk_size: int = CONTAINER_CHUNK_SIZE) -> None:
+    """Criptografa o arquivo src_path no contêiner em blocos, escrevendo em fileobj"""
+    writer = EncryptedChunkWriter(fileobj, chunk_size)
+    with open(src_path, "rb") as src:
+        while True:
+            block = src.read(chunk_size * 16)
+            if not block:
+                break
+            writer.write(block)
+    writer.close()
+
+
+class EncryptedChunkReader(io.RawIOBase):
+    """
+    Visão somente leitura, com seek, do texto original de um contêiner criptografado.
+    Cada leitura decifra apenas os blocos que cobre, então leitores com acesso
+    aleatório (ex.: pyarrow lendo o rodapé e algumas colunas de um Parquet) não
+    decifram o arquivo inteiro. O último bloco decifrado fica guardado para leituras
+    pequenas e sequenciais.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        super().__init__()
+        self.fileobj = fileobj
+        self.header, self.chunk_size, self.nonce_prefix, self.chunk_count = _read_header(fileobj)
+        body_size = fileobj.tell() - _HEADER.size
+        self.size = max(0, body_size - self.chunk_count * _TAG_SIZE)
+        self.position = 0
+        self._cached_index = -1
+        self._cached_chunk = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self.position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if position < 0:
+            raise ValueError("Posição negativa")
+        self.position = position
+        return position
+
+    def _chunk(self, index: int) -> bytes:
+        if index != self._cached_index:
+            stored_chunk = self.chunk_size + _TAG_SIZE
+            self.fileobj.seek(_HEADER.size + index * stored_chunk)
+            ciphertext = self.fileobj.read(stored_chunk)
+            final = index == self.chunk_count - 1
+            self._cached_chunk = _decrypt_chunk(self.header, self.nonce_prefix, index, final, ciphertext)
+            self._cached_index = index
+        return self._cached_chunk
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if end <= self.position:
+            return b""
+        first = self.position // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        data = b"".join(self._chunk(index) for index in range(first, last + 1))
+        start = self.position - first * self.chunk_size
+        data = data[start:start + end - self.position]
+        self.position = end
+        return data
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.fileobj.close()
+        super().close()
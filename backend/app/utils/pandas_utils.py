@@ -1 +1,235 @@
- 
\ No newline at end of file
+import decimal
+import orjson
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Tuple
+from fastapi.responses import JSONResponse
+
+# Opções do orjson: tipos numpy nativos e chaves não-texto (ex.: value_counts().to_dict())
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Conversão dos tipos que o orjson não serializa nativamente"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (pd.Period, pd.Timedelta, pd.Interval, decimal.Decimal)):
+        return str(obj)
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+def _stringify_keys(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {
+            (k if isinstance(k, (str, int, float, bool)) or k is None else str(k)): _stringify_keys(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [_stringify_keys(v) for v in obj]
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializa para JSON (bytes) em uma única passada com orjson.
+    NaN/NaT viram null; Timestamp, tipos numpy e Period são convertidos.
+    """
+    try:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    except TypeError:
+        # Chaves de dicionário de tipos exóticos (ex.: Period de um groupby)
+        return orjson.dumps(_stringify_keys(obj), default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Resposta JSON serializada com dumps(). Deve ser retornada diretamente pelas
+    rotas, o que evita a passada extra do jsonable_encoder do FastAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _datetime_column(series: pd.Series) -> np.ndarray:
+    """Datas em ISO 8601 (mesmo texto de Timestamp.isoformat), nulos como None"""
+    if getattr(series.dt, 'tz', None) is not None:
+        return series.map(lambda v: None if v is pd.NaT else v.isoformat()).to_numpy(dtype=object)
+    values = series.to_numpy(dtype='datetime64[ns]')
+    nulls = np.isnat(values)
+    has_fraction = ((values[~nulls].astype('int64') % 1_000_000_000) != 0).any()
+    text = np.datetime_as_string(values, unit='us' if has_fraction else 's').astype(object)
+    text[nulls] = None
+    return text
+
+
+def json_safe_column(series: pd.Series) -> List[Any]:
+    """
+    Converte uma coluna inteira para valores nativos do JSON de uma só vez
+    (datas em ISO, NaN/NaT/NA como None, escalares numpy como tipos Python).
+    """
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return _datetime_column(series).tolist()
+    if isinstance(dtype, np.dtype) and (pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype)):
+        return series.tolist()
+    if isinstance(dtype, np.dtype) and pd.api.types.is_float_dtype(dtype):
+        values = series.to_numpy(dtype=object)
+        values[np.isnan(series.to_numpy())] = None
+        return values.tolist()
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        values = series.astype(str).to_numpy(dtype=object)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    # object / categóricas / tipos de extensão (Int64, boolean, string): só os nulos precisam de tratamento
+    values = series.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    return values.tolist()
+
+
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Converte um DataFrame em registros JSON-safe, coluna a coluna"""
+    names = [str(c) for c in df.columns]
+    columns = [json_safe_column(df.iloc[:, i]) for i in range(df.shape[1])]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def dumps_records(df: pd.DataFrame) -> bytes:
+    """Serializa um DataFrame como lista de registros JSON em uma única passada"""
+    return dumps(dataframe_to_records(df))
+
+
+def frame_memory_usage(df: pd.DataFrame) -> int:
+    """Memória ocupada pelo DataFrame em bytes (incluindo o conteúdo das strings)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# Colunas de texto com até esta fração de valores distintos viram categóricas
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _compact_column(series: pd.Series) -> pd.Series:
+    """Menor dtype equivalente para uma coluna (sem perda de valores)"""
+    dtype = series.dtype
+    non_null = series.dropna()
+    if dtype == object:
+        if non_null.empty:
+            return series
+        kinds = set(map(type, non_null))
+        if kinds <= {bool, np.bool_}:
+            return series.astype('boolean')
+        if kinds == {str} and non_null.nunique() <= len(series) * CATEGORY_MAX_UNIQUE_RATIO:
+            return series.astype('category')
+        return series
+    if pd.api.types.is_bool_dtype(dtype):
+        return series
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+        values = non_null.to_numpy()
+        if 0 < len(values) < len(series) and np.all(np.mod(values, 1) == 0) and np.all(np.abs(values) < 2 ** 53):
+            # Inteiros que vieram como float por causa dos nulos (comum no JSON);
+            # sem nulos a coluna continua float, para voltar como float64
+            compact = pd.to_numeric(non_null.astype('int64'), downcast='integer')
+            return series.astype(compact.dtype.name.capitalize())
+        as_float32 = series.astype('float32')
+        if np.array_equal(as_float32.to_numpy(dtype='float64'), series.to_numpy(), equal_nan=True):
+            return as_float32
+    return series
+
+
+def compact_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Reduz a memória de um DataFrame: texto repetido vira categórico, inteiros e
+    floats são reduzidos ao menor tipo sem perda, e colunas de inteiros ou
+    booleanos com nulos usam os tipos anuláveis (Int*, boolean).
+
+    Retorna o DataFrame compactado e um relatório de bytes economizados por coluna.
+    """
+    compacted = df.copy(deep=False)
+    columns = {}
+    for i in range(df.shape[1]):
+        before = df.iloc[:, i]
+        after = _compact_column(before)
+        if after is not before:
+            compacted.isetitem(i, after)
+        bytes_before = int(before.memory_usage(index=False, deep=True))
+        bytes_after = int(after.memory_usage(index=False, deep=True))
+        columns[str(df.columns[i])] = {
+            'dtype_before': str(before.dtype),
+            'dtype_after': str(after.dtype),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after
+        }
+    total_before = sum(c['bytes_before'] for c in columns.values())
+    total_after = sum(c['bytes_after'] for c in columns.values())
+    report = {
+        'columns': columns,
+        'bytes_before': total_before,
+        'bytes_after': total_after,
+        'bytes_saved': total_before - total_after,
+        'ratio': round(total_before / total_after, 2) if total_after else None
+    }
+    return compacted, report
+
+
+def restore_dtypes(df: pd.DataFrame, keep_categories: bool = True) -> pd.DataFrame:
+    """
+    Cópia de um DataFrame compactado com os tipos usuais do pandas (int64,
+    float64, bool/object), para que os cálculos não mudem de precisão.
+    Com keep_categories=False, as colunas categóricas voltam a ser texto (object),
+    o que permite gravar valores novos nelas.
+    """
+    restored = df.copy()
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            if not keep_categories:
+                restored.isetitem(i, series.astype(object))
+        elif isinstance(dtype, pd.BooleanDtype):
+            restored.isetitem(i, series.astype(object).where(series.notna(), None) if series.hasnans else series.astype(bool))
+        elif pd.api.types.is_integer_dtype(dtype):
+            if isinstance(dtype, np.dtype):
+                if dtype != np.int64:
+                    restored.isetitem(i, series.astype('int64'))
+            else:
+                restored.isetitem(i, series.astype('float64') if series.hasnans else series.astype('int64'))
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float64:
+            restored.isetitem(i, series.astype('float64'))
+    return restored
+
+
+# Rótulo da linha que agrupa os itens fora do top-N
+OTHERS_LABEL = "Outros"
+
+
+def top_n_with_others(grouped: pd.DataFrame, by: str, n: int, ratios: Dict[str, Tuple[str, str]] = None,
+                      label: str = OTHERS_LABEL) -> pd.DataFrame:
+    """
+    Mantém as n linhas de maior valor em `by` (nlargest, sem ordenar tudo) e
+    resume as demais em uma única linha `label`, somando as colunas numéricas.
+    Colunas não aditivas são recalculadas a partir das somas via ratios
+    (ex.: {'mean': ('sum', 'count')}). Sem excedente, retorna só o top-N.
+    Um grupo real chamado `label` não entra no top-N: é somado à linha `label`,
+    para o índice não ficar com o rótulo repetido.
+    """
+    top = grouped.drop(index=label, errors='ignore').nlargest(n, by)
+    rest = grouped[~grouped.index.isin(top.index)]
+    if rest.empty:
+        return top
+    others = rest.sum(numeric_only=True)
+    for column, (numerator, denominator) in (ratios or {}).items():
+        others[column] = others[numerator] / others[denominator] if others[denominator] else np.nan
+    others_row = others.to_frame(label).T
+    others_row.index.name = grouped.index.name
+    return pd.concat([top, others_row.astype(top.dtypes.to_dict(), errors='ignore')])
@@ -0,0 +1,257 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.cache import POOL_WORKER_ENV
+
+# Intervalo entre verificações de desconexão do cliente enquanto a tarefa roda
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class PoolBusyError(RuntimeError):
+    """Fila do pool cheia: a tarefa não foi aceita."""
+
+
+class JobTimeoutError(TimeoutError):
+    """A tarefa excedeu o tempo limite e o processo que a executava foi encerrado."""
+
+
+class JobCancelledError(RuntimeError):
+    """A tarefa foi cancelada (ex.: o cliente desconectou) e o processo foi encerrado."""
+
+
+class WorkerCrashedError(RuntimeError):
+    """O processo que executava a tarefa terminou de forma inesperada."""
+
+
+def _worker_main(conn) -> None:
+    """Laço do processo do pool: recebe (função, args, kwargs) e devolve (ok, resultado)"""
+    # Antes de importar os módulos das tarefas: os caches deles usam os limites dos workers
+    os.environ[POOL_WORKER_ENV] = "1"
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        fn, args, kwargs = message
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Resultado ou exceção que não pode ser serializado
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {str(e)}")))
+
+
+def _retrieve_exception(task: "asyncio.Future") -> None:
+    # Tarefas abandonadas (tempo limite, desconexão) terminam com erro sem ninguém aguardando
+    if not task.cancelled():
+        task.exception()
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        # Sem a cópia do pai, a leitura recebe EOF quando o processo morre
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class _Job:
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.worker: Optional[_Worker] = None
+        self.lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """Cancela a tarefa; se já estiver rodando, encerra o processo que a executa"""
+        with self.lock:
+            self.cancelled.set()
+            # Sob o lock: o processo só é encerrado enquanto ainda pertence a esta tarefa
+            # (ao terminar, _execute o desassocia antes de devolvê-lo ao pool)
+            if self.worker is not None and self.worker.process.is_alive():
+                self.worker.process.terminate()
+
+
+class WorkerPool:
+    """
+    Pool de processos para trabalho pesado de CPU (pandas, geração de Excel),
+    mantendo o event loop livre para as demais requisições.
+
+    - Fila limitada: com workers + max_queue tarefas em andamento, novas
+      tarefas são recusadas com PoolBusyError.
+    - Tempo limite por tarefa: ao estourar, o processo é encerrado e
+      substituído (JobTimeoutError).
+    - Cancelamento: se o cliente desconectar, o processo é encerrado e
+      substituído (JobCancelledError).
+
+    Com workers=0 as tarefas rodam no threadpool do próprio processo (sem
+    isolamento, tempo limite ou cancelamento), útil em desenvolvimento.
+    As funções executadas precisam ser de nível de módulo e os argumentos e
+    resultados serializáveis (pickle).
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float, start_method: str = "spawn"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._started = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise PoolBusyError("Servidor ocupado gerando outros relatórios. Tente novamente em instantes.")
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _checkout(self, job: _Job) -> Optional[_Worker]:
+        """Pega um processo livre (criando-o sob demanda); None se a tarefa for cancelada na fila"""
+        while not job.cancelled.is_set():
+            with self._lock:
+                if self._idle.empty() and self._started < self.workers:
+                    self._started += 1
+                    spawn = True
+                else:
+                    spawn = False
+            if spawn:
+                try:
+                    return _Worker(self._context)
+                except Exception:
+                    with self._lock:
+                        self._started -= 1
+                    raise
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._lock:
+            self._started -= 1
+
+    def _execute(self, job: _Job, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        """Executa a tarefa em um processo do pool (roda em uma thread, bloqueando só ela)"""
+        worker = self._checkout(job)
+        if worker is None:
+            raise JobCancelledError("Tarefa cancelada antes de iniciar")
+        with job.lock:
+            cancelled = job.cancelled.is_set()
+            if not cancelled:
+                job.worker = worker
+        if cancelled:
+            self._idle.put(worker)
+            raise JobCancelledError("Tarefa cancelada antes de iniciar")
+        try:
+            worker.conn.send((fn, args, kwargs))
+            ok, value = worker.conn.recv()
+        except (EOFError, OSError):
+            with job.lock:
+                job.worker = None
+            self._discard(worker)
+            if job.cancelled.is_set():
+                raise JobCancelledError("Tarefa cancelada durante a execução")
+            raise WorkerCrashedError("O processo que executava a tarefa terminou inesperadamente")
+        # Desassocia o processo antes de devolvê-lo: um cancelamento tardio
+        # não pode encerrá-lo enquanto ele executa a tarefa de outra pessoa
+        with job.lock:
+            job.worker = None
+            cancelled = job.cancelled.is_set()
+        if cancelled:
+            # O cancelamento chegou junto com o resultado e pode ter encerrado o processo
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None,
+                  request=None, **kwargs: Any) -> Any:
+        """
+        Executa fn(*args, **kwargs) em um processo do pool e aguarda o resultado.
+        Se request (Request do Starlette) for informado, a tarefa é cancelada
+        quando o cliente desconectar.
+        """
+        if self.workers <= 0:
+            return await run_in_threadpool(fn, *args, **kwargs)
+
+        self._reserve()
+        job = _Job()
+        try:
+            task = asyncio.ensure_future(run_in_threadpool(self._execute, job, fn, args, kwargs))
+            task.add_done_callback(_retrieve_exception)
+            deadline = time.monotonic() + (timeout or self.timeout)
+            while True:
+                remaining = deadline - time.monotonic()
+                done, _ = await asyncio.wait({task}, timeout=max(0.0, min(DISCONNECT_POLL_SECONDS, remaining)))
+                if done:
+                    return task.result()
+                if remaining <= 0:
+                    job.cancel()
+                    print(f"⏱️ Tarefa {getattr(fn, '__name__', fn)} excedeu {timeout or self.timeout}s e foi encerrada")
+                    raise JobTimeoutError("A geração excedeu o tempo limite")
+                if request is not None and await request.is_disconnected():
+                    job.cancel()
+                    print(f"🛑 Cliente desconectou; tarefa {getattr(fn, '__name__', fn)} cancelada")
+                    raise JobCancelledError("Cliente desconectou")
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+        finally:
+            self._release()
+
+    def shutdown(self) -> None:
+        """Encerra os processos ociosos (chamado no desligamento da aplicação)"""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            self._discard(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "started": self._started,
+                "pending": self._pending,
+                "max_queue": self.max_queue
+            }
+
+
+# Pool compartilhado pelas rotas de relatórios e análises
+REPORT_POOL_WORKERS = int(os.getenv("REPORT_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPORT_POOL_MAX_QUEUE = int(os.getenv("REPORT_POOL_MAX_QUEUE", "16"))
+REPORT_JOB_TIMEOUT_SECONDS = float(os.getenv("REPORT_JOB_TIMEOUT_SECONDS", "120"))
+
+report_pool = WorkerPool(REPORT_POOL_WORKERS, REPORT_POOL_MAX_QUEUE, REPORT_JOB_TIMEOUT_SECONDS)
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Tamanho do compactador do topo: erro de posto típico abaixo de ~1% com ~3*k valores guardados
+QUANTILE_SKETCH_K = 256
+
+# Menor capacidade de um nível (os níveis de baixo encolhem em progressão geométrica)
+_MIN_LEVEL_CAPACITY = 8
+_LEVEL_DECAY = 2 / 3
+
+
+class QuantileSketch:
+    """
+    Sketch de quantis no estilo KLL: resumo de tamanho fixo de uma coluna numérica.
+
+    Cada nível guarda valores com peso 2**nível. Quando um nível enche, ele é
+    ordenado e metade dos valores (posições pares ou ímpares, ao acaso) sobe para
+    o nível seguinte com o dobro do peso. Sketches de blocos diferentes podem ser
+    combinados (merge) sem perder a garantia de erro, então o sketch do dataset
+    é montado bloco a bloco na ingestão. Enquanto nada foi compactado os quantis
+    são exatos (mesma interpolação do pandas).
+    """
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(_MIN_LEVEL_CAPACITY, int(np.ceil(self.k * _LEVEL_DECAY ** depth)))
+
+    def _compress(self) -> None:
+        while True:
+            full = [h for h, items in enumerate(self.levels) if len(items) > self._capacity(h)]
+            if not full:
+                return
+            level = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # Com quantidade ímpar, o menor valor fica no nível para preservar o peso total
+            keep = len(items) % 2
+            promoted = items[keep + int(self._rng.integers(2))::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = items[:keep]
+
+    def update(self, values: Iterable[float]) -> "QuantileSketch":
+        """Acrescenta valores (nulos e infinitos são ignorados)"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return self
+        self.n += values.size
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Combina outro sketch neste (ex.: sketches de blocos diferentes do mesmo dataset)"""
+        if not other.n:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+        self._compress()
+        return self
+
+    @property
+    def exact(self) -> bool:
+        """True enquanto todos os valores estão guardados (nenhuma compactação)"""
+        return len(self.levels) == 1
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """Quantis aproximados (exatos enquanto não houve compactação); NaN sem valores"""
+        qs = np.asarray(list(qs), dtype=float)
+        if not self.n:
+            return [np.nan] * len(qs)
+        if self.exact:
+            return np.quantile(self.levels[0], qs).tolist()
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        values = items[np.clip(positions, 0, len(items) - 1)]
+        values[qs <= 0] = self.min
+        values[qs >= 1] = self.max
+        return values.tolist()
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    @property
+    def size(self) -> int:
+        """Bytes aproximados dos valores guardados (para o cache)"""
+        return sum(level.nbytes for level in self.levels) + 64
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma serializável em JSON (gravada junto com o dataset)"""
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': None if np.isnan(self.min) else float(self.min),
+            'max': None if np.isnan(self.max) else float(self.max),
+            'levels': [level.tolist() for level in self.levels]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(int(data.get('k', QUANTILE_SKETCH_K)))
+        sketch.n = int(data.get('n', 0))
+        sketch.min = np.nan if data.get('min') is None else float(data['min'])
+        sketch.max = np.nan if data.get('max') is None else float(data['max'])
+        sketch.levels = [np.asarray(level, dtype=float) for level in data.get('levels') or [[]]]
+        return sketch
+
+
+def _sketchable(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def update_column_sketches(sketches: Dict[str, QuantileSketch], df: pd.DataFrame, excluded: Set[str]) -> None:
+    """
+    Atualiza os sketches das colunas numéricas com um bloco do dataset.
+    Coluna que deixa de ser numérica em algum bloco perde o sketch (vai para excluded).
+    """
+    for column in df.columns:
+        name = str(column)
+        if name in excluded:
+            continue
+        values = df[column]
+        if values.isna().all():
+            continue
+        if not _sketchable(values):
+            sketches.pop(name, None)
+            excluded.add(name)
+            continue
+        sketches.setdefault(name, QuantileSketch()).update(values.to_numpy(dtype=float, na_value=np.nan))
+
+
+def build_column_sketches(df: pd.DataFrame) -> Dict[str, QuantileSketch]:
+    """Sketches das colunas numéricas de um DataFrame inteiro"""
+    sketches: Dict[str, QuantileSketch] = {}
+    update_column_sketches(sketches, df, set())
+    return sketches
+
+
+def sketches_to_dict(sketches: Dict[str, QuantileSketch]) -> Dict[str, Any]:
+    return {column: sketch.to_dict() for column, sketch in sketches.items()}
+
+
+def sketches_from_dict(data: Dict[str, Any]) -> Dict[str, QuantileSketch]:
+    return {column: QuantileSketch.from_dict(sketch) for column, sketch in (data or {}).items()}
+
+
+def column_quantiles(values: pd.Series, qs: Iterable[float], sketch: Optional[QuantileSketch] = None,
+                     exact: bool = False) -> List[float]:
+    """
+    Quantis de uma coluna: do sketch gravado com o dataset (aproximados, sem
+    percorrer os valores) ou, com exact=True ou sem sketch, calculados pelo pandas.
+    """
+    qs = list(qs)
+    if sketch is not None and sketch.n and not exact:
+        return sketch.quantiles(qs)
+    return [float(v) for v in values.quantile(qs)]
+
+
+def iqr_bounds(values: pd.Series, sketch: Optional[QuantileSketch] = None,
+               exact: bool = False) -> Tuple[float, float, float, float]:
+    """Q1, Q3 e os limites de outlier (Q1 - 1.5*IQR, Q3 + 1.5*IQR) de uma coluna"""
+    q1, q3 = column_quantiles(values, (0.25, 0.75), sketch, exact)
+    iqr = q3 - q1
+    return q1, q3, q1 - 1.5 * iqr, q3 + 1.5 * iqr
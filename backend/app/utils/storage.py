@@ -1 +1,154 @@
- 
\ No newline at end of file
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import UploadFile
+
+# Tamanho de cada leitura do UploadFile ao copiar para o disco
+UPLOAD_READ_SIZE = 1024 * 1024  # 1MB
+
+# Diretório para arquivos temporários de upload (padrão do sistema se não definido)
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+
+class UploadTooLargeError(ValueError):
+    """Arquivo enviado excede o tamanho máximo permitido."""
+
+
+async def spool_upload_to_disk(file: UploadFile, max_size: int) -> Tuple[str, int]:
+    """
+    Copia o UploadFile para um arquivo temporário em blocos de tamanho fixo,
+    sem carregar o arquivo inteiro na memória.
+
+    Retorna o caminho do arquivo temporário e o total de bytes escritos.
+    O chamador é responsável por remover o arquivo (ver remove_spooled_file).
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_", dir=UPLOAD_TMP_DIR)
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(UPLOAD_READ_SIZE)
+                if not block:
+                    break
+                total += len(block)
+                if total > max_size:
+                    raise UploadTooLargeError(f"Arquivo excede o tamanho máximo de {max_size} bytes")
+                out.write(block)
+    except Exception:
+        remove_spooled_file(path)
+        raise
+    return path, total
+
+
+def remove_spooled_file(path: str) -> None:
+    """Remove um arquivo temporário de upload, ignorando se já não existir."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class BlobStore(ABC):
+    """
+    Interface mínima de armazenamento de blobs (arquivos de datasets, artefatos).
+    Implementações devem aceitar chaves no formato "prefixo/sub/arquivo.ext".
+    """
+
+    @abstractmethod
+    def put_file(self, key: str, src_path: str) -> int:
+        """Armazena o arquivo local src_path sob a chave informada e retorna o tamanho em bytes"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Abre o blob para leitura binária"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Caminho local do blob, se o armazenamento for em disco (permite memory-map)"""
+        return None
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """True se existir um blob com a chave informada"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove o blob (sem erro se ele não existir)"""
+
+
+class LocalBlobStore(BlobStore):
+    """Armazenamento de blobs no sistema de arquivos local"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Chave de blob inválida: {key}")
+        return path
+
+    def put_file(self, key: str, src_path: str) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # os.replace é atômico quando origem e destino estão no mesmo sistema de arquivos
+        try:
+            os.replace(src_path, path)
+        except OSError:
+            shutil.copyfile(src_path, path)
+            remove_spooled_file(src_path)
+        return os.path.getsize(path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        remove_spooled_file(self._path(key))
+
+
+# Diretório padrão dos datasets no armazenamento local
+DATASET_STORAGE_DIR = os.getenv(
+    "DATASET_STORAGE_DIR",
+    str(Path(__file__).parent.parent.parent / "data" / "datasets")
+)
+
+# Cache local de datasets em Arrow IPC, compartilhado pelos workers da máquina
+DATASET_DISK_CACHE_DIR = os.getenv(
+    "DATASET_DISK_CACHE_DIR",
+    str(Path(__file__).parent.parent.parent / "data" / "cache")
+)
+
+# Relatórios .xlsx já renderizados, reaproveitados entre cliques em "gerar"
+REPORT_CACHE_DIR = os.getenv(
+    "REPORT_CACHE_DIR",
+    str(Path(__file__).parent.parent.parent / "data" / "reports")
+)
+
+# Implementações disponíveis, selecionadas pela variável DATASET_BLOB_STORE
+BLOB_STORES = {
+    "local": lambda: LocalBlobStore(DATASET_STORAGE_DIR),
+}
+
+_dataset_store: Optional[BlobStore] = None
+
+
+def get_dataset_store() -> BlobStore:
+    """Retorna o armazenamento de blobs configurado para os datasets"""
+    global _dataset_store
+    if _dataset_store is None:
+        backend = os.getenv("DATASET_BLOB_STORE", "local")
+        if backend not in BLOB_STORES:
+            raise ValueError(f"Armazenamento de datasets não suportado: {backend}")
+        _dataset_store = BLOB_STORES[backend]()
+    return _dataset_store
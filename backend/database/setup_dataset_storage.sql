@@ -0,0 +1,20 @@
+-- Script SQL para armazenamento de datasets grandes do AutoReport SaaS
+-- Execute este script no Supabase SQL Editor
+
+-- Formato de armazenamento do dataset:
+--   'parquet' - arquivo Parquet no armazenamento de datasets (storage_key aponta para ele),
+--               criptografado em repouso (contêiner AES-GCM em blocos, chaves *.parquet.enc)
+--   'jsonb'   - dados inline em uploaded_data.data (registros antigos)
+ALTER TABLE uploaded_data ADD COLUMN IF NOT EXISTS storage_format VARCHAR(20) DEFAULT 'jsonb';
+ALTER TABLE uploaded_data ADD COLUMN IF NOT EXISTS storage_key TEXT;
+ALTER TABLE uploaded_data ADD COLUMN IF NOT EXISTS storage_size BIGINT;
+
+-- Cópia do arquivo original enviado, gravada apenas por versões anteriores do upload
+-- (o dataset criptografado em storage_key já é a cópia em repouso); removida junto
+-- com o dataset quando ele é regravado
+ALTER TABLE uploaded_data ADD COLUMN IF NOT EXISTS raw_storage_key TEXT;
+
+-- Sketches de quantis das colunas numéricas ({coluna: {k, n, min, max, levels}}),
+-- montados bloco a bloco na gravação do dataset; NULL em datasets antigos
+-- (calculados e gravados na primeira análise que precisar de quantis)
+ALTER TABLE uploaded_data ADD COLUMN IF NOT EXISTS column_sketches JSONB;
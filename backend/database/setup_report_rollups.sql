@@ -0,0 +1,100 @@
+-- Script SQL para os rollups dos dashboards do AutoReport SaaS
+-- Execute este script no Supabase SQL Editor
+--
+-- Contagens de relatórios por usuário (por mês de criação, título e status),
+-- mantidas incrementalmente por trigger a cada INSERT/UPDATE/DELETE em reports.
+-- O resumo do dashboard lê O(grupos) linhas daqui em vez de todos os relatórios.
+-- Reconstrução (backfill): SELECT rebuild_report_rollups();  -- ou (user_id)
+-- ou: python scripts/rebuild_report_rollups.py [--user-id ID]
+
+ALTER TABLE reports ADD COLUMN IF NOT EXISTS status VARCHAR(50) DEFAULT 'completed';
+
+-- dimension: 'month' (YYYY-MM de created_at, UTC), 'title' ou 'status'
+CREATE TABLE IF NOT EXISTS report_rollups (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    dimension VARCHAR(20) NOT NULL,
+    bucket TEXT NOT NULL,
+    report_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, dimension, bucket)
+);
+
+-- Aplica +delta/-delta às contagens de um relatório (linhas zeradas são removidas)
+CREATE OR REPLACE FUNCTION bump_report_rollups(p_user_id UUID, p_created_at TIMESTAMP WITH TIME ZONE,
+                                               p_title TEXT, p_status TEXT, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO report_rollups (user_id, dimension, bucket, report_count)
+    SELECT p_user_id, dimension, bucket, p_delta
+    FROM (VALUES ('month', to_char(p_created_at AT TIME ZONE 'UTC', 'YYYY-MM')),
+                 ('title', p_title),
+                 ('status', p_status)) AS v(dimension, bucket)
+    WHERE bucket IS NOT NULL
+    ON CONFLICT (user_id, dimension, bucket)
+    DO UPDATE SET report_count = report_rollups.report_count + EXCLUDED.report_count, updated_at = NOW();
+
+    DELETE FROM report_rollups WHERE user_id = p_user_id AND report_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Roda como o dono da função: quem altera reports não precisa de acesso aos rollups
+CREATE OR REPLACE FUNCTION report_rollups_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_report_rollups(OLD.user_id, OLD.created_at, OLD.title, OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_report_rollups(NEW.user_id, NEW.created_at, NEW.title, NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS maintain_report_rollups ON reports;
+CREATE TRIGGER maintain_report_rollups
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, created_at, title, status ON reports
+    FOR EACH ROW EXECUTE FUNCTION report_rollups_trigger();
+
+-- Recalcula os rollups a partir de reports (todos os usuários ou só p_user_id).
+-- O lock espera as transações que estão atualizando rollups e bloqueia novas
+-- até o fim, para que nenhum relatório seja contado duas vezes.
+CREATE OR REPLACE FUNCTION rebuild_report_rollups(p_user_id UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    affected BIGINT;
+BEGIN
+    LOCK TABLE report_rollups IN EXCLUSIVE MODE;
+    DELETE FROM report_rollups WHERE p_user_id IS NULL OR user_id = p_user_id;
+    INSERT INTO report_rollups (user_id, dimension, bucket, report_count)
+    SELECT user_id, dimension, bucket, COUNT(*)
+    FROM (
+        SELECT user_id, 'month' AS dimension, to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM') AS bucket FROM reports
+        UNION ALL
+        SELECT user_id, 'title', title FROM reports
+        UNION ALL
+        SELECT user_id, 'status', status FROM reports
+    ) AS r
+    WHERE user_id IS NOT NULL AND bucket IS NOT NULL AND (p_user_id IS NULL OR user_id = p_user_id)
+    GROUP BY user_id, dimension, bucket;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apenas a API (service role) altera ou reconstrói os rollups
+REVOKE EXECUTE ON FUNCTION bump_report_rollups(UUID, TIMESTAMP WITH TIME ZONE, TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION rebuild_report_rollups(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_report_rollups(UUID) TO service_role;
+
+-- Políticas RLS (Row Level Security)
+ALTER TABLE report_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own report rollups" ON report_rollups
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Backfill inicial
+SELECT rebuild_report_rollups();
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Teste dos caches limitados por bytes (app.utils.cache): LRU em memória e
+cache de tabelas Arrow em disco
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.cache import MemoryLRUCache, DiskArrowCache, DiskBlobCache
+
+
+def test_eviction_by_budget():
+    """Ao passar do limite, a entrada menos usada é removida"""
+    print("🧪 Testando remoção por limite de memória...")
+    cache = MemoryLRUCache(max_bytes=100)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    assert cache.get("a") == 1  # "a" passa a ser a mais recente
+    cache.put("c", 3, 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["bytes"] == 80
+    print("✅ Entrada menos usada removida")
+
+
+def test_oversized_entry_rejected():
+    """Entradas maiores que o cache inteiro não são guardadas"""
+    print("🧪 Testando entrada maior que o limite...")
+    cache = MemoryLRUCache(max_bytes=100)
+    cache.put("a", 1, 10)
+    assert cache.put("grande", 2, 101) is False
+    assert cache.get("grande") is None and cache.get("a") == 1
+    print("✅ Entrada grande ignorada sem remover as demais")
+
+
+def test_replace_and_pop():
+    """Substituir ou remover uma chave atualiza o total de bytes"""
+    print("🧪 Testando substituição e remoção...")
+    cache = MemoryLRUCache(max_bytes=100)
+    cache.put("a", ("v1", "df"), 30)
+    cache.put("a", ("v2", "df"), 50)
+    assert cache.get("a")[0] == "v2"
+    assert cache.stats()["bytes"] == 50
+    cache.pop("a")
+    cache.pop("inexistente")
+    assert cache.stats()["bytes"] == 0 and cache.stats()["entries"] == 0
+    print("✅ Total de bytes consistente")
+
+
+def test_disk_cache_versions():
+    """Só a versão pedida é lida; gravar uma versão nova remove a anterior"""
+    print("🧪 Testando versões no cache em disco...")
+    cache = DiskArrowCache(tempfile.mkdtemp(), max_bytes=10 * 1024 * 1024)
+    table = pa.table({"a": list(range(1000)), "b": ["x"] * 1000})
+    cache.put("dataset-1", "v1", table)
+    assert cache.get("dataset-1", "v1").equals(table)
+    assert cache.get("dataset-1", "v2") is None
+    cache.put("dataset-1", "v2", table.slice(0, 10))
+    assert cache.get("dataset-1", "v1") is None
+    assert cache.get("dataset-1", "v2").num_rows == 10
+    assert cache.stats()["entries"] == 1
+    cache.delete("dataset-1")
+    assert cache.stats()["entries"] == 0
+    print("✅ Versões tratadas corretamente")
+
+
+def test_disk_cache_eviction():
+    """Ao passar do limite, os arquivos usados há mais tempo são removidos"""
+    print("🧪 Testando remoção no cache em disco...")
+    table = pa.table({"a": list(range(10_000))})
+    cache = DiskArrowCache(tempfile.mkdtemp(), max_bytes=10 * 1024 * 1024)
+    cache.put("probe", "v", table)
+    entry_size = cache.stats()["bytes"]
+    cache.delete("probe")
+    cache.max_bytes = entry_size * 2
+    cache.put("a", "v", table)
+    time.sleep(0.01)
+    cache.put("b", "v", table)
+    time.sleep(0.01)
+    assert cache.get("a", "v") is not None  # "a" passa a ser o mais recente
+    cache.put("c", "v", table)
+    assert cache.get("b", "v") is None
+    assert cache.get("a", "v") is not None and cache.get("c", "v") is not None
+    print("✅ Arquivo menos usado removido")
+
+
+def test_blob_cache():
+    """Arquivos prontos: leitura, limite de tamanho e remoção por uso"""
+    print("🧪 Testando cache de arquivos prontos...")
+    cache = DiskBlobCache(tempfile.mkdtemp(), max_bytes=250, suffix=".xlsx")
+    assert cache.open("a") is None
+    cache.put("a", b"x" * 100)
+    time.sleep(0.01)
+    cache.put("b", b"y" * 100)
+    time.sleep(0.01)
+    with cache.open("a") as handle:  # "a" passa a ser o mais recente
+        assert handle.read() == b"x" * 100
+    cache.put("c", b"z" * 100)
+    assert cache.open("b") is None
+    assert cache.put("grande", b"g" * 300) is False
+    assert cache.stats()["entries"] == 2
+    print("✅ Arquivos guardados e removidos corretamente")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DOS CACHES")
+    print("=" * 40)
+
+    test_eviction_by_budget()
+    test_oversized_entry_rejected()
+    test_replace_and_pop()
+    test_disk_cache_versions()
+    test_disk_cache_eviction()
+    test_blob_cache()
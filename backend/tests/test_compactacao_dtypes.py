@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Teste da compactação de tipos dos DataFrames em cache (app.utils.pandas_utils)
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.pandas_utils import compact_dataframe, restore_dtypes
+
+
+def build_frame(rows: int = 10_000) -> pd.DataFrame:
+    """DataFrame como o montado a partir do JSON de uploaded_data"""
+    rng = np.random.default_rng(7)
+    quantidade = rng.integers(0, 100, rows).astype(float)
+    quantidade[::10] = np.nan
+    ativo = pd.Series(rng.random(rows) > 0.5, dtype=object)
+    ativo[::7] = None
+    return pd.DataFrame({
+        'Region': rng.choice(['North', 'South', 'East', 'West'], rows).astype(object),
+        'Id': np.arange(rows),
+        'Quantidade': quantidade,
+        'Valor': rng.normal(1000, 250, rows),
+        'Ativo': ativo,
+        'Codigo': [f'C{i}' for i in range(rows)],
+    })
+
+
+def test_compaction_types():
+    """Texto repetido vira categórico e números usam o menor tipo sem perda"""
+    print("🧪 Testando tipos compactados...")
+    compacted, report = compact_dataframe(build_frame())
+    dtypes = {k: v['dtype_after'] for k, v in report['columns'].items()}
+    assert dtypes['Region'] == 'category'
+    assert dtypes['Id'] == 'int16'
+    assert dtypes['Quantidade'] == 'Int8'
+    assert dtypes['Valor'] == 'float64'  # float32 perderia precisão
+    assert dtypes['Ativo'] == 'boolean'
+    assert dtypes['Codigo'] == 'object'  # valores todos distintos
+    assert report['bytes_saved'] == report['bytes_before'] - report['bytes_after'] > 0
+    print(f"✅ {report['bytes_before']} -> {report['bytes_after']} bytes ({report['ratio']}x)")
+
+
+def test_restore_round_trip():
+    """Os valores restaurados são os mesmos do DataFrame original"""
+    print("🧪 Testando restauração dos tipos...")
+    df = build_frame()
+    restored = restore_dtypes(compact_dataframe(df)[0], keep_categories=False)
+    assert restored['Quantidade'].dtype == np.float64
+    assert restored['Id'].dtype == np.int64
+    assert restored['Region'].dtype == object
+    assert restored['Ativo'].tolist() == df['Ativo'].tolist()
+    pd.testing.assert_frame_equal(restored.drop(columns=['Ativo']), df.drop(columns=['Ativo']))
+    print("✅ Valores preservados")
+
+
+def test_integral_floats_without_nulls():
+    """Float com valores inteiros e sem nulos volta como float64 (não vira int)"""
+    print("🧪 Testando float inteiro sem nulos...")
+    df = pd.DataFrame({'preco': [10.0, 20.0, 30.0], 'qtd': [1.0, None, 3.0]})
+    compacted, report = compact_dataframe(df)
+    assert report['columns']['preco']['dtype_after'] == 'float32'
+    assert report['columns']['qtd']['dtype_after'] == 'Int8'
+    for keep in (True, False):
+        pd.testing.assert_frame_equal(restore_dtypes(compacted, keep_categories=keep), df)
+    print("✅ Tipos originais restaurados")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DA COMPACTAÇÃO DE TIPOS")
+    print("=" * 40)
+
+    test_compaction_types()
+    test_restore_round_trip()
+    test_integral_floats_without_nulls()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Teste do contêiner criptografado em blocos (app.utils.crypto_utils)
+"""
+
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from app.utils.crypto_utils import (
+    EncryptedChunkWriter, EncryptedChunkReader, iter_decrypted_chunks, decrypt_byte_range, encrypt_file
+)
+from app.utils import storage
+from app.services import dataset_service
+
+
+def _encrypt(data: bytes, chunk_size: int, write_size: int = 1000) -> BytesIO:
+    out = BytesIO()
+    writer = EncryptedChunkWriter(out, chunk_size=chunk_size)
+    for i in range(0, len(data), write_size):
+        writer.write(data[i:i + write_size])
+    writer.close()
+    return out
+
+
+def test_round_trip():
+    """Texto cifrado em blocos volta igual ao original"""
+    print("🧪 Testando ida e volta do contêiner...")
+    for size in [0, 1, 4095, 4096, 4097, 50_000]:
+        data = os.urandom(size)
+        container = _encrypt(data, chunk_size=4096)
+        assert b"".join(iter_decrypted_chunks(container)) == data
+        print(f"✅ {size} bytes OK")
+
+
+def test_byte_range():
+    """Uma faixa de bytes é decifrada sem decifrar o arquivo todo"""
+    print("🧪 Testando leitura de faixa...")
+    data = os.urandom(100_000)
+    container = _encrypt(data, chunk_size=4096)
+    for offset, length in [(0, 10), (4090, 20), (50_000, 12_345), (99_990, 10)]:
+        assert decrypt_byte_range(container, offset, length) == data[offset:offset + length]
+    print("✅ Faixas decifradas corretamente")
+
+
+def test_truncation_detected():
+    """Remover o último bloco deve falhar na autenticação"""
+    print("🧪 Testando detecção de truncamento...")
+    data = os.urandom(10_000)
+    container = _encrypt(data, chunk_size=4096)
+    truncated = BytesIO(container.getvalue()[:-(len(data) % 4096 + 16)])
+    try:
+        b"".join(iter_decrypted_chunks(truncated))
+    except Exception:
+        print("✅ Truncamento detectado")
+        return
+    raise AssertionError("Contêiner truncado foi aceito")
+
+
+def test_seekable_reader():
+    """Leitor com seek devolve as mesmas faixas do texto original"""
+    print("🧪 Testando leitor com acesso aleatório...")
+    data = os.urandom(30_000)
+    reader = EncryptedChunkReader(_encrypt(data, chunk_size=4096))
+    assert reader.seek(0, os.SEEK_END) == len(data) == reader.size
+    for offset, length in [(0, 1), (4095, 2), (8000, 9000), (29_990, 100), (30_000, 5)]:
+        reader.seek(offset)
+        assert reader.read(length) == data[offset:offset + length]
+    reader.seek(-10, os.SEEK_END)
+    assert reader.read() == data[-10:]
+    reader.seek(100)
+    buffer = bytearray(50)
+    assert reader.readinto(buffer) == 50 and bytes(buffer) == data[100:150]
+    assert EncryptedChunkReader(_encrypt(b"", chunk_size=4096)).read() == b""
+    print("✅ Leituras com seek corretas")
+
+
+def test_parquet_through_reader():
+    """pyarrow lê colunas e row groups de um Parquet criptografado sem decifrá-lo antes"""
+    print("🧪 Testando Parquet criptografado...")
+    df = pd.DataFrame({'id': range(20_000), 'nome': [f"item {i}" for i in range(20_000)]})
+    plain = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+    plain.close()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), plain.name, row_group_size=5000)
+    container = BytesIO()
+    encrypt_file(plain.name, container, chunk_size=4096)
+    os.remove(plain.name)
+
+    table = pq.read_table(EncryptedChunkReader(BytesIO(container.getvalue())), columns=['nome'])
+    assert table.column_names == ['nome'] and table.column(0).to_pylist() == df['nome'].tolist()
+    pf = pq.ParquetFile(EncryptedChunkReader(BytesIO(container.getvalue())))
+    assert pf.num_row_groups == 4
+    assert pf.read_row_group(2).to_pandas()['id'].tolist() == list(range(10_000, 15_000))
+    print("✅ Parquet lido através do contêiner")
+
+
+def test_dataset_blob_encrypted_at_rest():
+    """write_dataset grava o Parquet criptografado; datasets antigos em texto puro continuam legíveis"""
+    print("🧪 Testando dataset criptografado em repouso...")
+    storage._dataset_store = storage.LocalBlobStore(tempfile.mkdtemp(prefix='datasets_'))
+    store = storage.get_dataset_store()
+    df = pd.DataFrame({'cidade': ['Recife', 'Natal', None], 'valor': [1.5, 2.0, 3.25]})
+
+    stored = dataset_service.write_dataset([df], 'u1')
+    with open(store.local_path(stored['storage_key']), 'rb') as f:
+        raw = f.read()
+    assert raw.startswith(b"ARC1") and b"PAR1" not in raw and b"Recife" not in raw
+    pd.testing.assert_frame_equal(dataset_service.read_parquet_dataset(stored['storage_key']), df)
+    assert dataset_service.read_parquet_dataset(stored['storage_key'], ['valor'])['valor'].tolist() == [1.5, 2.0, 3.25]
+    assert dataset_service._open_parquet(stored['storage_key']).read().num_rows == 3
+
+    legacy = os.path.join(store.root, 'u1', 'antigo.parquet')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), legacy)
+    pd.testing.assert_frame_equal(dataset_service.read_parquet_dataset('u1/antigo.parquet'), df)
+    print("✅ Dataset cifrado em disco e lido de volta")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DO CONTÊINER CRIPTOGRAFADO EM BLOCOS")
+    print("=" * 40)
+
+    test_round_trip()
+    test_byte_range()
+    test_truncation_detected()
+    test_seekable_reader()
+    test_parquet_through_reader()
+    test_dataset_blob_encrypted_at_rest()
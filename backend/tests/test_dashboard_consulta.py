@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Teste da consulta dos dashboards (app.services.dashboard_service): filtros e
+colunas enviados ao PostgREST em vez de aplicados no pandas, widgets em lote e
+resumo lido dos rollups
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services import dashboard_service
+from app.services.dashboard_service import (
+    fetch_dashboard_frame, evaluate_dashboard, rollup_summary, ReportColumnError, REPORTS_FETCH_PAGE
+)
+
+
+class FakeQuery:
+    """Registra as chamadas do construtor de consultas e devolve páginas de linhas"""
+
+    def __init__(self, calls, pages):
+        self.calls = calls
+        self.pages = pages
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name,) + args)
+            return self
+        return method
+
+    def execute(self):
+        return type('Response', (), {'data': self.pages.pop(0)})()
+
+
+class FakeClient:
+    def __init__(self, pages):
+        self.calls = []
+        self.pages = pages
+
+    def table(self, name):
+        self.calls.append(('table', name))
+        return FakeQuery(self.calls, self.pages)
+
+
+def test_filters_pushed_down():
+    """Filtros de data e igualdade viram gte/lte/eq e só a coluna pedida é selecionada"""
+    print("🧪 Testando filtros e projeção na consulta...")
+    client = FakeClient([[{'title': 'a'}, {'title': 'b'}]])
+    dashboard_service.supabase = client
+    df = fetch_dashboard_frame('u1', ['title'], '2024-01-01', '2024-01-31', 'status', 'ok')
+    assert ('select', 'title') in client.calls
+    assert ('eq', 'user_id', 'u1') in client.calls and ('eq', 'status', 'ok') in client.calls
+    assert ('gte', 'created_at', '2024-01-01') in client.calls
+    assert ('lte', 'created_at', '2024-01-31') in client.calls
+    assert list(df['title']) == ['a', 'b']
+    print("✅ Consulta com filtros no banco")
+
+
+def test_pages_and_empty_result():
+    """Busca em páginas até a última incompleta; sem resultados mantém as colunas"""
+    print("🧪 Testando paginação e resultado vazio...")
+    client = FakeClient([[{'score': 1}] * REPORTS_FETCH_PAGE, [{'score': 2}]])
+    dashboard_service.supabase = client
+    assert len(fetch_dashboard_frame('u1', ['score'])) == REPORTS_FETCH_PAGE + 1
+    assert ('range', REPORTS_FETCH_PAGE, 2 * REPORTS_FETCH_PAGE - 1) in client.calls
+    dashboard_service.supabase = FakeClient([[]])
+    assert list(fetch_dashboard_frame('u1', ['score', 'title']).columns) == ['score', 'title']
+    print("✅ Páginas e colunas preservadas")
+
+
+def test_invalid_column():
+    """Nomes com sintaxe do PostgREST são recusados antes da consulta"""
+    print("🧪 Testando coluna inválida...")
+    client = FakeClient([])
+    dashboard_service.supabase = client
+    for column in ('a,b', 'x:title', 'reports(*)'):
+        try:
+            fetch_dashboard_frame('u1', [column])
+            raise AssertionError(f"{column} deveria ser recusada")
+        except ReportColumnError:
+            pass
+    assert client.calls == []
+    print("✅ Colunas inválidas recusadas")
+
+
+def test_batch_single_fetch():
+    """Vários widgets com uma consulta (união das colunas) e erros por widget"""
+    print("🧪 Testando dashboard em lote...")
+    rows = [{'title': 't1', 'score': 10, 'created_at': '2024-01-05'},
+            {'title': 't2', 'score': 30, 'created_at': '2024-02-05'}]
+    client = FakeClient([rows])
+    dashboard_service.supabase = client
+    result = evaluate_dashboard('u1', [
+        {'id': 'a', 'type': 'column', 'params': {'col': 'title'}},
+        {'id': 'b', 'type': 'stats', 'params': {'col': 'score'}},
+        {'id': 'c', 'type': 'timeseries', 'params': {}},
+        {'id': 'd', 'type': 'stats', 'params': {'col': 'title'}},
+        {'id': 'e', 'type': 'desconhecido', 'params': {}},
+    ], start_date='2024-01-01')
+    assert [c for c in client.calls if c[0] == 'table'] == [('table', 'reports')]
+    assert ('select', 'title,score,created_at') in client.calls
+    widgets = {w['id']: w for w in result['widgets']}
+    assert widgets['a']['data']['distribution'] == {'t1': 1, 't2': 1}
+    assert widgets['b']['data']['stats']['mean'] == 20
+    assert widgets['c']['data']['timeseries'] == {'2024-01': 1, '2024-02': 1}
+    assert widgets['d']['error'] == 'Coluna numérica não encontrada'
+    assert 'error' in widgets['e'] and list(widgets) == ['a', 'b', 'c', 'd', 'e']
+    print("✅ Uma consulta para todos os widgets")
+
+
+def test_batch_bad_widget_params():
+    """Coluna que não é texto invalida só o próprio widget; os demais são calculados"""
+    print("🧪 Testando widget com parâmetro inválido no lote...")
+    client = FakeClient([[{'title': 't1', 'score': 10}, {'title': 't2', 'score': 30}]])
+    dashboard_service.supabase = client
+    result = evaluate_dashboard('u1', [
+        {'id': 'a', 'type': 'column', 'params': {'col': 'title'}},
+        {'id': 'b', 'type': 'stats', 'params': {'col': 5}},
+        {'id': 'c', 'type': 'pivot', 'params': {'col1': 'title', 'col2': ['x'], 'agg': 'count'}},
+        {'id': 'd', 'type': 'stats', 'params': {'col': 'score'}},
+    ])
+    widgets = {w['id']: w for w in result['widgets']}
+    assert widgets['b']['error'] == 'Coluna inválida: 5'
+    assert widgets['c']['error'].startswith('Coluna inválida')
+    assert widgets['a']['data']['distribution'] == {'t1': 1, 't2': 1}
+    assert widgets['d']['data']['stats']['mean'] == 20
+    assert ('select', 'title,score') in client.calls
+    print("✅ Erro apenas no widget inválido")
+
+
+def test_rollup_summary():
+    """O resumo vem das contagens agregadas (uma linha por grupo), não dos relatórios"""
+    print("🧪 Testando resumo a partir dos rollups...")
+    client = FakeClient([[
+        {'dimension': 'month', 'bucket': '2024-02', 'report_count': 5},
+        {'dimension': 'month', 'bucket': '2024-01', 'report_count': 2},
+        {'dimension': 'title', 'bucket': 'Vendas', 'report_count': 3},
+        {'dimension': 'title', 'bucket': 'Risco', 'report_count': 4},
+        {'dimension': 'status', 'bucket': 'completed', 'report_count': 7},
+    ]])
+    dashboard_service.supabase = client
+    summary = rollup_summary('u1')
+    assert ('table', 'report_rollups') in client.calls
+    assert summary['total_reports'] == 7
+    assert list(summary['created_per_month'].items()) == [('2024-01', 2), ('2024-02', 5)]
+    assert list(summary['reports_by_title']) == ['Risco', 'Vendas']
+    assert summary['reports_by_status'] == {'completed': 7}
+    dashboard_service.supabase = FakeClient([[]])
+    assert rollup_summary('u1') == {"message": "Nenhum dado para dashboard"}
+    print("✅ Resumo lido dos rollups")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DA CONSULTA DOS DASHBOARDS")
+    print("=" * 40)
+
+    test_filters_pushed_down()
+    test_pages_and_empty_result()
+    test_invalid_column()
+    test_batch_single_fetch()
+    test_batch_bad_widget_params()
+    test_rollup_summary()
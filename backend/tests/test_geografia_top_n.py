@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Teste do agrupamento top-N + "Outros" da análise geográfica (gráfico limitado,
+detalhe completo paginado), do rollup hierárquico e da aba "Análise Geográfica"
+do relatório Excel
+"""
+
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.analysis_service import geography_analysis, geography_rollup, GEO_EMPTY_LABEL
+from app.services.report_service import build_excel_report, GEO_SHEET_TOP_N, GEO_DETAIL_SHEET
+
+
+def build_cities(cities: int = 500, rows: int = 20_000) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'Cidade': [f'Cidade {i:04d}' for i in rng.integers(0, cities, rows)],
+        'Valor': rng.gamma(2.0, 1000.0, rows),
+    })
+
+
+def test_top_n_sum():
+    """Gráfico com top-N + Outros; os totais batem com o agrupamento completo"""
+    print("🧪 Testando top-N com 'Outros' (soma)...")
+    df = build_cities()
+    result = geography_analysis(df, 'Cidade', 'Valor', 'sum', top_n=10)
+    chart = result['chart_data']
+    full = df.groupby('Cidade')['Valor'].sum().sort_values(ascending=False)
+    assert len(chart['labels']) == 11 and chart['labels'][-1] == 'Outros'
+    assert chart['labels'][:10] == list(full.index[:10])
+    assert np.isclose(sum(chart['values']), full.sum())
+    assert chart['others_groups'] == len(full) - 10
+    assert chart['count'] == len(full)
+    print("✅ Gráfico limitado e totais preservados")
+
+
+def test_top_n_mean_and_count():
+    """'Outros' da média é a média das linhas restantes; contagem soma o restante"""
+    print("🧪 Testando top-N com 'Outros' (média e contagem)...")
+    df = build_cities()
+    chart = geography_analysis(df, 'Cidade', 'Valor', 'mean', top_n=5)['chart_data']
+    top = df.groupby('Cidade')['Valor'].mean().nlargest(5).index
+    assert np.isclose(chart['values'][-1], df.loc[~df['Cidade'].isin(top), 'Valor'].mean())
+    chart = geography_analysis(df, 'Cidade', None, 'count', top_n=5)['chart_data']
+    assert sum(chart['values']) == len(df) and chart['labels'][-1] == 'Outros'
+    print("✅ Média e contagem de 'Outros' corretas")
+
+
+def test_real_others_group():
+    """Grupo real chamado 'Outros' é somado à linha 'Outros', sem rótulo repetido"""
+    print("🧪 Testando grupo real chamado 'Outros'...")
+    df = build_cities()
+    df.loc[df.index[:5000], 'Cidade'] = 'Outros'
+    chart = geography_analysis(df, 'Cidade', 'Valor', 'sum', top_n=10)['chart_data']
+    full = df.groupby('Cidade')['Valor'].sum()
+    assert len(set(chart['labels'])) == len(chart['labels']) == 11 and chart['labels'][-1] == 'Outros'
+    assert chart['labels'][:10] == list(full.drop('Outros').nlargest(10).index)
+    assert np.isclose(sum(chart['values']), full.sum())
+    assert np.isclose(chart['values'][-1], full.sum() - full[chart['labels'][:10]].sum())
+
+    # Sem excedente, o grupo real continua aparecendo (uma única vez)
+    small = pd.DataFrame({'Cidade': ['A', 'Outros', 'B', 'Outros'], 'Valor': [1.0, 10.0, 2.0, 5.0]})
+    chart = geography_analysis(small, 'Cidade', 'Valor', 'mean', top_n=5)['chart_data']
+    assert chart['labels'] == ['B', 'A', 'Outros'] and chart['values'] == [2.0, 1.0, 7.5]
+    print("✅ 'Outros' real incorporado à linha de 'Outros'")
+
+
+def test_pagination():
+    """O detalhe completo continua acessível por páginas"""
+    print("🧪 Testando paginação do detalhe...")
+    df = build_cities()
+    first = geography_analysis(df, 'Cidade', 'Valor', 'sum', page=1, page_size=200)
+    last = geography_analysis(df, 'Cidade', 'Valor', 'sum', page=3, page_size=200)
+    assert first['pagination'] == {'page': 1, 'page_size': 200, 'total_groups': 500, 'total_pages': 3}
+    assert len(first['geo_summary']) == 200 and len(last['geo_summary']) == 100
+    assert not set(first['geo_summary']) & set(last['geo_summary'])
+    try:
+        geography_analysis(df, 'Cidade', 'Valor', 'sum', top_n=0)
+        raise AssertionError("top_n=0 deveria ser recusado")
+    except ValueError:
+        pass
+    print("✅ Páginas consistentes")
+
+
+def test_report_sheet():
+    """Aba com top-N + Outros e gráfico limitado; detalhe completo em outra aba"""
+    print("🧪 Testando aba geográfica com muitos grupos...")
+    df = build_cities()
+    content = build_excel_report(df, 'cidades.csv', 'geography', 'Cidades', True, False,
+                                 None, 'Valor', 'Cidade', None, 'usuario')
+    wb = load_workbook(BytesIO(content))
+    assert wb.sheetnames == ['Dados Originais', 'Análise Geográfica', GEO_DETAIL_SHEET, 'Metadados']
+    ws = wb['Análise Geográfica']
+    assert ws.max_row == GEO_SHEET_TOP_N + 2
+    assert ws.cell(row=ws.max_row, column=1).value == 'Outros'
+    assert ws.cell(row=ws.max_row, column=4).value == len(df) - sum(
+        ws.cell(row=r, column=4).value for r in range(2, ws.max_row))
+    assert wb[GEO_DETAIL_SHEET].max_row == 501
+    print("✅ Aba limitada e detalhe preservado")
+
+
+def test_rollup_tree():
+    """Rollup região -> estado -> cidade: subtotais de cada nível batem com o groupby direto"""
+    print("🧪 Testando rollup hierárquico...")
+    df = build_cities()
+    df['Estado'] = df['Cidade'].str[-2:]
+    df['Regiao'] = df['Cidade'].str[-1].map(lambda d: 'Norte' if int(d) < 5 else 'Sul')
+    result = geography_rollup(df, 'Regiao, Estado, Cidade', 'Valor', 'mean')
+    tree = result['tree']
+    assert tree['count'] == len(df) and np.isclose(tree['value'], df['Valor'].mean())
+    assert [n['name'] for n in tree['children']] == \
+        list(df.groupby('Regiao')['Valor'].mean().sort_values(ascending=False).index)
+    for region in tree['children']:
+        for state in region['children']:
+            rows = df[df['Estado'] == state['name']]
+            assert np.isclose(state['value'], rows['Valor'].mean()) and state['count'] == len(rows)
+            assert sum(city['count'] for city in state['children']) == state['count']
+            assert 'children' not in state['children'][0]
+    assert result['metadata']['groups_per_level'] == {'Regiao': 2, 'Estado': 100, 'Cidade': 500}
+    counts = geography_rollup(df, 'Regiao,Estado', None, 'count')['tree']
+    assert sum(n['value'] for n in counts['children']) == len(df)
+    print("✅ Árvore com subtotais corretos")
+
+
+def test_rollup_missing_keys():
+    """Chaves vazias nos níveis de baixo não somem dos subtotais nem do total"""
+    print("🧪 Testando rollup com chaves ausentes...")
+    df = pd.DataFrame({
+        'Regiao': ['S', 'S', 'S', 'N', None],
+        'Cidade': ['a', 'b', None, 'x', 'y'],
+        'Valor': [1.0, 2.0, 3.0, 1.0, 5.0]
+    })
+    tree = geography_rollup(df, 'Regiao,Cidade', 'Valor', 'sum')['tree']
+    regions = {n['name']: n for n in tree['children']}
+    assert tree['value'] == df['Valor'].sum() and tree['count'] == len(df)
+    assert regions['S']['value'] == 6.0 and regions['S']['count'] == 3
+    assert {c['name']: c['value'] for c in regions['S']['children']} == {'a': 1.0, 'b': 2.0, GEO_EMPTY_LABEL: 3.0}
+    assert regions[GEO_EMPTY_LABEL]['value'] == 5.0
+    for region in tree['children']:
+        assert sum(c['value'] for c in region['children']) == region['value']
+    print("✅ Linhas com chave vazia mantidas nos subtotais")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DO TOP-N GEOGRÁFICO")
+    print("=" * 40)
+
+    test_top_n_sum()
+    test_top_n_mean_and_count()
+    test_real_others_group()
+    test_pagination()
+    test_report_sheet()
+    test_rollup_tree()
+    test_rollup_missing_keys()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Teste do pool de processos das tarefas pesadas (app.utils.process_pool)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.process_pool import WorkerPool, PoolBusyError, JobTimeoutError, _Job
+from app.utils.cache import cache_max_bytes
+
+
+def soma(a, b):
+    return a + b
+
+
+def falha():
+    raise ValueError("coluna inexistente")
+
+
+def dorme(segundos):
+    time.sleep(segundos)
+    return os.getpid()
+
+
+def limite_cache():
+    return cache_max_bytes("PARSE_CACHE_MAX_MB", 256, 32)
+
+
+def test_result_and_errors():
+    """Resultados e exceções voltam do processo para quem chamou"""
+    print("🧪 Testando resultado e erros...")
+    pool = WorkerPool(workers=1, max_queue=0, timeout=30)
+
+    async def scenario():
+        assert await pool.run(soma, 2, 3) == 5
+        try:
+            await pool.run(falha)
+            assert False, "a exceção deveria ter sido propagada"
+        except ValueError as e:
+            assert "coluna inexistente" in str(e)
+        assert await pool.run(dorme, 0) != os.getpid()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    print("✅ Resultado e exceções propagados")
+
+
+def test_timeout_replaces_worker():
+    """Tarefa que estoura o tempo limite é encerrada e o pool continua funcionando"""
+    print("🧪 Testando tempo limite...")
+    pool = WorkerPool(workers=1, max_queue=0, timeout=30)
+
+    async def scenario():
+        first_pid = await pool.run(dorme, 0)
+        started = time.monotonic()
+        try:
+            await pool.run(dorme, 30, timeout=1)
+            assert False, "deveria ter estourado o tempo limite"
+        except JobTimeoutError:
+            pass
+        assert time.monotonic() - started < 10
+        assert await pool.run(dorme, 0) != first_pid  # processo substituído
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    print("✅ Processo encerrado e substituído")
+
+
+def test_bounded_queue():
+    """Com a fila cheia, novas tarefas são recusadas na hora"""
+    print("🧪 Testando fila limitada...")
+    pool = WorkerPool(workers=1, max_queue=1, timeout=30)
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(dorme, 1)) for _ in range(2)]
+        await asyncio.sleep(0.1)
+        try:
+            await pool.run(soma, 1, 1)
+            assert False, "a fila deveria estar cheia"
+        except PoolBusyError:
+            pass
+        await asyncio.gather(*running)
+        assert await pool.run(soma, 1, 1) == 2
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    print("✅ Fila respeitada")
+
+
+def test_late_cancel_spares_next_job():
+    """Cancelamento que chega depois do fim da tarefa não encerra o processo já reaproveitado"""
+    print("🧪 Testando cancelamento concorrente com o fim da tarefa...")
+    pool = WorkerPool(workers=1, max_queue=1, timeout=30)
+    try:
+        # A tarefa termina e o processo volta ao pool antes de quem chamou ver o resultado
+        finished = _Job()
+        first_pid = pool._execute(finished, dorme, (0,), {})
+        assert finished.worker is None
+
+        # Outra tarefa pega o mesmo processo; o cancelamento atrasado da primeira chega agora
+        results = {}
+        next_job = threading.Thread(target=lambda: results.update(pid=pool._execute(_Job(), dorme, (1,), {})))
+        next_job.start()
+        time.sleep(0.3)
+        finished.cancel()
+        next_job.join()
+        assert results.get('pid') == first_pid
+    finally:
+        pool.shutdown()
+    print("✅ Tarefa seguinte concluída no mesmo processo")
+
+
+def test_worker_cache_budget():
+    """Os processos do pool usam os limites de cache menores dos workers"""
+    print("🧪 Testando limite dos caches nos workers...")
+    pool = WorkerPool(workers=1, max_queue=0, timeout=30)
+    try:
+        assert asyncio.run(pool.run(limite_cache)) == 32 * 1024 * 1024
+        assert limite_cache() == int(os.getenv("PARSE_CACHE_MAX_MB", "256")) * 1024 * 1024
+    finally:
+        pool.shutdown()
+    print("✅ Caches dos workers limitados")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DO POOL DE PROCESSOS")
+    print("=" * 40)
+
+    test_result_and_errors()
+    test_timeout_replaces_worker()
+    test_bounded_queue()
+    test_late_cancel_spares_next_job()
+    test_worker_cache_budget()
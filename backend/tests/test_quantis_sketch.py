@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Teste dos sketches de quantis (app.utils.quantile_sketch): precisão em relação
+ao cálculo exato, combinação de blocos, serialização, leitura na versão do dataset
+e uso no relatório de qualidade
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.quantile_sketch import (
+    QuantileSketch, update_column_sketches, build_column_sketches, sketches_to_dict, sketches_from_dict,
+    column_quantiles, iqr_bounds
+)
+from app.services.data_preparation import DataPreparationService
+from app.services import dataset_service
+from app.services.dataset_service import load_column_sketches
+
+QS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def rank_errors(values: np.ndarray, sketch: QuantileSketch) -> np.ndarray:
+    """Diferença entre o posto do quantil aproximado e o posto pedido"""
+    ordered = np.sort(values)
+    ranks = np.searchsorted(ordered, sketch.quantiles(QS)) / len(ordered)
+    return np.abs(ranks - np.array(QS))
+
+
+def test_accuracy_and_merge():
+    """Sketch montado em blocos ou combinado de partes fica perto dos quantis exatos"""
+    print("🧪 Testando precisão e combinação de blocos...")
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(3, 1, 500_000)
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+    assert sketch.n == len(values) and not sketch.exact
+    assert sum(len(level) for level in sketch.levels) < 1000
+    assert rank_errors(values, sketch).max() < 0.015
+
+    parts = [QuantileSketch().update(chunk) for chunk in np.array_split(values, 7)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == len(values)
+    assert rank_errors(values, merged).max() < 0.015
+    assert merged.quantile(0) == values.min() and merged.quantile(1) == values.max()
+    print("✅ Erro de posto abaixo de 1,5%")
+
+
+def test_small_columns_are_exact_and_round_trip():
+    """Enquanto cabe no sketch o quantil é o mesmo do pandas; JSON preserva o sketch"""
+    print("🧪 Testando colunas pequenas e serialização...")
+    series = pd.Series([1.0, 2.0, np.nan, 4.0, 10.0, 3.0])
+    sketch = QuantileSketch().update(series)
+    assert sketch.exact and sketch.n == 5
+    assert column_quantiles(series, (0.25, 0.5, 0.75), sketch) == [float(v) for v in series.quantile([0.25, 0.5, 0.75])]
+
+    big = QuantileSketch().update(np.random.default_rng(5).normal(size=20_000))
+    restored = QuantileSketch.from_dict(json.loads(json.dumps(big.to_dict())))
+    assert restored.n == big.n and restored.quantiles(QS) == big.quantiles(QS)
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    print("✅ Exato em colunas pequenas e serialização sem perdas")
+
+
+def test_column_sketches_by_chunk():
+    """Só colunas numéricas recebem sketch; coluna que vira texto em outro bloco perde o sketch"""
+    print("🧪 Testando sketches por coluna em blocos...")
+    sketches, excluded = {}, set()
+    update_column_sketches(sketches, pd.DataFrame({'a': [1, 2], 'b': [1.5, None], 'c': ['x', 'y'], 'd': [True, False]}), excluded)
+    update_column_sketches(sketches, pd.DataFrame({'a': [3, 4], 'b': ['n/d', '2']}), excluded)
+    assert list(sketches) == ['a'] and sketches['a'].n == 4
+    assert excluded == {'b', 'c', 'd'}
+    assert sketches_from_dict(sketches_to_dict(sketches))['a'].quantiles([0.5]) == [2.5]
+    print("✅ Sketches apenas das colunas numéricas")
+
+
+def test_quality_report_uses_sketches():
+    """Relatório de qualidade com sketches: contagem de outliers perto da exata; exact ignora o sketch"""
+    print("🧪 Testando relatório de qualidade com sketches...")
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame({'valor': np.append(rng.normal(100, 10, 200_000), [1e6, -1e6]), 'id': np.arange(200_002)})
+    service = DataPreparationService()
+    sketches = build_column_sketches(df)
+    exact = asyncio.run(service.get_data_quality_report(df))
+    approx = asyncio.run(service.get_data_quality_report(df, sketches))
+    assert exact['outliers']['id'] == approx['outliers']['id'] == 0
+    assert abs(approx['outliers']['valor'] - exact['outliers']['valor']) <= 0.002 * len(df)
+    assert approx['outliers']['valor'] >= 2
+
+    # Sketch de outra coluna: com exact=True os quartis vêm dos dados
+    wrong = {'valor': QuantileSketch().update([0.0, 1.0])}
+    assert asyncio.run(service.get_data_quality_report(df, wrong, exact=True))['outliers'] == exact['outliers']
+    _, _, lower, upper = iqr_bounds(df['valor'], sketches['valor'])
+    assert lower < 100 < upper
+    print("✅ Outliers com quartis aproximados")
+
+
+class FakeQuery:
+    """Registra os filtros e devolve as linhas de uploaded_data que casam com eles"""
+
+    def __init__(self, client):
+        self.client = client
+        self.filters = []
+        self.update_payload = None
+
+    def select(self, *columns):
+        self.client.calls.append(('select',) + columns)
+        return self
+
+    def update(self, payload):
+        self.update_payload = payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        self.client.calls.append(('execute', self.update_payload is not None, tuple(self.filters)))
+        rows = [row for row in self.client.rows if all(row.get(c) == v for c, v in self.filters)]
+        if self.update_payload is not None:
+            for row in rows:
+                row.update(self.update_payload)
+        return type('Response', (), {'data': rows})()
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def test_sketches_follow_dataset_version():
+    """Sketches gravados depois dos metadados (dataset regravado) não entram no cache da versão antiga"""
+    print("🧪 Testando versão dos sketches lidos do banco...")
+    old = pd.DataFrame({'valor': np.arange(1000, dtype=float)})
+    new = pd.DataFrame({'valor': np.arange(1000, dtype=float) + 1e6})
+    # save_dataframe rodou entre a leitura dos metadados e a dos sketches
+    row = {'id': 'd1', 'updated_at': 't2', 'column_sketches': sketches_to_dict(build_column_sketches(new))}
+    client = FakeClient([row])
+    dataset_service.supabase = client
+    meta = {'id': 'd1', 'updated_at': 't1', 'storage_key': 'u/a.parquet'}
+
+    sketches = load_column_sketches(meta, old)
+    assert sketches['valor'].quantile(0.5) < 1000
+    assert ('execute', False, (('id', 'd1'), ('updated_at', 't1'))) in client.calls
+    assert row['column_sketches']['valor']['min'] == 1e6  # o registro novo não é sobrescrito
+    assert load_column_sketches(meta) is sketches
+
+    current = {'id': 'd1', 'updated_at': 't2', 'storage_key': 'u/b.parquet'}
+    assert load_column_sketches(current)['valor'].quantile(0.5) > 1e6
+    print("✅ Sketches da versão dos metadados")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DOS SKETCHES DE QUANTIS")
+    print("=" * 40)
+
+    test_accuracy_and_merge()
+    test_small_columns_are_exact_and_round_trip()
+    test_column_sketches_by_chunk()
+    test_quality_report_uses_sketches()
+    test_sketches_follow_dataset_version()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Teste da geração dos relatórios Excel (app.services.report_service)
+"""
+
+import os
+import sys
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.report_service import (
+    build_excel_report, magnitude_number_format, column_text_width, report_cache_key, AUTO_WIDTH_SAMPLE_ROWS,
+    compile_report_plan, compile_template_plan, execute_report_plan, prepare_report_batch
+)
+
+
+def build_frame(rows: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    return pd.DataFrame({
+        'Data': pd.date_range('2024-01-01', periods=rows, freq='D'),
+        'Regiao': rng.choice(['Norte', 'Sul', 'Leste'], rows),
+        'Valor': rng.normal(2_000_000, 400_000, rows),
+    })
+
+
+def test_column_number_formats():
+    """O formato condicional cobre só as faixas de grandeza presentes na coluna"""
+    print("🧪 Testando formatos numéricos por coluna...")
+    assert magnitude_number_format(pd.Series([2e6, 3e6]), 'magnitude') == '#,##0.0,,"M"'
+    assert magnitude_number_format(pd.Series([5, 2e3]), 'magnitude') == '[>=1000]#,##0.0,"K";#,##0.00'
+    assert magnitude_number_format(pd.Series([5, 2e3, 3e6, 4e9]), 'magnitude') == \
+        '[>=1000000000]#,##0.0,,,"B";[>=1000000]#,##0.0,,"M";#,##0.0,"K"'
+    assert magnitude_number_format(pd.Series([5, 2e3, 3e6, 4e9]), 'magnitude_m') == \
+        '[>=1000000]#,##0.0,,"M";[>=1000]#,##0.0,"K";#,##0.00'
+    assert magnitude_number_format(pd.Series([np.nan], dtype=float), 'magnitude') == '#,##0.00'
+    print("✅ Formatos escolhidos corretamente")
+
+
+def test_geography_report():
+    """Relatório geográfico: abas, formato da coluna inteira e gráfico"""
+    print("🧪 Testando relatório geográfico...")
+    content = build_excel_report(build_frame(), 'vendas.csv', 'geography', 'Vendas', True, True,
+                                 None, 'Valor', 'Regiao', None, 'usuario')
+    wb = load_workbook(BytesIO(content))
+    assert wb.sheetnames == ['Dados Originais', 'Resumo Estatístico', 'Análise Geográfica', 'Metadados']
+    ws = wb['Análise Geográfica']
+    assert [c.value for c in ws[1]] == ['Regiao', 'Total', 'Média', 'Quantidade', 'Percentual']
+    assert {ws.cell(row=r, column=2).number_format for r in range(2, 5)} == {'#,##0.0,,"M"'}
+    assert ws.cell(row=2, column=5).number_format == '0.00"%"'
+    assert len(ws._charts) == 1
+    print("✅ Relatório geográfico gerado")
+
+
+def test_column_widths():
+    """Larguras vêm do texto das colunas do DataFrame (nulos ignorados)"""
+    print("🧪 Testando larguras automáticas...")
+    assert column_text_width(pd.Series(['a', None, 'abcde'])) == 5
+    assert column_text_width(pd.Series([np.nan, np.nan])) == 0
+    assert column_text_width(pd.Series(['x' * 8] * (AUTO_WIDTH_SAMPLE_ROWS * 2))) == 8
+    content = build_excel_report(build_frame(), 'vendas.csv', 'summary', 'Vendas', False, False,
+                                 None, None, None, None, 'usuario')
+    ws = load_workbook(BytesIO(content))['Dados Originais']
+    # O xlsxwriter grava a largura com o ajuste de padding em pixels (ex.: 23 -> 23.71)
+    assert int(ws.column_dimensions['A'].width) == len('2024-01-01 00:00:00') + 4
+    assert int(ws.column_dimensions['B'].width) == len('Regiao') + 4
+    print("✅ Larguras calculadas")
+
+
+def test_cacheable_output():
+    """Com a data de geração fixa, as mesmas entradas geram o mesmo arquivo"""
+    print("🧪 Testando relatório reproduzível para o cache...")
+    args = (build_frame(), 'vendas.csv', 'trend', 'Vendas', False, True, None, 'Valor', None, 'Data', 'usuario')
+    generated_at = datetime(2024, 5, 1, 12, 0, 0)
+    first = build_excel_report(*args, generated_at=generated_at)
+    assert first == build_excel_report(*args, generated_at=generated_at)
+    ws = load_workbook(BytesIO(first))['Metadados']
+    assert ws['B5'].value == '2024-05-01 12:00:00'
+    assert report_cache_key('abc', title='A', include_charts=True) == report_cache_key('abc', include_charts=True, title='A')
+    assert report_cache_key('abc', title='A') != report_cache_key('abc', title='B')
+    print("✅ Arquivo e chave do cache estáveis")
+
+
+def test_shared_aggregations():
+    """Planos diferentes reaproveitam a mesma agregação (calculada uma vez)"""
+    print("🧪 Testando agregações compartilhadas entre planos...")
+    df = build_frame()
+    risk = compile_report_plan(df, 'vendas.csv', 'risk', 'Risco', False, True, None, 'Valor', None, None, 'usuario')
+    assert risk.aggregations() == [('describe',), ('value_stats', 'Valor'), ('outliers', 'Valor')]
+    geo = compile_report_plan(df, 'vendas.csv', 'geography', 'Geo', True, False, None, 'Valor', 'Regiao', None, 'usuario')
+    template = compile_template_plan(df, 'vendas.csv', {
+        'name': 'Vendas por Região', 'description': 'Teste',
+        'config': {'analysis_type': 'geography', 'region_column': 'Regiao', 'value_column': 'Valor'}
+    }, 'Geo', True, 'usuario')
+    results = {}
+    execute_report_plan(geo, df, results=results)
+    shared = results[('geography', 'Regiao', 'Valor')]
+    execute_report_plan(template, df, results=results)
+    assert results[('geography', 'Regiao', 'Valor')] is shared
+    assert list(results) == [('geography', 'Regiao', 'Valor')]
+    print("✅ Agregação calculada uma única vez")
+
+
+def test_batch_preparation():
+    """O preparo do lote calcula a união das agregações dos relatórios uma vez"""
+    print("🧪 Testando preparo de lote de relatórios...")
+    df = build_frame()
+    common = dict(source_name='vendas.csv', title='Vendas', include_charts=False, include_summary=True,
+                  custom_analysis=None, value_column='Valor', region_column='Regiao', date_column=None,
+                  current_user='usuario')
+    jobs = [('excel', dict(common, report_type='geography')), ('excel', dict(common, report_type='risk'))]
+    frame, results = prepare_report_batch({'kind': 'frame', 'frame': df}, jobs)
+    assert frame is None
+    assert set(results) == {('describe',), ('geography', 'Regiao', 'Valor'), ('value_stats', 'Valor'),
+                            ('outliers', 'Valor')}
+    generated_at = datetime(2024, 5, 1, 12, 0, 0)
+    shared = build_excel_report(df, **jobs[1][1], generated_at=generated_at, results=results)
+    assert shared == build_excel_report(df, **jobs[1][1], generated_at=generated_at)
+    print("✅ Lote preparado com agregações compartilhadas")
+
+
+if __name__ == "__main__":
+    print("🎯 TESTE DOS RELATÓRIOS EXCEL")
+    print("=" * 40)
+
+    test_column_number_formats()
+    test_geography_report()
+    test_column_widths()
+    test_cacheable_output()
+    test_shared_aggregations()
+    test_batch_preparation()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Reconstrói os rollups dos dashboards (tabela report_rollups) a partir de reports.
+Use para o backfill inicial ou para corrigir divergências.
+
+    python scripts/rebuild_report_rollups.py              # todos os usuários
+    python scripts/rebuild_report_rollups.py --user-id ID # apenas um usuário
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.services.dashboard_service import rebuild_report_rollups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconstrói os rollups dos dashboards")
+    parser.add_argument("--user-id", help="Reconstrói apenas os rollups deste usuário")
+    args = parser.parse_args()
+    rebuild_report_rollups(args.user_id)
+
+
+if __name__ == "__main__":
+    main()